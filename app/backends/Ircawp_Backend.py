@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING, Type
 import abc
+import asyncio
 from ..lib.template_str import template_str
 
 if TYPE_CHECKING:
@@ -9,6 +10,9 @@ if TYPE_CHECKING:
 
 
 class Ircawp_Backend:
+    # True if runInference reports partial answers to the reply stream
+    stream_replies = False
+
     def __init__(self, *, console, parent: Ircawp, config: dict):
         self.console = console
         self.parent = parent
@@ -32,6 +36,8 @@ class Ircawp_Backend:
         use_tools: bool = True,
         aux=None,
         format: "Type[BaseModel] | dict | None" = None,
+        cacheable: bool = False,
+        purpose: str | None = None,
     ) -> tuple[str, list[str]]:
         """Run inference and return (response_text, tool_generated_images).
 
@@ -44,8 +50,20 @@ class Ircawp_Backend:
             use_tools: Whether to enable tool calling
             aux: Auxiliary data (e.g., thread context)
             format: Optional Pydantic model or JSON schema for structured outputs
+            cacheable: The response may be reused for an identical request
+                (deterministic helper calls, e.g. classification at temperature 0)
+            purpose: Names a helper call (e.g. "refine_prompt") so it can be
+                routed to another model; None for the main chat model
         """
         pass
 
+    async def runInferenceAsync(self, **kwargs) -> tuple[str, list[str]]:
+        """Async variant of runInference (same keyword arguments).
+
+        Backends without native async I/O run the blocking call in a worker
+        thread.
+        """
+        return await asyncio.to_thread(lambda: self.runInference(**kwargs))
+
     def templateReplace(self, prompt: str, username: str = "", **kwargs) -> str:
         return template_str(prompt, username=username, **kwargs)
@@ -0,0 +1,100 @@
+"""
+Reassembly of streamed (`stream: true`) chat completions.
+
+With streaming on, the endpoint answers with server-sent events: one
+`data: {chunk}` line per token or so, ending with `data: [DONE]`. Each
+chunk carries a delta for `choices[0]`: a piece of `content`, and for
+tool calls, pieces of `tool_calls` keyed by `index` (the id and function
+name arrive once, the JSON arguments arrive split across chunks).
+
+ChatStreamAssembler folds the chunks back into the same dict a non-
+streamed request returns, so callers handle both alike.
+"""
+
+import json
+from typing import Optional
+
+DONE = "[DONE]"
+
+
+def parse_sse_line(line) -> Optional[dict]:
+    """
+    Decode one line of an SSE response.
+
+    Returns the JSON payload of a `data:` line, or None for blank lines,
+    comments, other fields and the final `[DONE]` marker.
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:") :].strip()
+    if not data or data == DONE:
+        return None
+    return json.loads(data)
+
+
+class ChatStreamAssembler:
+    """Accumulates streamed chunks into a chat completion response."""
+
+    def __init__(self):
+        self.content = ""
+        self.role = "assistant"
+        self.finish_reason = None
+        # index -> tool call being assembled
+        self.tool_calls: dict[int, dict] = {}
+        self.extra: dict = {}
+
+    def feed(self, chunk: dict) -> str:
+        """Add one chunk; returns the content text it added (may be empty)."""
+        for key in ("id", "model", "created", "usage"):
+            if chunk.get(key) is not None:
+                self.extra[key] = chunk[key]
+
+        choices = chunk.get("choices") or []
+        if not choices:
+            return ""
+        choice = choices[0]
+        if choice.get("finish_reason"):
+            self.finish_reason = choice["finish_reason"]
+
+        delta = choice.get("delta") or {}
+        if delta.get("role"):
+            self.role = delta["role"]
+
+        for part in delta.get("tool_calls") or []:
+            call = self.tool_calls.setdefault(
+                part.get("index", len(self.tool_calls)),
+                {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            if part.get("id"):
+                call["id"] = part["id"]
+            function = part.get("function") or {}
+            if function.get("name"):
+                call["function"]["name"] += function["name"]
+            if function.get("arguments"):
+                call["function"]["arguments"] += function["arguments"]
+
+        text = delta.get("content") or ""
+        self.content += text
+        return text
+
+    def result(self) -> dict:
+        """The response as a non-streamed request would have returned it."""
+        message = {"role": self.role, "content": self.content}
+        if self.tool_calls:
+            message["tool_calls"] = [
+                self.tool_calls[index] for index in sorted(self.tool_calls)
+            ]
+        return {
+            **self.extra,
+            "object": "chat.completion",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": self.finish_reason,
+                }
+            ],
+        }
@@ -0,0 +1,523 @@
+"""
+Several OpenAI-compatible servers behind one backend.
+
+With a single `api_url`, a busy or restarting llama.cpp/Ollama box stalls
+or fails every request. `openai.endpoints` lists several servers instead:
+
+    endpoints:
+      - http://gpu1:8080
+      - {url: http://gpu2:8080, weight: 2, api_key: ...}
+
+ - Routing: each request goes to the healthy endpoint with the fewest
+   requests in flight relative to its weight.
+ - Health: a background thread probes every endpoint (`health_path`,
+   every `health_interval` seconds). An endpoint that refuses connections
+   or answers 429/502/503 is taken out of rotation until a probe (or, with
+   probing off, the cool-down) brings it back.
+ - Failover: a failed request moves on to the next endpoint at once; only
+   the last candidate gets the transport's backoff retries. A streamed
+   request only fails over before its first line arrives.
+ - Hedging (`hedge: true`): if a non-streamed request has not answered
+   after the p95 of recent request times (or `hedge_delay` seconds), the
+   same request is also sent to a second endpoint and the first answer
+   wins. This trades extra load for shorter tail latency. Hedged attempts
+   run on a small dedicated thread pool; when it has no room a request is
+   simply not hedged, so nothing queues behind abandoned attempts. The
+   losing attempt is cancelled at its next deadline check.
+"""
+
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import requests
+
+from app.lib.deadline import ChildDeadline, current_deadline, deadline_scope
+from app.lib.log import get_logger
+
+from .transport import RETRY_STATUSES, ChatTransport
+
+DEFAULT_HEALTH_PATH = "/v1/models"
+DEFAULT_HEALTH_INTERVAL = 10.0
+# How long a failed endpoint sits out when it isn't being probed
+DEFAULT_COOLDOWN = 30.0
+# Request times kept for the hedging percentile, and needed before hedging
+LATENCY_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+
+
+class Endpoint:
+    """One server of the pool and its routing state."""
+
+    def __init__(self, url: str, weight: float = 1.0, api_key: Optional[str] = None):
+        self.url = url.rstrip("/")
+        self.weight = max(float(weight), 0.001)
+        self.api_key = api_key
+        self.outstanding = 0
+        # Out of rotation until this monotonic time (0 = healthy)
+        self.down_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url!r}, weight={self.weight})"
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def headers(self, headers: dict) -> dict:
+        """Request headers with this endpoint's API key, if it has its own."""
+        if not self.api_key:
+            return headers
+        return {**headers, "Authorization": f"Bearer {self.api_key}"}
+
+
+def parse_endpoints(entries: Sequence) -> List[Endpoint]:
+    """Endpoints from config entries: URLs or {url, weight, api_key} dicts."""
+    endpoints = []
+    for entry in entries:
+        if isinstance(entry, str):
+            endpoints.append(Endpoint(entry))
+        else:
+            endpoints.append(
+                Endpoint(
+                    entry["url"],
+                    weight=entry.get("weight", 1.0),
+                    api_key=entry.get("api_key"),
+                )
+            )
+    return endpoints
+
+
+class EndpointPool:
+    """Routes chat requests over several endpoints. Thread-safe."""
+
+    def __init__(
+        self,
+        endpoints: Sequence[Endpoint],
+        transport: ChatTransport,
+        health_path: str = DEFAULT_HEALTH_PATH,
+        health_interval: float = DEFAULT_HEALTH_INTERVAL,
+        cooldown: float = DEFAULT_COOLDOWN,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        console=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            endpoints: Servers to spread requests over
+            transport: Sends the requests (and health probes)
+            health_path: Path probed with GET; 2xx means healthy
+            health_interval: Seconds between probes (0 disables probing)
+            cooldown: Seconds a failed endpoint sits out when not probed
+            hedge: Send a duplicate of slow non-streamed requests to a second endpoint
+            hedge_delay: Seconds before hedging (None uses the p95 of recent requests)
+            console: Rich console for log output
+            clock: Monotonic time source, replaceable in tests
+        """
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.transport = transport
+        self.health_path = health_path
+        self.health_interval = float(health_interval or 0)
+        self.cooldown = float(cooldown)
+        self.hedge = bool(hedge)
+        self.hedge_delay = hedge_delay
+        self.clock = clock
+        self.log = get_logger("openai", console)
+
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Free hedge workers; a hedged request reserves two (primary and backup)
+        self._hedge_slots = threading.Semaphore(2 * len(self.endpoints))
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        if self.health_interval > 0:
+            self._prober = threading.Thread(
+                target=self._probe_loop, name="endpoint-health", daemon=True
+            )
+            self._prober.start()
+
+    @classmethod
+    def from_config(
+        cls, oai_config: dict, transport: ChatTransport, console=None
+    ) -> Optional["EndpointPool"]:
+        """Build a pool from the `openai` config section; None without `endpoints`."""
+        entries = oai_config.get("endpoints")
+        if not entries:
+            return None
+        return cls(
+            parse_endpoints(entries),
+            transport,
+            health_path=oai_config.get("health_path", DEFAULT_HEALTH_PATH),
+            health_interval=oai_config.get("health_interval", DEFAULT_HEALTH_INTERVAL),
+            hedge=oai_config.get("hedge", False),
+            hedge_delay=oai_config.get("hedge_delay"),
+            console=console,
+        )
+
+    # Routing and health
+
+    def pick(self, exclude: Sequence[Endpoint] = ()) -> Optional[Endpoint]:
+        """
+        The endpoint for the next request: the healthy one with the fewest
+        outstanding requests per unit of weight. If every candidate is
+        down, the one due back soonest. None once all are excluded.
+        """
+        now = self.clock()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.healthy(now)]
+            if not healthy:
+                return min(candidates, key=lambda e: e.down_until)
+            return min(healthy, key=lambda e: (e.outstanding + 1) / e.weight)
+
+    def healthy_count(self) -> int:
+        now = self.clock()
+        return sum(1 for e in self.endpoints if e.healthy(now))
+
+    def mark_down(self, endpoint: Endpoint) -> None:
+        """Take an endpoint out of rotation until it is probed (or cools down)."""
+        delay = self.health_interval if self.health_interval > 0 else self.cooldown
+        with self._lock:
+            endpoint.down_until = self.clock() + delay
+        self.log.warning(
+            "Endpoint %s is unavailable, taking it out of rotation", endpoint.url
+        )
+
+    def probe(self) -> None:
+        """Probe every endpoint once and update its health."""
+        for endpoint in self.endpoints:
+            ok = self.transport.probe(endpoint.url + self.health_path)
+            with self._lock:
+                was_down = not endpoint.healthy(self.clock())
+                # A failed endpoint stays down until a later probe succeeds
+                endpoint.down_until = 0.0 if ok else math.inf
+            if ok and was_down:
+                self.log.info("Endpoint %s is back", endpoint.url)
+            elif not ok and not was_down:
+                self.log.warning("Endpoint %s failed its health check", endpoint.url)
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.probe()
+            except Exception as e:  # Keep probing whatever happens
+                self.log.error("Health check failed: %s", e)
+
+    # Hedging
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_after(self) -> Optional[float]:
+        """Seconds before a request is hedged, or None if it shouldn't be."""
+        if not self.hedge or self.healthy_count() < 2:
+            return None
+        if self.hedge_delay is not None:
+            return float(self.hedge_delay)
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE))]
+
+    # Sending
+
+    def _begin(self, endpoint: Endpoint) -> float:
+        with self._lock:
+            endpoint.outstanding += 1
+        return time.monotonic()
+
+    def _end(
+        self, endpoint: Endpoint, started: float, status: Optional[int], timed: bool
+    ) -> None:
+        """Finish a request; `status` is None if the endpoint could not be reached."""
+        with self._lock:
+            endpoint.outstanding -= 1
+        if status is None or status in RETRY_STATUSES:
+            self.mark_down(endpoint)
+        elif timed and 200 <= status < 300:
+            self.record_latency(time.monotonic() - started)
+
+    def _send(self, endpoint, path, headers, payload, attrs, on_line, retries):
+        """One request to one endpoint, with bookkeeping."""
+        started = self._begin(endpoint)
+        status = 0
+        try:
+            status, text = self.transport.post(
+                endpoint.url + path,
+                endpoint.headers(headers),
+                payload,
+                attrs,
+                on_line=on_line,
+                retries=retries,
+            )
+            return status, text
+        except requests.exceptions.RequestException:
+            status = None
+            raise
+        finally:
+            self._end(endpoint, started, status, timed=on_line is None)
+
+    async def _send_async(
+        self, endpoint, path, headers, payload, attrs, on_line, retries
+    ):
+        import aiohttp
+
+        started = self._begin(endpoint)
+        status = 0
+        try:
+            status, text = await self.transport.post_async(
+                endpoint.url + path,
+                endpoint.headers(headers),
+                payload,
+                attrs,
+                on_line=on_line,
+                retries=retries,
+            )
+            return status, text
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status = None
+            raise
+        finally:
+            self._end(endpoint, started, status, timed=on_line is None)
+
+    def post(
+        self,
+        path: str,
+        headers: dict,
+        payload,
+        attrs: Optional[dict] = None,
+        on_line: Optional[Callable[[bytes], None]] = None,
+    ) -> Tuple[int, str]:
+        """
+        POST `payload` to `path` on the best endpoint, failing over (or
+        hedging) as needed. Same return value as ChatTransport.post.
+        """
+        delay = self.hedge_after() if on_line is None else None
+        if delay is not None and self._reserve_hedge():
+            return self._post_hedged(delay, path, headers, payload, attrs)
+
+        tried: List[Endpoint] = []
+        received = []
+        if on_line is not None:
+            deliver = on_line
+
+            def on_line(line):
+                received.append(True)
+                deliver(line)
+
+        while True:
+            endpoint = self.pick(exclude=tried)
+            tried.append(endpoint)
+            last = len(tried) == len(self.endpoints)
+            if attrs is not None:
+                attrs["endpoint"] = endpoint.url
+            try:
+                status, text = self._send(
+                    endpoint, path, headers, payload, attrs, on_line,
+                    None if last else 0,
+                )
+            except requests.exceptions.RequestException:
+                if last or received:
+                    raise
+                continue
+            if status in RETRY_STATUSES and not last:
+                continue
+            return status, text
+
+    async def post_async(
+        self,
+        path: str,
+        headers: dict,
+        payload,
+        attrs: Optional[dict] = None,
+        on_line: Optional[Callable[[bytes], None]] = None,
+    ) -> Tuple[int, str]:
+        """Async variant of `post`; same arguments and return value."""
+        import aiohttp
+
+        delay = self.hedge_after() if on_line is None else None
+        if delay is not None:
+            return await self._post_hedged_async(delay, path, headers, payload, attrs)
+
+        tried: List[Endpoint] = []
+        received = []
+        if on_line is not None:
+            deliver = on_line
+
+            def on_line(line):
+                received.append(True)
+                deliver(line)
+
+        while True:
+            endpoint = self.pick(exclude=tried)
+            tried.append(endpoint)
+            last = len(tried) == len(self.endpoints)
+            if attrs is not None:
+                attrs["endpoint"] = endpoint.url
+            try:
+                status, text = await self._send_async(
+                    endpoint, path, headers, payload, attrs, on_line,
+                    None if last else 0,
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if last or received:
+                    raise
+                continue
+            if status in RETRY_STATUSES and not last:
+                continue
+            return status, text
+
+    def _reserve_hedge(self) -> bool:
+        """Take two hedge workers if both are free right now."""
+        if not self._hedge_slots.acquire(blocking=False):
+            return False
+        if not self._hedge_slots.acquire(blocking=False):
+            self._hedge_slots.release()
+            return False
+        return True
+
+    def _post_hedged(self, delay, path, headers, payload, attrs) -> Tuple[int, str]:
+        """
+        Send to the best endpoint; if it hasn't answered after `delay`,
+        send the same request to the next best too and return the first
+        good answer. Needs two workers reserved with `_reserve_hedge`.
+
+        Each attempt has its own span attributes (the winner's are merged
+        into `attrs`) and its own cancel flag on top of the request's
+        deadline, which is set for the loser.
+        """
+        executor = self._get_executor()
+        parent = current_deadline()
+        attempts = {}  # future -> (attrs, deadline)
+
+        def launch(endpoint, retries):
+            own_attrs = {"endpoint": endpoint.url}
+            deadline = ChildDeadline(parent)
+            future = executor.submit(
+                contextvars.copy_context().run,
+                self._hedge_attempt,
+                deadline, endpoint, path, headers, payload, own_attrs, retries,
+            )
+            attempts[future] = (own_attrs, deadline)
+            return future
+
+        primary = self.pick()
+        backup = None
+        done, pending = wait({launch(primary, 0)}, timeout=delay)
+        if not done or not _answered(next(iter(done))):
+            backup = self.pick(exclude=[primary])
+            pending.add(launch(backup, None))
+        else:
+            # The backup's worker isn't needed
+            self._hedge_slots.release()
+
+        try:
+            while True:
+                winner = next(
+                    (f for f in done if _answered(f) or not pending), None
+                )
+                if winner is not None:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        finally:
+            for future in pending:
+                attempts[future][1].cancel()
+                if future.cancel():
+                    self._hedge_slots.release()
+
+        if attrs is not None:
+            attrs.update(attempts[winner][0])
+            if backup is not None:
+                attrs["hedged"] = backup.url
+        return winner.result()
+
+    def _hedge_attempt(
+        self, deadline, endpoint, path, headers, payload, attrs, retries
+    ):
+        """One hedged attempt on a hedge worker, under its own cancellable deadline."""
+        try:
+            with deadline_scope(deadline):
+                return self._send(
+                    endpoint, path, headers, payload, attrs, None, retries
+                )
+        finally:
+            self._hedge_slots.release()
+
+    async def _post_hedged_async(
+        self, delay, path, headers, payload, attrs
+    ) -> Tuple[int, str]:
+        """Async variant of `_post_hedged`; the slower request is cancelled."""
+        attempts = {}  # task -> attrs
+
+        def launch(endpoint, retries):
+            own_attrs = {"endpoint": endpoint.url}
+            task = asyncio.ensure_future(
+                self._send_async(
+                    endpoint, path, headers, payload, own_attrs, None, retries
+                )
+            )
+            attempts[task] = own_attrs
+            return task
+
+        primary = self.pick()
+        backup = None
+        pending = {launch(primary, 0)}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done or not _answered(next(iter(done))):
+                backup = self.pick(exclude=[primary])
+                pending.add(launch(backup, None))
+            while True:
+                winner = next(
+                    (t for t in done if _answered(t) or not pending), None
+                )
+                if winner is not None:
+                    break
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if attrs is not None:
+            attrs.update(attempts[winner])
+            if backup is not None:
+                attrs["hedged"] = backup.url
+        return winner.result()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # One worker per hedge slot, so hedged attempts never queue
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2 * len(self.endpoints), thread_name_prefix="hedge"
+                )
+            return self._executor
+
+    def close(self) -> None:
+        """Stop health probing."""
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def _answered(future) -> bool:
+    """True if a finished request produced a response worth returning."""
+    if future.exception() is not None:
+        return False
+    status, _ = future.result()
+    return status not in RETRY_STATUSES
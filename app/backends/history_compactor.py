@@ -0,0 +1,202 @@
+"""
+Rolling summarization of long `+` conversation histories.
+
+Every continued turn resends the whole conversation, so prompt processing
+grows with the thread. Once a history's estimated size passes the token
+budget, HistoryCompactor folds its older turns into a summary and keeps
+only the most recent turns verbatim.
+
+Summaries are cached by the exact turns they cover, so the next turn
+reuses the summary and only grows it (summary + newly aged-out turns)
+when the history is over budget again. Each summary is also stored under
+every suffix of its turns, so it is still found after the conversation
+store drops the oldest turns.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.lib.deadline import RequestAborted
+
+# Rough prompt size of text, without loading the model's tokenizer
+CHARS_PER_TOKEN = 4
+# Rough prompt size of one image
+IMAGE_TOKENS = 500
+
+DEFAULT_KEEP_TURNS = 4
+DEFAULT_CACHE_ENTRIES = 1024
+
+SUMMARY_TEMPERATURE = 0.2
+
+SUMMARY_PROMPT = """You maintain a running summary of a chat between a user and an assistant.
+Merge the previous summary (if any) with the new exchanges into one updated summary.
+Keep names, facts, decisions, open questions and anything the user asked to remember.
+Write plain prose in the third person, under 200 words. Output only the summary."""
+
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """Estimate the prompt tokens used by history messages."""
+    tokens = 0
+    for msg in messages:
+        tokens += len(msg.get("content") or "") // CHARS_PER_TOKEN + 4
+        tokens += IMAGE_TOKENS * len(msg.get("media_paths") or [])
+    return tokens
+
+
+def _turns(history: List[dict]) -> List[List[dict]]:
+    """Group history into turns, each starting at a user message."""
+    turns: List[List[dict]] = []
+    for msg in history:
+        if msg.get("role") == "user" or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+
+def _turn_digest(turn: List[dict]) -> bytes:
+    return hashlib.sha256(
+        json.dumps(
+            [(m.get("role"), m.get("content")) for m in turn], sort_keys=True
+        ).encode("utf-8")
+    ).digest()
+
+
+def _chain(digests: List[bytes]) -> str:
+    """Key for a run of turns."""
+    h = hashlib.sha256()
+    for digest in digests:
+        h.update(digest)
+    return h.hexdigest()
+
+
+class HistoryCompactor:
+    """Replaces older turns of an over-budget history with a cached summary. Thread-safe."""
+
+    def __init__(
+        self,
+        token_budget: int,
+        keep_turns: int = DEFAULT_KEEP_TURNS,
+        max_entries: int = DEFAULT_CACHE_ENTRIES,
+        console=None,
+    ):
+        """
+        Args:
+            token_budget: Estimated history tokens allowed before compacting
+            keep_turns: Most recent turns always sent verbatim
+            max_entries: Summaries kept in the cache
+            console: Rich console for logging
+        """
+        self.token_budget = int(token_budget)
+        self.keep_turns = max(1, int(keep_turns))
+        self.max_entries = max(1, int(max_entries))
+        self.console = console
+        # run-of-turns key -> summary, least recently used first
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, oai_config: dict, console=None) -> Optional["HistoryCompactor"]:
+        """Build a compactor from the `openai` config section; None if no budget is set."""
+        budget = oai_config.get("history_token_budget")
+        if not budget:
+            return None
+        return cls(
+            budget,
+            keep_turns=oai_config.get("history_keep_turns", DEFAULT_KEEP_TURNS),
+            console=console,
+        )
+
+    def compact_flow(self, history: List[dict]):
+        """
+        Compact `history` if it is over budget.
+
+        A flow generator (see app.lib.flow) meant for `yield from` inside
+        another flow: it may yield ("chat", kwargs) steps to summarize.
+
+        Returns:
+            (summary or None, history messages to send verbatim)
+        """
+        if estimate_tokens(history) <= self.token_budget:
+            return None, history
+
+        turns = _turns(history)
+        digests = [_turn_digest(turn) for turn in turns]
+        summary, covered = self._lookup(digests)
+
+        recent = [msg for turn in turns[covered:] for msg in turn]
+        if summary is not None and (
+            estimate_tokens([{"content": summary}, *recent]) <= self.token_budget
+        ):
+            return summary, recent
+
+        fold_until = max(covered, len(turns) - self.keep_turns)
+        if fold_until == covered:
+            # Nothing old enough to fold; send what we have
+            return summary, recent
+
+        try:
+            result = yield (
+                "chat",
+                dict(
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {
+                            "role": "user",
+                            "content": self._summary_request(
+                                summary, turns[covered:fold_until]
+                            ),
+                        },
+                    ],
+                    temperature=SUMMARY_TEMPERATURE,
+                    purpose="history_summary",
+                ),
+            )
+            new_summary = (result["choices"][0]["message"]["content"] or "").strip()
+        except RequestAborted:
+            raise
+        except Exception as e:
+            if self.console is not None:
+                self.console.log(f"[yellow]History summary failed, sending full history: {e}")
+            return None, history
+
+        if not new_summary:
+            return None, history
+
+        self._store(digests[:fold_until], new_summary)
+        return new_summary, [msg for turn in turns[fold_until:] for msg in turn]
+
+    def _summary_request(self, summary: Optional[str], turns: List[List[dict]]) -> str:
+        lines = []
+        if summary:
+            lines += ["Previous summary:", summary, ""]
+        lines.append("New exchanges:")
+        for turn in turns:
+            for msg in turn:
+                speaker = "User" if msg.get("role") == "user" else "Assistant"
+                lines.append(f"{speaker}: {msg.get('content') or ''}")
+        return "\n".join(lines)
+
+    def _lookup(self, digests: List[bytes]) -> Tuple[Optional[str], int]:
+        """Find the summary covering the most leading turns: (summary, turns covered)."""
+        with self._lock:
+            for end in range(len(digests) - 1, 0, -1):
+                key = _chain(digests[:end])
+                summary = self._cache.get(key)
+                if summary is not None:
+                    self._cache.move_to_end(key)
+                    return summary, end
+        return None, 0
+
+    def _store(self, digests: List[bytes], summary: str) -> None:
+        """Cache a summary under every suffix of the turns it covers."""
+        with self._lock:
+            for start in range(len(digests)):
+                key = _chain(digests[start:])
+                self._cache[key] = summary
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
@@ -0,0 +1,188 @@
+"""
+Encodes images for vision requests, once per distinct image.
+
+The same image is often sent several times: the router's own inference,
+`refinePrompt`'s two passes over an image, follow-ups in a `+` thread.
+Reading, decoding, resizing and base64-encoding a 12 MP phone photo each
+time costs CPU, and sending it at full size costs upload and server-side
+image processing, although vision models work on far smaller images.
+
+ImageEncoder turns an image file into a data URI:
+
+ - With `max_dim`, images larger than that on their longest side are
+   downscaled (needs Pillow; without it images are sent as-is).
+ - With `format` ("jpeg" or "webp"), images are re-encoded in that format
+   at `quality`, which shrinks screenshots and PNG photos considerably.
+   JPEG drops transparency (flattened onto white).
+ - Results are cached by a hash of the file's content, in an LRU bounded
+   by the total size of the cached data URIs. Files are only re-read
+   when their modification time or size changes.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Resizing and re-encoding are skipped without Pillow
+    Image = None
+
+DEFAULT_QUALITY = 85
+DEFAULT_CACHE_MB = 64
+
+# Pillow format names for the `image_format` option
+FORMATS = {"jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
+
+
+def prepare_image(
+    data: bytes,
+    mime: str,
+    max_dim: Optional[int] = None,
+    format: Optional[str] = None,
+    quality: int = DEFAULT_QUALITY,
+) -> Tuple[bytes, str]:
+    """
+    Downscale an image to fit `max_dim` and/or re-encode it as `format`.
+
+    Returns (data, mime); the original if there is nothing to do or Pillow
+    is not installed.
+    """
+    if Image is None or (not max_dim and not format):
+        return data, mime
+
+    with Image.open(io.BytesIO(data)) as img:
+        source_format = img.format or "PNG"
+        too_big = bool(max_dim) and max(img.size) > max_dim
+        target = FORMATS[str(format).lower()] if format else source_format
+        if not too_big and target == source_format:
+            return data, mime
+
+        img.load()
+        if too_big:
+            img.thumbnail((max_dim, max_dim))
+        if target == "JPEG" and img.mode not in ("RGB", "L"):
+            img = _flatten(img)
+
+        out = io.BytesIO()
+        if target in ("JPEG", "WEBP"):
+            img.save(out, format=target, quality=quality)
+        else:
+            img.save(out, format=target)
+
+    encoded = out.getvalue()
+    if not too_big and len(encoded) >= len(data):
+        # Re-encoding didn't help; keep the original
+        return data, mime
+    return encoded, Image.MIME.get(target, mime)
+
+
+def _flatten(img):
+    """RGB copy of an image, with transparency composited onto white."""
+    img = img.convert("RGBA")
+    background = Image.new("RGB", img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel("A"))
+    return background
+
+
+class ImageEncoder:
+    """Image file -> data URI, with resizing and a content-hash cache. Thread-safe."""
+
+    def __init__(
+        self,
+        max_dim: Optional[int] = None,
+        format: Optional[str] = None,
+        quality: int = DEFAULT_QUALITY,
+        cache_bytes: int = DEFAULT_CACHE_MB * 2**20,
+    ):
+        """
+        Args:
+            max_dim: Longest side in pixels (None sends images at their size)
+            format: Re-encode as "jpeg" or "webp" (None keeps the file's format)
+            quality: JPEG/WebP quality, 1-100
+            cache_bytes: Total size of cached data URIs (0 disables the cache)
+        """
+        if format is not None and str(format).lower() not in FORMATS:
+            raise ValueError(
+                f"Unsupported image format '{format}' ('config.openai.image_format'); "
+                "use jpeg or webp"
+            )
+        self.max_dim = int(max_dim) if max_dim else None
+        self.format = format
+        self.quality = int(quality)
+        self.cache_bytes = max(0, int(cache_bytes))
+        # content hash -> data URI, least recently used first
+        self._uris: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        # (path, mtime, size) -> content hash
+        self._digests: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, oai_config: dict) -> "ImageEncoder":
+        """Build an encoder from the `openai` config section."""
+        return cls(
+            max_dim=oai_config.get("image_max_dim"),
+            format=oai_config.get("image_format"),
+            quality=oai_config.get("image_quality", DEFAULT_QUALITY),
+            cache_bytes=oai_config.get("image_cache_mb", DEFAULT_CACHE_MB) * 2**20,
+        )
+
+    def data_uri(self, path: str, mime: str) -> str:
+        """The data URI for an image file (raises OSError if it can't be read)."""
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+        data = None
+        with self._lock:
+            digest = self._digests.get(file_key)
+        if digest is None:
+            data = _read(path)
+            digest = hashlib.sha256(data).hexdigest()
+            self._remember_digest(file_key, digest)
+
+        with self._lock:
+            uri = self._uris.get(digest)
+            if uri is not None:
+                self._uris.move_to_end(digest)
+                self.hits += 1
+                return uri
+            self.misses += 1
+
+        if data is None:
+            data = _read(path)
+        data, mime = prepare_image(data, mime, self.max_dim, self.format, self.quality)
+        uri = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        self._remember_uri(digest, uri)
+        return uri
+
+    def _remember_digest(self, file_key: tuple, digest: str) -> None:
+        with self._lock:
+            self._digests[file_key] = digest
+            self._digests.move_to_end(file_key)
+            # Digests are small; keep a few per cached image
+            while len(self._digests) > 4 * max(16, len(self._uris)):
+                self._digests.popitem(last=False)
+
+    def _remember_uri(self, digest: str, uri: str) -> None:
+        if len(uri) > self.cache_bytes:
+            return
+        with self._lock:
+            if digest in self._uris:
+                return
+            self._uris[digest] = uri
+            self._size += len(uri)
+            while self._size > self.cache_bytes:
+                _, old = self._uris.popitem(last=False)
+                self._size -= len(old)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
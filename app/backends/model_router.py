@@ -0,0 +1,96 @@
+"""
+Routes internal helper calls to other models.
+
+Most LLM calls are helpers (rewriting an image prompt, picking a search
+result, checking an extract) that a small model answers in a fraction of
+the time the main chat model takes. Call sites name their `purpose`, and
+`openai.routes` maps purposes to named profiles from `openai.models`:
+
+    models:
+      small: {model: qwen2.5-3b-instruct, api_url: http://gpu2:8081}
+      # or just a model name served by the main endpoint(s)
+      tiny: qwen2.5-0.5b-instruct
+    routes:
+      refine_prompt: small
+      wikipedia_select: small
+      wikipedia_verify: small
+      geolocate_summary: tiny
+      wordle_extract: small
+      history_summary: small
+
+A profile with its own `api_url` (and optionally `api_key`) is sent there;
+otherwise the request goes to the main endpoint(s) with a different model
+name. Unrouted purposes, and calls without one, use the main model.
+
+Purposes used in this tree:
+ - refine_prompt: image prompt refinement (app.lib.llm_helpers)
+ - wikipedia_select: choosing among Wikipedia search results
+ - wikipedia_verify: checking an extract answers the question
+ - geolocate_summary: geolocate's condensing pass
+ - wordle_extract: reading words and alleys off a Wordle board (needs vision)
+ - history_summary: summarizing older `+` conversation turns
+"""
+
+from typing import Optional
+
+
+class ModelProfile:
+    """A model to send requests to, optionally on its own server."""
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        api_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.api_url = api_url.rstrip("/") if api_url else None
+        self.api_key = api_key
+
+    def __repr__(self) -> str:
+        return f"ModelProfile({self.name!r}, model={self.model!r})"
+
+
+class ModelRouter:
+    """Maps call purposes to model profiles."""
+
+    def __init__(self, profiles: dict, routes: dict):
+        """
+        Args:
+            profiles: Profile name -> ModelProfile
+            routes: Purpose -> profile name
+        """
+        unknown = sorted(set(routes.values()) - set(profiles))
+        if unknown:
+            raise ValueError(
+                f"Unknown model profile(s) in 'config.openai.routes': {', '.join(unknown)}"
+            )
+        self.profiles = profiles
+        self.routes = dict(routes)
+
+    @classmethod
+    def from_config(cls, oai_config: dict) -> Optional["ModelRouter"]:
+        """Build a router from the `openai` config section; None without `routes`."""
+        routes = oai_config.get("routes")
+        if not routes:
+            return None
+        profiles = {}
+        for name, entry in (oai_config.get("models") or {}).items():
+            if isinstance(entry, str):
+                entry = {"model": entry}
+            profiles[name] = ModelProfile(
+                name,
+                entry["model"],
+                api_url=entry.get("api_url"),
+                api_key=entry.get("api_key"),
+            )
+        return cls(profiles, routes)
+
+    def profile_for(self, purpose: Optional[str]) -> Optional[ModelProfile]:
+        """The profile for a purpose, or None to use the main model."""
+        if purpose is None:
+            return None
+        name = self.routes.get(purpose)
+        return self.profiles[name] if name is not None else None
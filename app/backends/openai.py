@@ -12,11 +12,16 @@ Implementation notes:
      simple string (backwards compatible for pure text models / endpoints).
  - Failures to read individual image files are logged and skipped without
      aborting the entire inference.
+ - Each image is encoded at most once per request, even if it appears in both
+     the `+` conversation history and the current message, and encoded
+     images are cached across requests by content (see image_encoder).
+     With `openai.image_max_dim` / `openai.image_format` set (and Pillow
+     installed), images are downscaled / re-encoded before encoding.
 """
 
+import asyncio
 import requests
 import json
-import base64
 import mimetypes
 from datetime import datetime
 from pathlib import Path
@@ -25,8 +30,24 @@ from typing import Type
 from pydantic import BaseModel
 from .Ircawp_Backend import Ircawp_Backend
 from .tools_manager import ToolManager, TOOL_RULES, TOOL_CALL_TEMP
-
-DEBUG = True
+from .history_compactor import HistoryCompactor
+from .prompt_budget import PromptBudget
+from .response_cache import ResponseCache, cache_key
+from .prompt_layout import PromptLayout, STANDIN, VOLATILE_FIELDS, prompt_key
+from .transport import ChatTransport
+from .endpoint_pool import EndpointPool, parse_endpoints
+from .model_router import ModelRouter
+from .image_encoder import ImageEncoder
+from .chat_stream import ChatStreamAssembler, parse_sse_line
+from app.lib.conversation import conversation_key
+from app.lib.deadline import RequestAborted, check_deadline
+from app.lib.flow import run_flow, run_flow_async
+from app.lib.log import get_logger
+from app.lib.streaming import current_stream
+from app.lib.tracing import span
+
+# Introduces the summary of older conversation turns in the system prompt
+SUMMARY_HEADING = "Summary of the earlier conversation:"
 
 
 class Openai(Ircawp_Backend):
@@ -34,24 +55,46 @@ class Openai(Ircawp_Backend):
         super().__init__(*args, **kwargs)
 
         self.config = kwargs.get("config", {})
+        self.log = get_logger("openai", self.console)
 
         if "openai" not in self.config:
             raise ValueError("Missing OpenAI backend configuration ('config.openai')")
 
         self.oai_config = self.config.get("openai", {})
 
-        if "api_url" not in self.oai_config:
-            raise ValueError("Missing OpenAI endpoint ('config.openai.api_url')")
+        if "api_url" not in self.oai_config and not self.oai_config.get("endpoints"):
+            raise ValueError(
+                "Missing OpenAI endpoint "
+                "('config.openai.api_url' or 'config.openai.endpoints')"
+            )
 
-        self.api_url = self.oai_config["api_url"].rstrip("/")
+        if "api_url" in self.oai_config:
+            self.api_url = self.oai_config["api_url"].rstrip("/")
+        else:
+            # Request URLs are built on the first endpoint and re-targeted by the pool
+            self.api_url = parse_endpoints(self.oai_config["endpoints"])[0].url
         self.api_key = self.oai_config.get("api_key", "")
         self.model = self.oai_config.get("model", "")
 
         self.options = {}
         self.options["temperature"] = self.oai_config.get("temperature", 1.0)
+        # Resizes, re-encodes and caches images for vision requests
+        self.image_encoder = ImageEncoder.from_config(self.oai_config)
+        # Pooled connections, timeouts and retries for API calls
+        self.transport = ChatTransport.from_config(self.oai_config)
+        # Routing, failover and hedging over several servers (None for api_url alone)
+        self.endpoint_pool = EndpointPool.from_config(
+            self.oai_config, self.transport, console=self.console
+        )
+        # Stream answers token by token to frontends that show partial replies
+        self.stream_replies = bool(self.oai_config.get("stream", False))
         # self.options["max_tokens"] = self.oai_config.get("max_tokens", 1024)
 
-        self.console.log(f"- [yellow]OpenAI API URL: {self.api_url}")
+        if self.endpoint_pool is not None:
+            urls = ", ".join(e.url for e in self.endpoint_pool.endpoints)
+            self.console.log(f"- [yellow]OpenAI API URLs: {urls}")
+        else:
+            self.console.log(f"- [yellow]OpenAI API URL: {self.api_url}")
         self.console.log(f"- [yellow]OpenAI Model: {self.model}")
         self.console.log(f"- [yellow]OpenAI Temperature: {self.options['temperature']}")
         # self.console.log(f"- [yellow]OpenAI Max Tokens: {self.options.get('max_tokens', 'N/A')}}")
@@ -63,7 +106,7 @@ class Openai(Ircawp_Backend):
                 "[yellow]Warning: No system prompt set in config ('config.llm.system_prompt')"
             )
 
-        self.console.log("System prompt: ", self.system_prompt)
+        self.log.debug("System prompt: %s", self.system_prompt)
 
         self.system_prompt_neutral = self.config.get("llm", {}).get(
             "system_prompt_neutral", None
@@ -81,6 +124,27 @@ class Openai(Ircawp_Backend):
         # Track tool-call failures to avoid permanently disabling tools on transient server errors
         self._tool_call_failures = 0
 
+        # Summarises older turns of long `+` conversations (None when disabled)
+        self.history_compactor = HistoryCompactor.from_config(
+            self.oai_config, console=self.console
+        )
+
+        # Responses of calls marked cacheable (None when disabled)
+        self.response_cache = ResponseCache.from_config(
+            self.oai_config.get("response_cache")
+        )
+
+        # Other models for helper calls, by purpose (None when not configured)
+        self.model_router = ModelRouter.from_config(self.oai_config)
+
+        # Cache-friendly prompt layout and slot pinning (None for the inline layout)
+        self.prompt_layout = PromptLayout.from_config(self.oai_config)
+
+        # Trims requests to the model's context window (None when not configured)
+        self.prompt_budget = PromptBudget.from_config(
+            self.oai_config, console=self.console
+        )
+
     def update_media_backend(self, media_backend):
         """Update media_backend reference in all tools after it's created."""
         self.media_backend = media_backend
@@ -92,12 +156,75 @@ class Openai(Ircawp_Backend):
         temperature: float | None = None,
         tools: list | None = None,
         format: Type[BaseModel] | dict | None = None,
+        stream: bool = False,
+        slot: int | None = None,
+        cacheable: bool = False,
+        purpose: str | None = None,
     ):
+        return self._run_flow(
+            self._chat_flow(
+                messages, temperature, tools, format, stream, slot, cacheable, purpose
+            )
+        )
+
+    async def chatAsync(
+        self,
+        messages,
+        temperature: float | None = None,
+        tools: list | None = None,
+        format: Type[BaseModel] | dict | None = None,
+        stream: bool = False,
+        slot: int | None = None,
+        cacheable: bool = False,
+        purpose: str | None = None,
+    ):
+        """Async variant of `chat`; same arguments and return value."""
+        return await self._run_flow_async(
+            self._chat_flow(
+                messages, temperature, tools, format, stream, slot, cacheable, purpose
+            )
+        )
+
+    def _chat_flow(
+        self,
+        messages,
+        temperature: float | None = None,
+        tools: list | None = None,
+        format: Type[BaseModel] | dict | None = None,
+        stream: bool = False,
+        slot: int | None = None,
+        cacheable: bool = False,
+        purpose: str | None = None,
+    ):
+        """Build and send a chat completion request.
+
+        A flow generator (see app.lib.flow): yields ("post", (url, headers,
+        payload)) and receives (status_code, response_text).
+
+        With `stream`, the answer is streamed to the request's reply stream
+        (see app.lib.streaming) as it is generated, if streaming is enabled
+        and the frontend supports it. `slot` pins the request to a server
+        slot (see prompt_layout). A `cacheable` call's response is reused
+        for an identical request while the response cache holds it.
+        `purpose` names a helper call, which may be routed to another model
+        (see model_router).
+        """
+        profile = None
+        if self.model_router is not None:
+            profile = self.model_router.profile_for(purpose)
+        api_url = self.api_url
+        api_key = self.api_key
+        if profile is not None and profile.api_url:
+            api_url = profile.api_url
+            api_key = profile.api_key or ""
+            # Slots belong to the main server
+            slot = None
+
         headers = {
             "Content-Type": "application/json",
         }
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
         # Choose temperature: per-call override else default option
         if temperature is None:
             use_temperature = self.options["temperature"]
@@ -112,7 +239,7 @@ class Openai(Ircawp_Backend):
             if use_temperature > 2.0:
                 use_temperature = 2.0
         payload = {
-            "model": self.model,
+            "model": profile.model if profile is not None else self.model,
             "messages": messages,
             "temperature": use_temperature,
             "max_tokens": 16384,
@@ -153,29 +280,42 @@ class Openai(Ircawp_Backend):
             payload["tools"] = tools
             payload["tool_choice"] = "auto"
 
-        response = requests.post(
-            f"{self.api_url}/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(payload),
-            verify=False,
-        )
+        if stream and self.stream_replies and current_stream() is not None:
+            payload["stream"] = True
+
+        # llama.cpp prompt cache hints
+        if self.prompt_layout is not None:
+            payload["cache_prompt"] = True
+        if slot is not None:
+            payload["id_slot"] = slot
+
+        key = None
+        if cacheable and self.response_cache is not None:
+            key = cache_key(payload)
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                self.log.debug("Response cache hit for %s", key[:12])
+                return cached
+
+        url = f"{api_url}/v1/chat/completions"
+        status, text = yield ("post", (url, headers, payload))
 
         if tools or format:
             # check if json is valid; it may be broken if it exceeded max tokens
             try:
-                response.json()
+                json.loads(text)
             except json.JSONDecodeError:
-                self.console.log(
-                    "[red]Error: Received invalid JSON response from OpenAI API. "
+                self.log.error(
+                    "Error: Received invalid JSON response from OpenAI API. "
                     "This may be due to exceeding max tokens."
                 )
-                self.console.log(f"[red]Response text: {response.text}")
-                return response.text
+                self.log.error("Response text: %s", text)
+                return text
 
         # If we get a 500 error and tools were provided, it might be that the endpoint
         # doesn't support tools or hit an internal error. Try again without tools for this request.
         # Only mark tools as unsupported after repeated failures.
-        if response.status_code == 500 and tools:
+        if status == 500 and tools:
             self.console.log(
                 "[yellow]Server error with tools, retrying without tools..."
             )
@@ -188,25 +328,115 @@ class Openai(Ircawp_Backend):
                 self.tool_manager.set_supported(False)
             payload.pop("tools", None)
             payload.pop("tool_choice", None)
-            response = requests.post(
-                f"{self.api_url}/v1/chat/completions",
-                headers=headers,
-                data=json.dumps(payload),
-                verify=False,
-            )
-        elif response.ok:
+            status, text = yield ("post", (url, headers, payload))
+        elif 200 <= status < 300:
             # Reset on any successful request.
             self._tool_call_failures = 0
 
-        try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            self.console.log(f"[blue]Payload sent: {json.dumps(payload, indent=2)}")
-            self.console.log(f"[red]HTTP Error: {e}")
-            self.console.log(f"[red]Response body: {response.text}")
-            raise
+        if status >= 400:
+            e = requests.exceptions.HTTPError(f"{status} Error for url: {url}")
+            self.log.debug("Payload sent: %s", payload)
+            self.log.error("HTTP Error: %s", e)
+            self.log.error("Response body: %s", text)
+            raise e
+
+        result = json.loads(text)
+        if key is not None:
+            self.response_cache.put(key, result)
+        return result
+
+    def _post(self, url: str, headers: dict, payload: dict) -> tuple[int, str]:
+        with span("llm.chat", model=payload.get("model")) as attrs:
+            on_line = None
+            if payload.get("stream"):
+                assembler, on_line = self._stream_receiver()
+            if self.endpoint_pool is not None and url.startswith(self.api_url):
+                status, text = self.endpoint_pool.post(
+                    url.removeprefix(self.api_url), headers, payload, attrs, on_line
+                )
+            elif on_line is not None:
+                status, text = self.transport.post(
+                    url, headers, payload, attrs, on_line=on_line
+                )
+            else:
+                status, text = self.transport.post(url, headers, payload, attrs)
+            attrs["status"] = status
+            if on_line is not None and 200 <= status < 300:
+                return status, json.dumps(assembler.result())
+            return status, text
+
+    async def _post_async(
+        self, url: str, headers: dict, payload: dict
+    ) -> tuple[int, str]:
+        with span("llm.chat", model=payload.get("model")) as attrs:
+            on_line = None
+            if payload.get("stream"):
+                assembler, on_line = self._stream_receiver()
+            if self.endpoint_pool is not None and url.startswith(self.api_url):
+                status, text = await self.endpoint_pool.post_async(
+                    url.removeprefix(self.api_url), headers, payload, attrs, on_line
+                )
+            elif on_line is not None:
+                status, text = await self.transport.post_async(
+                    url, headers, payload, attrs, on_line=on_line
+                )
+            else:
+                status, text = await self.transport.post_async(
+                    url, headers, payload, attrs
+                )
+            attrs["status"] = status
+            if on_line is not None and 200 <= status < 300:
+                return status, json.dumps(assembler.result())
+            return status, text
 
-        return response.json()
+    def _stream_receiver(self):
+        """(assembler, SSE line callback) for a streamed chat request.
+
+        Each line is folded into the assembler, and the answer so far is
+        passed to the request's reply stream.
+        """
+        assembler = ChatStreamAssembler()
+        stream = current_stream()
+
+        def on_line(line):
+            chunk = parse_sse_line(line)
+            if chunk is not None and assembler.feed(chunk) and stream is not None:
+                stream.update(assembler.content)
+
+        return assembler, on_line
+
+    def _run_flow(self, flow):
+        """Drive a flow generator (`_chat_flow`, `_inference_flow`) with blocking I/O."""
+        return run_flow(flow, self._perform)
+
+    async def _run_flow_async(self, flow):
+        """Drive a flow generator on the running event loop."""
+        return await run_flow_async(flow, self._perform_async)
+
+    def _perform(self, step):
+        kind, args = step
+        if kind == "post":
+            return self._post(*args)
+        if kind == "chat":
+            return self.chat(**args)
+        if kind == "tool":
+            return self.tool_manager.execute_tool(*args)
+        if kind == "tools":
+            return self.tool_manager.execute_tools(args)
+        raise ValueError(f"Unknown flow step: {kind}")
+
+    async def _perform_async(self, step):
+        kind, args = step
+        if kind == "post":
+            return await self._post_async(*args)
+        if kind == "chat":
+            return await self.chatAsync(**args)
+        if kind == "tool":
+            # Tools are synchronous; run them off the event loop
+            return await asyncio.to_thread(self.tool_manager.execute_tool, *args)
+        if kind == "tools":
+            return await self.tool_manager.execute_tools_async(args)
+        raise ValueError(f"Unknown flow step: {kind}")
 
     def _image_to_data_uri(self, img_path: str) -> str | None:
         """Read local image file and return a data URI suitable for OpenAI image_url content part.
@@ -224,9 +454,7 @@ class Openai(Ircawp_Backend):
                     f"[yellow]Skipping non-image media: {img_path} (mime={mime})"
                 )
                 return None
-            data = p.read_bytes()
-            b64 = base64.b64encode(data).decode("utf-8")
-            return f"data:{mime};base64,{b64}"
+            return self.image_encoder.data_uri(str(p), mime)
         except Exception as e:
             self.console.log(f"[yellow]Failed reading image '{img_path}': {e}")
             return None
@@ -242,7 +470,73 @@ class Openai(Ircawp_Backend):
         aux=None,
         format: Type[BaseModel] | dict | None = None,
         conversation_history: list[dict] | None = None,
-    ) -> str:
+        cacheable: bool = False,
+        purpose: str | None = None,
+    ) -> tuple[str, list[str]]:
+        return self._run_flow(
+            self._inference_flow(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                username=username,
+                temperature=temperature,
+                media=media,
+                use_tools=use_tools,
+                aux=aux,
+                format=format,
+                conversation_history=conversation_history,
+                cacheable=cacheable,
+                purpose=purpose,
+            )
+        )
+
+    async def runInferenceAsync(
+        self,
+        prompt: str = "",
+        system_prompt: str | None = None,
+        username: str = "",
+        temperature: float = None,
+        media: list = [],
+        use_tools: bool = True,
+        aux=None,
+        format: Type[BaseModel] | dict | None = None,
+        conversation_history: list[dict] | None = None,
+        cacheable: bool = False,
+        purpose: str | None = None,
+    ) -> tuple[str, list[str]]:
+        return await self._run_flow_async(
+            self._inference_flow(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                username=username,
+                temperature=temperature,
+                media=media,
+                use_tools=use_tools,
+                aux=aux,
+                format=format,
+                conversation_history=conversation_history,
+                cacheable=cacheable,
+                purpose=purpose,
+            )
+        )
+
+    def _inference_flow(
+        self,
+        prompt: str = "",
+        system_prompt: str | None = None,
+        username: str = "",
+        temperature: float = None,
+        media: list = [],
+        use_tools: bool = True,
+        aux=None,
+        format: Type[BaseModel] | dict | None = None,
+        conversation_history: list[dict] | None = None,
+        cacheable: bool = False,
+        purpose: str | None = None,
+    ):
+        """The body of `runInference` as a flow generator (see app.lib.flow).
+
+        Yields ("chat", chat kwargs) and ("tools", [(name, args), ...]) steps.
+        """
         tools = None
         tools_used = []  # Track which tools were called (optionally with args)
         tool_images = []  # Track images generated by tools
@@ -281,29 +575,33 @@ class Openai(Ircawp_Backend):
 
             tick = datetime.now()
 
-            if DEBUG:
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference: prompt='{prompt[:256]}...'"
-                )
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference: system_prompt='{system_prompt[:256] if system_prompt else '--'}...'"
-                )
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference: username='{username}'"
-                )
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference: temperature='{temperature}'"
-                )
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference: media='{media}'"
-                )
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference: use_tools='{use_tools}'"
-                )
+            self.log.debug("OpenAI runInference: prompt='%s'", prompt)
+            self.log.debug(
+                "OpenAI runInference: system_prompt='%s'", system_prompt or "--"
+            )
+            self.log.debug(
+                "OpenAI runInference: username='%s', temperature='%s', "
+                "media='%s', use_tools='%s'",
+                username,
+                temperature,
+                media,
+                use_tools,
+            )
 
             # Compose messages for chat endpoint
             messages = []
 
+            # Encode each image at most once per request
+            encoded_images: dict[str, str | None] = {}
+
+            def image_part(img_path: str) -> dict | None:
+                if img_path not in encoded_images:
+                    encoded_images[img_path] = self._image_to_data_uri(img_path)
+                data_uri = encoded_images[img_path]
+                if not data_uri:
+                    return None
+                return {"type": "image_url", "image_url": {"url": data_uri}}
+
             # If aux carries thread conversation_id, include prior thread history
             # aux tuple layout in Slack frontend: (user_id, channel, say, body, thread_ts, conversation_id)
             try:
@@ -324,6 +622,14 @@ class Openai(Ircawp_Backend):
                 except Exception as e:
                     self.console.log(f"[yellow]Failed to include thread history: {e}")
 
+            # Long histories send a summary of older turns instead
+            history_summary = None
+            if conversation_history and self.history_compactor is not None:
+                (
+                    history_summary,
+                    conversation_history,
+                ) = yield from self.history_compactor.compact_flow(conversation_history)
+
             # Inject global conversation history from + prefix
             if conversation_history:
                 for msg in conversation_history:
@@ -332,13 +638,16 @@ class Openai(Ircawp_Backend):
 
                     if role == "user":
                         # Reconstruct multimodal content if media present
-                        media_uris = msg.get("media_data_uris", [])
-                        if media_uris:
-                            user_content_parts = [{"type": "text", "text": content}]
-                            for uri in media_uris:
-                                user_content_parts.append(
-                                    {"type": "image_url", "image_url": {"url": uri}}
-                                )
+                        history_parts = [
+                            part
+                            for part in map(image_part, msg.get("media_paths", []))
+                            if part
+                        ]
+                        if history_parts:
+                            user_content_parts = [
+                                {"type": "text", "text": content},
+                                *history_parts,
+                            ]
                             messages.append(
                                 {"role": "user", "content": user_content_parts}
                             )
@@ -352,12 +661,9 @@ class Openai(Ircawp_Backend):
             image_parts = []
             if media and isinstance(media, list):
                 for img_path in media:
-                    data_uri = self._image_to_data_uri(str(img_path))
-                    if not data_uri:
-                        continue
-                    image_parts.append(
-                        {"type": "image_url", "image_url": {"url": data_uri}}
-                    )
+                    part = image_part(str(img_path))
+                    if part:
+                        image_parts.append(part)
 
             if image_parts:
                 # Text part first, then images
@@ -367,54 +673,116 @@ class Openai(Ircawp_Backend):
                 ]
 
             # Only add tool rules and capabilities if tools will actually be used
-            if (
+            with_tools = bool(
                 use_tools
                 and self.tool_manager.is_enabled()
                 and self.tool_manager.is_supported()
                 and self.tool_manager.has_tools()
-            ):
-                system_prompt += TOOL_RULES
+            )
 
-                # Add capability matrix showing tool expertise areas
-                capability_matrix = self.tool_manager.get_capability_matrix()
-                if capability_matrix:
-                    system_prompt += "\n" + capability_matrix
+            slot = None
+            if self.prompt_layout is not None and system_prompt:
+                # Byte-stable system prompt; time and username go in a note
+                # at the start of the new user message instead. That message
+                # comes last, so the system prompt and history before it stay
+                # a cached prefix whatever the note says.
+                template = system_prompt
+                system_prompt = self.prompt_layout.static_prefix(
+                    (
+                        prompt_key(template),
+                        with_tools,
+                        tuple(self.tool_manager.available_tools) if with_tools else (),
+                    ),
+                    lambda: self._render_system_prompt(
+                        template,
+                        with_tools,
+                        **{field: STANDIN for field in VOLATILE_FIELDS},
+                    ),
+                )
+                note = self.prompt_layout.context_note(
+                    template, lambda text: self.templateReplace(text, username=username)
+                )
+                if note:
+                    if isinstance(user_content, list):
+                        user_content[0] = {"type": "text", "text": f"{note}\n\n{prompt}"}
+                    else:
+                        user_content = f"{note}\n\n{user_content}"
+                # Helper calls would evict the conversation's own slot
+                if purpose is None:
+                    slot = self.prompt_layout.slot_for(
+                        (prompt_key(template), conversation_key(aux) or username)
+                    )
+            else:
+                system_prompt = self._render_system_prompt(
+                    system_prompt, with_tools, username=username
+                )
 
             if system_prompt:
-                # Apply all prompt placeholders in one pass.
-                if hasattr(self, "templateReplace"):
-                    system_prompt = self.templateReplace(
-                        system_prompt,
-                        username=username,
-                    )
+                if history_summary:
+                    system_prompt += f"\n\n{SUMMARY_HEADING}\n{history_summary}"
                 messages = [
                     {"role": "system", "content": system_prompt},
                     *messages,
                     {"role": "user", "content": user_content},
                 ]
             else:
+                summary_messages = (
+                    [{"role": "system", "content": f"{SUMMARY_HEADING}\n{history_summary}"}]
+                    if history_summary
+                    else []
+                )
                 messages = [
+                    *summary_messages,
                     *messages,
                     {"role": "user", "content": user_content},
                 ]
 
             # Determine if tools should be used
-            if (
-                use_tools
-                and self.tool_manager.is_enabled()
-                and self.tool_manager.is_supported()
-                and self.tool_manager.has_tools()
-            ):
+            if with_tools:
                 tools = self.tool_manager.get_tool_schemas()
 
-                if DEBUG:
-                    self.console.log(f"[black on yellow] TOOLS {tools}")
+                self.log.debug("TOOLS %s", tools)
+
+            # Fit the request into the context window, least important parts first
+            if self.prompt_budget is not None:
+                messages, tools, trimmed = self.prompt_budget.fit(messages, tools)
+                if trimmed:
+                    self.log.info(
+                        "Prompt over the %s-token budget; trimmed %s",
+                        self.prompt_budget.limit,
+                        ", ".join(trimmed),
+                    )
 
-                result = self.chat(
-                    messages, temperature=TOOL_CALL_TEMP, tools=tools, format=format
+            if tools:
+                result = yield (
+                    "chat",
+                    dict(
+                        messages=messages,
+                        temperature=TOOL_CALL_TEMP,
+                        tools=tools,
+                        format=format,
+                        stream=format is None and purpose is None,
+                        slot=slot,
+                        cacheable=cacheable,
+                        purpose=purpose,
+                    ),
                 )
             else:
-                result = self.chat(messages, temperature=temperature, format=format)
+                result = yield (
+                    "chat",
+                    dict(
+                        messages=messages,
+                        temperature=temperature,
+                        format=format,
+                        stream=format is None and purpose is None,
+                        slot=slot,
+                        cacheable=cacheable,
+                        purpose=purpose,
+                    ),
+                )
+
+            if self.prompt_budget is not None and isinstance(result, dict):
+                self.prompt_budget.observe(messages, tools, result.get("usage"))
 
             # Check if LLM wants to call tools
             if (
@@ -427,6 +795,8 @@ class Openai(Ircawp_Backend):
                 tool_round = 0
 
                 while tool_round < max_tool_rounds:
+                    # Don't start another round once the request's time is up
+                    check_deadline()
                     tool_round += 1
                     choice = result["choices"][0]
                     message = choice["message"]
@@ -441,24 +811,29 @@ class Openai(Ircawp_Backend):
                     # Add the assistant tool-call message once per round
                     messages.append(message)
 
+                    calls = []
                     for tool_call in message["tool_calls"]:
                         tool_name = tool_call["function"]["name"]
                         tool_args = json.loads(tool_call["function"]["arguments"])
 
-                        self.console.log(
-                            f"[black on cyan]Tool call: {tool_name} with args {tool_args}"
+                        self.log.debug(
+                            "[black on cyan]Tool call: %s with args %s",
+                            tool_name,
+                            tool_args,
                         )
 
                         tools_used.append({"name": tool_name, "args": tool_args})
+                        calls.append((tool_name, tool_args))
 
-                        tool_result = self.tool_manager.execute_tool(
-                            tool_name, tool_args
-                        )
+                    # Run the round's calls at once; results keep the call order
+                    tool_results = yield ("tools", calls)
 
-                        if DEBUG:
-                            self.console.log(
-                                f"[black on yellow]Tool '{tool_name}' result: `{tool_result.text}`..."
-                            )
+                    for tool_call, (tool_name, _), tool_result in zip(
+                        message["tool_calls"], calls, tool_results
+                    ):
+                        self.log.debug(
+                            "Tool '%s' result: `%s`", tool_name, tool_result.text
+                        )
 
                         if tool_result.images:
                             tool_images.extend(tool_result.images)
@@ -494,11 +869,18 @@ class Openai(Ircawp_Backend):
                         )
 
                     # Let the model continue, with tools still available for multi-step tool use
-                    result = self.chat(
-                        messages,
-                        temperature=temperature,
-                        tools=tools,
-                        format=format,
+                    result = yield (
+                        "chat",
+                        dict(
+                            messages=messages,
+                            temperature=temperature,
+                            tools=tools,
+                            format=format,
+                            stream=format is None and purpose is None,
+                            slot=slot,
+                            cacheable=cacheable,
+                            purpose=purpose,
+                        ),
                     )
 
             # If the last tool used was Wikipedia, do a final verifier pass to ensure
@@ -515,10 +897,12 @@ class Openai(Ircawp_Backend):
                 and "wikipedia" in tool_text_by_name
             ):
                 try:
-                    checked_response = self._wikipedia_answer_sufficiency_inference(
+                    checked_response = yield from self._wikipedia_answer_sufficiency_flow(
                         question=prompt,
                         wikipedia_extract=tool_text_by_name["wikipedia"],
                     )
+                except RequestAborted:
+                    raise
                 except Exception as e:
                     self.console.log(
                         f"[yellow]Wikipedia sufficiency check failed; falling back to normal response: {e}"
@@ -589,17 +973,17 @@ class Openai(Ircawp_Backend):
 
             self.last_query_time = tok - tick
 
+        except RequestAborted:
+            raise
+
         except Exception as e:
             response = f"**IT HERTZ, IT HERTZ (openai):** '{e}'"
             self.console.log(f"[red on yellow]Exception in OpenAI backend: {e}")
 
         finally:
-            if DEBUG:
-                self.console.log(
-                    f"[black on yellow]OpenAI runInference response size: {len(response)} chars"
-                )
-                if use_tools and tool_images:
-                    self.console.log(f"[black on yellow]Tool images: {tool_images}")
+            self.log.debug("OpenAI runInference response size: %s chars", len(response))
+            if use_tools and tool_images:
+                self.log.debug("Tool images: %s", tool_images)
 
         # Only do newline expansion if not using structured output format
         if format is None:
@@ -607,6 +991,23 @@ class Openai(Ircawp_Backend):
         else:
             return response, tool_images
 
+    def _render_system_prompt(
+        self, system_prompt: str | None, with_tools: bool, **values
+    ) -> str | None:
+        """Add tool rules and the capability matrix, then fill in placeholders."""
+        if with_tools:
+            system_prompt = (system_prompt or "") + TOOL_RULES
+
+            # Add capability matrix showing tool expertise areas
+            capability_matrix = self.tool_manager.get_capability_matrix()
+            if capability_matrix:
+                system_prompt += "\n" + capability_matrix
+
+        if system_prompt:
+            # Apply all prompt placeholders in one pass.
+            system_prompt = self.templateReplace(system_prompt, **values)
+        return system_prompt
+
     def _extract_first_json_object(self, text: str) -> dict[str, Any] | None:
         """Best-effort extraction of the first JSON object from model output."""
         if not text:
@@ -638,8 +1039,20 @@ class Openai(Ircawp_Backend):
         question: str,
         wikipedia_extract: str,
     ) -> str:
+        """Blocking wrapper around `_wikipedia_answer_sufficiency_flow`."""
+        return self._run_flow(
+            self._wikipedia_answer_sufficiency_flow(question, wikipedia_extract)
+        )
+
+    def _wikipedia_answer_sufficiency_flow(
+        self,
+        question: str,
+        wikipedia_extract: str,
+    ):
         """Run a final no-tools inference that checks if the Wikipedia extract answers the question.
 
+        A flow generator (see app.lib.flow).
+
         Returns the final response to the user (either an answer grounded in the extract,
         or an appropriate message indicating the extract doesn't answer the question).
         """
@@ -668,11 +1081,16 @@ class Openai(Ircawp_Backend):
             {"role": "user", "content": verifier_user},
         ]
 
-        verifier_result = self.chat(
-            verifier_messages,
-            temperature=0.0,
-            tools=None,
-            format=None,
+        verifier_result = yield (
+            "chat",
+            dict(
+                messages=verifier_messages,
+                temperature=0.0,
+                tools=None,
+                format=None,
+                cacheable=True,
+                purpose="wikipedia_verify",
+            ),
         )
 
         content = (
@@ -0,0 +1,286 @@
+"""
+Fitting a chat request into the model's context window.
+
+Messages are assembled without regard to size: URL fetching pastes whole
+pages into the prompt, `/yt` pastes whole transcripts, and `+` histories
+grow with the thread. A prompt that doesn't fit fails outright, and one
+that barely fits spends minutes in prompt processing.
+
+PromptBudget counts the request's parts and, when they exceed the window
+minus the room reserved for the answer, shrinks the least important part
+first, only as far as needed:
+
+ 1. `+` history: the oldest turns are dropped
+ 2. fetched page text pasted into the message: cut down, keeping its start
+ 3. tool schemas: dropped, so the model answers without tools
+ 4. the user's own text: the middle is cut, keeping its start and end
+
+The system prompt and images are never trimmed.
+
+Tokens are counted with a Hugging Face tokenizer when `openai.tokenizer`
+names one (and the `tokenizers` package is installed). Otherwise they are
+estimated from the character count, and the characters-per-token ratio is
+calibrated from the `prompt_tokens` the API reports for text-only requests.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.url_extractor import URL_CONTENT_RE
+from .history_compactor import CHARS_PER_TOKEN, IMAGE_TOKENS
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # Token counts are estimated without it
+    Tokenizer = None
+
+# Tokens reserved for the answer unless configured
+DEFAULT_RESERVE_TOKENS = 1024
+# Per-message framing added by chat templates (role markers and such)
+MESSAGE_OVERHEAD = 4
+# Weight of each new observation when calibrating the estimate
+CALIBRATION_WEIGHT = 0.2
+# Sane bounds for a calibrated characters-per-token ratio
+MIN_CHARS_PER_TOKEN = 1.5
+MAX_CHARS_PER_TOKEN = 8.0
+
+TRIM_MARKER = "\n[... trimmed to fit the context window ...]\n"
+
+
+class TokenCounter:
+    """Counts tokens with a real tokenizer, or estimates them. Thread-safe."""
+
+    def __init__(self, tokenizer=None, chars_per_token: float = CHARS_PER_TOKEN):
+        """
+        Args:
+            tokenizer: A `tokenizers.Tokenizer` (None to estimate)
+            chars_per_token: Starting ratio for the estimate
+        """
+        self.tokenizer = tokenizer
+        self.chars_per_token = float(chars_per_token)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, oai_config: dict, console=None) -> "TokenCounter":
+        """Build a counter from the `openai` config section."""
+        chars_per_token = oai_config.get("chars_per_token", CHARS_PER_TOKEN)
+        name = oai_config.get("tokenizer")
+        if not name:
+            return cls(chars_per_token=chars_per_token)
+        if Tokenizer is None:
+            if console is not None:
+                console.log(
+                    "[yellow]openai.tokenizer is set but `tokenizers` isn't installed; estimating tokens"
+                )
+            return cls(chars_per_token=chars_per_token)
+        try:
+            if Path(name).is_file():
+                tokenizer = Tokenizer.from_file(name)
+            else:
+                tokenizer = Tokenizer.from_pretrained(name)
+        except Exception as e:
+            if console is not None:
+                console.log(f"[yellow]Couldn't load tokenizer {name}, estimating tokens: {e}")
+            return cls(chars_per_token=chars_per_token)
+        return cls(tokenizer=tokenizer, chars_per_token=chars_per_token)
+
+    def count(self, text: str) -> int:
+        """Tokens in `text`."""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return int(len(text) / self.chars_per_token) + 1
+
+    def observe(self, chars: int, tokens: int) -> None:
+        """Calibrate the estimate with a known character and token count."""
+        if self.tokenizer is not None or chars <= 0 or tokens <= 0:
+            return
+        ratio = min(MAX_CHARS_PER_TOKEN, max(MIN_CHARS_PER_TOKEN, chars / tokens))
+        with self._lock:
+            self.chars_per_token += CALIBRATION_WEIGHT * (ratio - self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int, keep_tail: float = 0.0) -> str:
+        """
+        Shorten `text` to at most `max_tokens`, marking the cut.
+
+        Keeps the start, plus the end when `keep_tail` (a fraction of the
+        kept text) is above zero.
+        """
+        if self.count(text) <= max_tokens:
+            return text
+        budget = max_tokens - self.count(TRIM_MARKER)
+        if budget <= 0:
+            return ""
+        # Guess a length from the text's own density, then tighten
+        keep = int(len(text) * budget / max(1, self.count(text)))
+        while keep > 0:
+            tail = int(keep * keep_tail)
+            head = keep - tail
+            candidate = text[:head] + TRIM_MARKER + (text[-tail:] if tail else "")
+            if self.count(candidate) <= max_tokens:
+                return candidate
+            keep = int(keep * 0.9)
+        return ""
+
+
+def _text_of(content) -> str:
+    """The text of a message's content (string or list of parts)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") for part in content if part.get("type") == "text"
+        )
+    return ""
+
+
+def _image_count(content) -> int:
+    if not isinstance(content, list):
+        return 0
+    return sum(1 for part in content if part.get("type") == "image_url")
+
+
+def _with_text(content, text: str):
+    """Content with its text replaced, keeping any images."""
+    if isinstance(content, list):
+        parts = [part for part in content if part.get("type") != "text"]
+        return [{"type": "text", "text": text}, *parts]
+    return text
+
+
+class PromptBudget:
+    """Trims a chat request to fit the context window."""
+
+    def __init__(
+        self,
+        context_window: int,
+        reserve_tokens: int = DEFAULT_RESERVE_TOKENS,
+        counter: Optional[TokenCounter] = None,
+    ):
+        """
+        Args:
+            context_window: The model's context size in tokens
+            reserve_tokens: Tokens kept free for the answer
+            counter: Token counter (estimates by default)
+        """
+        self.context_window = int(context_window)
+        self.reserve_tokens = int(reserve_tokens)
+        self.counter = counter or TokenCounter()
+
+    @classmethod
+    def from_config(cls, oai_config: dict, console=None) -> Optional["PromptBudget"]:
+        """Build a budget from the `openai` config section; None if no window is set."""
+        window = oai_config.get("context_window")
+        if not window:
+            return None
+        return cls(
+            window,
+            reserve_tokens=oai_config.get("reserve_tokens", DEFAULT_RESERVE_TOKENS),
+            counter=TokenCounter.from_config(oai_config, console=console),
+        )
+
+    @property
+    def limit(self) -> int:
+        """Tokens available to the prompt."""
+        return self.context_window - self.reserve_tokens
+
+    def message_tokens(self, message: dict) -> int:
+        content = message.get("content")
+        return (
+            self.counter.count(_text_of(content))
+            + IMAGE_TOKENS * _image_count(content)
+            + MESSAGE_OVERHEAD
+        )
+
+    def tool_tokens(self, tools: Optional[list]) -> int:
+        return self.counter.count(json.dumps(tools)) if tools else 0
+
+    def total(self, messages: List[dict], tools: Optional[list] = None) -> int:
+        """Estimated prompt tokens of a request."""
+        return sum(map(self.message_tokens, messages)) + self.tool_tokens(tools)
+
+    def fit(
+        self, messages: List[dict], tools: Optional[list] = None
+    ) -> Tuple[List[dict], Optional[list], List[str]]:
+        """
+        Trim a request so it fits the window.
+
+        `messages` must be leading system messages, then history, then the
+        user's message last. They are not modified; trimmed copies are
+        returned.
+
+        Returns:
+            (messages, tools or None, descriptions of what was trimmed)
+        """
+        over = self.total(messages, tools) - self.limit
+        if over <= 0:
+            return messages, tools, []
+
+        trimmed: List[str] = []
+        system_count = 0
+        while (
+            system_count < len(messages) - 1
+            and messages[system_count].get("role") == "system"
+        ):
+            system_count += 1
+        system = messages[:system_count]
+        history = list(messages[system_count:-1])
+        user = dict(messages[-1])
+
+        # 1. Oldest history turns
+        dropped = 0
+        while history and over > 0:
+            turn = 1
+            while turn < len(history) and history[turn].get("role") != "user":
+                turn += 1
+            over -= sum(map(self.message_tokens, history[:turn]))
+            dropped += turn
+            del history[:turn]
+        if dropped:
+            trimmed.append(f"{dropped} history messages")
+
+        # 2. Fetched page text inside the user's message
+        text = _text_of(user.get("content"))
+        if over > 0:
+            blocks = list(URL_CONTENT_RE.finditer(text))
+            for match in reversed(blocks):
+                if over <= 0:
+                    break
+                page = match.group(2)
+                page_tokens = self.counter.count(page)
+                kept = self.counter.truncate(page, max(0, page_tokens - over))
+                over -= page_tokens - self.counter.count(kept)
+                text = text[: match.start(2)] + kept + text[match.end(2) :]
+                trimmed.append("fetched page text")
+
+        # 3. Tool schemas
+        if over > 0 and tools:
+            over -= self.tool_tokens(tools)
+            tools = None
+            trimmed.append("tool schemas")
+
+        # 4. The user's own text, keeping its start and end
+        if over > 0:
+            text_tokens = self.counter.count(text)
+            text = self.counter.truncate(
+                text, max(0, text_tokens - over), keep_tail=0.3
+            )
+            trimmed.append("the message")
+
+        user["content"] = _with_text(user.get("content"), text)
+        return [*system, *history, user], tools, trimmed
+
+    def observe(self, messages: List[dict], tools: Optional[list], usage) -> None:
+        """Calibrate the estimate from the API's usage report for a request."""
+        prompt_tokens = (usage or {}).get("prompt_tokens")
+        if not prompt_tokens or any(
+            _image_count(m.get("content")) for m in messages
+        ):
+            return
+        chars = sum(len(_text_of(m.get("content"))) for m in messages)
+        if tools:
+            chars += len(json.dumps(tools))
+        self.counter.observe(chars, prompt_tokens - MESSAGE_OVERHEAD * len(messages))
@@ -0,0 +1,118 @@
+"""
+Prompt layout that keeps llama.cpp-style prompt caches warm.
+
+Servers like llama.cpp keep the processed prompt (the KV cache) of each
+slot and only reprocess the part of a new prompt after the longest common
+prefix. The default layout defeats that: the system prompt is rendered
+with `{current_datetime}` at minute resolution and the user's name, so the
+very first tokens differ between requests.
+
+With `openai.prompt_layout: cached`:
+
+ - The system prompt, tool rules and capability matrix are rendered once
+   with volatile placeholders (time, date, username) replaced by a fixed
+   pointer to a context note, and the result is cached, so the prefix is
+   byte-for-byte the same on every request.
+ - The volatile values go in a short context note at the start of the
+   user's message, the last thing in the prompt.
+ - Requests carry `cache_prompt`, and with `openai.slots` set, `id_slot`:
+   each conversation (per system prompt) is pinned to one of the server's
+   slots, least recently used slots being reassigned first, so a `+`
+   thread finds its own history still cached.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+LAYOUT_INLINE = "inline"
+LAYOUT_CACHED = "cached"
+
+# Placeholders whose values change between requests
+VOLATILE_FIELDS = ("current_datetime", "today", "username")
+# Stands in for a volatile value in the static system prompt
+STANDIN = "(see the context note)"
+# Lines of the context note for each volatile placeholder used
+CONTEXT_LINES = {
+    "current_datetime": "Current date and time: {current_datetime}",
+    "today": "Today is {today}",
+    "username": "You are talking with {username}",
+}
+
+DEFAULT_CACHE_ENTRIES = 64
+
+
+def volatile_fields(template: str) -> list:
+    """Volatile placeholders used in a prompt template, in a fixed order."""
+    return [field for field in VOLATILE_FIELDS if f"{{{field}}}" in (template or "")]
+
+
+def prompt_key(template: str) -> str:
+    """Short stable id for a system prompt (its persona)."""
+    return hashlib.sha256((template or "").encode("utf-8")).hexdigest()[:16]
+
+
+class PromptLayout:
+    """Static system prompt cache and slot assignment. Thread-safe."""
+
+    def __init__(self, slots: int = 0, max_entries: int = DEFAULT_CACHE_ENTRIES):
+        """
+        Args:
+            slots: Server slots to spread conversations over (0 leaves it to the server)
+            max_entries: Rendered system prompts kept
+        """
+        self.slots = max(0, int(slots))
+        self.max_entries = max(1, int(max_entries))
+        self._prefixes: "OrderedDict[Hashable, str]" = OrderedDict()
+        # slot key -> slot, least recently used first
+        self._assigned: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, oai_config: dict) -> Optional["PromptLayout"]:
+        """Build a layout from the `openai` config section; None for the inline layout."""
+        if oai_config.get("prompt_layout", LAYOUT_INLINE) != LAYOUT_CACHED:
+            return None
+        return cls(slots=oai_config.get("slots", 0))
+
+    def static_prefix(self, key: Hashable, render: Callable[[], str]) -> str:
+        """The rendered static system prompt for `key`, rendering it on first use."""
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                return prefix
+        prefix = render()
+        with self._lock:
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def context_note(self, template: str, render: Callable[[str], str]) -> str:
+        """
+        The context note for a system prompt template ("" if it has no
+        volatile placeholders). `render` fills in placeholders.
+        """
+        lines = [CONTEXT_LINES[field] for field in volatile_fields(template)]
+        if not lines:
+            return ""
+        return render("(Context: " + ". ".join(lines) + ".)")
+
+    def slot_for(self, key: Hashable) -> Optional[int]:
+        """The server slot for a conversation, or None without configured slots."""
+        if not self.slots:
+            return None
+        with self._lock:
+            slot = self._assigned.get(key)
+            if slot is not None:
+                self._assigned.move_to_end(key)
+                return slot
+            if len(self._assigned) < self.slots:
+                used = set(self._assigned.values())
+                slot = next(n for n in range(self.slots) if n not in used)
+            else:
+                _, slot = self._assigned.popitem(last=False)
+            self._assigned[key] = slot
+            return slot
@@ -0,0 +1,135 @@
+"""
+Cache of chat completion responses for repeatable auxiliary calls.
+
+Some LLM calls are deterministic classification or verification steps at
+temperature 0 (picking a Wikipedia search result, checking an extract
+answers the question), and they run again whenever the same topic comes
+up. Call sites mark such calls `cacheable`; their responses are cached by
+a hash of everything that determines the answer (model, messages,
+temperature, response format and tools).
+
+Entries live in an in-memory LRU, optionally backed by a SQLite file so
+they survive restarts, and expire after `ttl` seconds. Thread-safe.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 512
+
+# Request fields that determine the answer
+KEY_FIELDS = ("model", "messages", "temperature", "response_format", "tools")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+"""
+
+
+def cache_key(payload: dict) -> str:
+    """Hash of the fields of a chat request that determine its response."""
+    fields = {name: payload.get(name) for name in KEY_FIELDS}
+    return hashlib.sha256(
+        json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            ttl: Seconds a response stays valid
+            max_entries: Responses kept in memory
+            path: SQLite file for the disk tier (None for memory only)
+            clock: Wall-clock time source (seconds); entries on disk outlive the process
+        """
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self.path = path
+        self.clock = clock
+        # key -> (stored_at, response JSON), least recently used first
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM responses WHERE stored_at < ?",
+                    (self.clock() - self.ttl,),
+                )
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional["ResponseCache"]:
+        """Build a cache from a {ttl, max_entries, path} dict; None if not configured."""
+        if config is None or config is False:
+            return None
+        if config is True:
+            config = {}
+        return cls(
+            ttl=config.get("ttl", DEFAULT_TTL),
+            max_entries=config.get("max_entries", DEFAULT_MAX_ENTRIES),
+            path=config.get("path"),
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        """A fresh copy of the cached response for `key`, or None."""
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._memory[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT stored_at, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[0] <= self.ttl:
+                    entry = (row[0], row[1])
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+        return json.loads(entry[1])
+
+    def put(self, key: str, response: dict) -> None:
+        """Cache a response."""
+        entry = (self.clock(), json.dumps(response))
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, stored_at) "
+                        "VALUES (?, ?, ?)",
+                        (key, entry[1], entry[0]),
+                    )
+
+    def _remember(self, key: str, entry: Tuple[float, str]) -> None:
+        """Store in memory and evict beyond max_entries; caller must hold the lock."""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
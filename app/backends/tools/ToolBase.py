@@ -12,6 +12,8 @@ from pathlib import Path
 from pydantic import BaseModel
 import inspect
 
+from app.lib.log import get_logger
+
 
 class ToolResult:
     """Represents the result of a tool execution."""
@@ -46,6 +48,8 @@ class ToolBase(ABC):
     name: str = "base_tool"
     description: str = "Base tool class"
     expertise_areas: List[str] = []  # Areas of expertise for this tool
+    # Most calls of this tool running at once (None: only the tool pool's limit)
+    max_concurrency: int | None = None
 
     def __init__(self, backend=None, frontend=None, media_backend=None, console=None):
         """
@@ -96,10 +100,18 @@ class ToolBase(ABC):
             schema["function"]["description"] = f"Execute the {self.name} tool"
         return schema
 
-    def log(self, message: str):
-        """Convenience method to log messages."""
+    def log(self, message: str, *args):
+        """
+        Convenience method to log messages (the `tools` log subsystem, info
+        level). `args` fill printf-style placeholders in `message`, only when
+        the level is enabled.
+        """
         if self.console:
-            self.console.log(f"[Tool:{self.name}] {message}")
+            if not args:
+                message = message.replace("%", "%%")
+            get_logger("tools", self.console).info(
+                "[Tool:%s] " + message, self.name, *args
+            )
 
     def get_expertise_areas(self) -> List[str]:
         """
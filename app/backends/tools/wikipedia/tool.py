@@ -12,13 +12,14 @@ from rich.console import Console
 from pydantic import BaseModel, Field
 
 from ..ToolBase import tool
+from app.lib.log import get_logger
 from app.lib.network import fetchHtml
 
-DEBUG = True
 SEARCH_RESULTS_LIMIT = 5
 CONTENT_VOTE_MAX_CANDIDATES = 5
 CONTENT_VOTE_MAX_CHARS = 1200
 console = Console()
+log = get_logger("wikipedia", console)
 
 
 def _fetch_wikipedia_extract(topic: str, max_chars: int = 8000) -> tuple[bool, str]:
@@ -170,8 +171,7 @@ def _extract_infobox_data(parsed) -> str:
                             clean_value = clean_value[:497] + "..."
                         infobox_lines.append(f"  • {key}: {clean_value}")
                 except Exception as e:
-                    if DEBUG:
-                        console.log(f"[yellow]Error parsing infobox field '{key}': {e}")
+                    log.debug("[yellow]Error parsing infobox field '%s': %s", key, e)
                     continue
 
             # Only include first infobox
@@ -270,9 +270,8 @@ def _fetch_wikipedia_article(
     url_query = f"https://en.wikipedia.org/w/index.php?action=raw&title={quote_plus(base_topic)}"
     raw_content = fetchHtml(url_query, allow_redirects=True, timeout=12)
 
-    if DEBUG:
-        console.log("[cyan]WIKIPEDIA TOOL FETCHED URL:", url_query)
-        console.log(f"[cyan]WIKIPEDIA RAW CONTENT LENGTH: {len(raw_content)} chars")
+    log.debug("WIKIPEDIA TOOL FETCHED URL: %s", url_query)
+    log.debug("WIKIPEDIA RAW CONTENT LENGTH: %s chars", len(raw_content))
 
     if isinstance(raw_content, str) and raw_content.startswith("[fetchHtml]"):
         return False, raw_content
@@ -284,10 +283,7 @@ def _fetch_wikipedia_article(
     if raw_content.startswith("#REDIRECT"):
         redirect_target = _extract_redirect_target(raw_content)
         if redirect_target:
-            if DEBUG:
-                console.log(
-                    f"[cyan]REDIRECT DETECTED: '{base_topic}' -> '{redirect_target}'"
-                )
+            log.debug("REDIRECT DETECTED: '%s' -> '%s'", base_topic, redirect_target)
             # Recursively follow the redirect
             return _fetch_wikipedia_article(redirect_target)
         else:
@@ -306,8 +302,7 @@ def _fetch_wikipedia_article(
     wiki_link = f"https://en.wikipedia.org/wiki/{base_topic.replace(' ', '_')}"
     result = f"{condensed}\n\nSource: {wiki_link}"
 
-    if DEBUG:
-        console.log(f"[green]WIKIPEDIA CONDENSED LENGTH: {len(result)} chars")
+    log.debug("[green]WIKIPEDIA CONDENSED LENGTH: %s chars", len(result))
 
     return True, result
 
@@ -322,8 +317,7 @@ def _search_wikipedia(query: str, limit: int = SEARCH_RESULTS_LIMIT) -> list[dic
 
     raw_json = fetchHtml(search_url, allow_redirects=True, timeout=8, bypass_cache=True)
 
-    if DEBUG:
-        console.log("[cyan]WIKIPEDIA SEARCH URL:", search_url)
+    log.debug("WIKIPEDIA SEARCH URL: %s", search_url)
 
     if isinstance(raw_json, str) and raw_json.startswith("[fetchHtml]"):
         return []
@@ -347,8 +341,7 @@ def _search_wikipedia(query: str, limit: int = SEARCH_RESULTS_LIMIT) -> list[dic
 
         return candidates[:limit]
     except Exception as e:
-        if DEBUG:
-            console.log(f"[yellow]Error parsing search response: {e}")
+        log.debug("[yellow]Error parsing search response: %s", e)
         return []
 
 
@@ -384,10 +377,11 @@ def _select_candidate_with_llm(query: str, candidates: list[dict], backend=None)
             system_prompt="Select the best Wikipedia article candidate for the user's request.",
             use_tools=False,
             temperature=0.0,
+            cacheable=True,
+            purpose="wikipedia_select",
         )
     except Exception as e:
-        if DEBUG:
-            console.log(f"[yellow]LLM selection failed: {e}")
+        log.debug("[yellow]LLM selection failed: %s", e)
         return -1
 
     match = re.search(r"\d+", response)
@@ -457,10 +451,11 @@ def _select_candidate_with_content(
             system_prompt="Select the best Wikipedia article candidate using condensed page content.",
             use_tools=False,
             temperature=0.0,
+            cacheable=True,
+            purpose="wikipedia_select",
         )
     except Exception as e:
-        if DEBUG:
-            console.log(f"[yellow]LLM content selection failed: {e}")
+        log.debug("[yellow]LLM content selection failed: %s", e)
         return -1
 
     match = re.search(r"\d+", response)
@@ -4,13 +4,30 @@ Tool management functionality for backends.
 This module provides a reusable ToolManager class that handles:
 - Tool initialization and registration
 - Tool schema generation for OpenAI-compatible APIs
-- Tool execution
+- Tool execution, including several calls of one LLM round at once
 - Media backend integration
 """
 
-from typing import Dict, Any
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Any, List, Optional, Tuple
 from .tools import get_all_tools
 from .tools.ToolBase import ToolResult
+from app.lib.deadline import (
+    ChildDeadline,
+    Deadline,
+    RequestAborted,
+    current_deadline,
+    deadline_scope,
+    timeout_for,
+)
+from app.lib.tracing import span
+
+# How often a call waiting for a free slot of its tool checks its deadline
+LIMIT_POLL_INTERVAL = 0.1
 
 
 TOOL_RULES = """You have access to tools for gathering real-world information and performing actions.
@@ -46,6 +63,9 @@ DECISION FRAMEWORK:
 
 TOOL_CALL_TEMP = 0.1  # Low temperature for tool calls to ensure deterministic behavior
 
+# Tool calls of one round run at once on up to this many threads
+DEFAULT_TOOL_WORKERS = 4
+
 
 class ToolManager:
     """Manages tool initialization, execution, and schema generation."""
@@ -67,6 +87,17 @@ class ToolManager:
         self.tools_enabled = True
         self.tools_supported = True  # Track if endpoint supports tools
 
+        oai_config = config.get("openai", {}) or {}
+        # Threads shared by concurrent tool calls
+        self.tool_workers = max(1, int(oai_config.get("tool_workers", DEFAULT_TOOL_WORKERS)))
+        # Seconds a tool call may take (None waits); also capped by the request's deadline
+        self.tool_timeout = oai_config.get("tool_timeout")
+        # Per-tool concurrency overrides: tool name -> max concurrent calls
+        self.tool_concurrency = oai_config.get("tool_concurrency") or {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._pool_lock = threading.Lock()
+
     def initialize(self, tools_enabled: bool = True) -> None:
         """
         Initialize and register available tools.
@@ -212,12 +243,140 @@ class ToolManager:
             return ToolResult(text=f"Error: Tool '{tool_name}' not found")
 
         tool = self.available_tools[tool_name]
+        with span(f"tool.{tool_name}"):
+            try:
+                result = tool.execute(**arguments)
+                return result
+            except RequestAborted:
+                # Cancelled or out of time: stop the tool loop, not just this call
+                raise
+            except Exception as e:
+                self.console.log(f"[red on cyan]Error executing tool {tool_name}: {e}")
+                return ToolResult(text=f"Error executing tool: {str(e)}")
+
+    def execute_tools(self, calls: List[Tuple[str, dict]]) -> List[ToolResult]:
+        """
+        Execute a round of tool calls at once.
+
+        Calls (even a lone one) run on a shared, bounded thread pool, at most `max_concurrency`
+        at a time per tool, so a round takes about as long as its slowest
+        call. Calls run under a deadline of the tool timeout (capped by the
+        request's), so their outbound calls time out with it. A call that
+        runs past it gets an error result and is cancelled, stopping at its
+        next deadline check; its thread is left to finish.
+
+        Args:
+            calls: (tool_name, arguments) pairs
+
+        Returns:
+            ToolResults in the same order as `calls`
+
+        Raises:
+            RequestAborted: If the request was cancelled or ran out of time
+        """
+        if not calls:
+            return []
+
+        parent = current_deadline()
+        timeout = timeout_for(self.tool_timeout)
+        round_deadline = ChildDeadline(parent, self.tool_timeout)
+        pool = self._get_pool()
+        with deadline_scope(round_deadline):
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._execute_limited, name, args)
+                for name, args in calls
+            ]
+        started = time.monotonic()
+
+        results = []
         try:
-            result = tool.execute(**arguments)
-            return result
-        except Exception as e:
-            self.console.log(f"[red on cyan]Error executing tool {tool_name}: {e}")
-            return ToolResult(text=f"Error executing tool: {str(e)}")
+            for (name, _), future in zip(calls, futures):
+                remaining = (
+                    None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+                )
+                try:
+                    results.append(future.result(timeout=remaining))
+                except (FutureTimeout, RequestAborted):
+                    results.append(self._overrun_result(name, timeout, parent))
+        finally:
+            # Stop overrunning calls, and drop queued ones that never started
+            round_deadline.cancel()
+            for future in futures:
+                future.cancel()
+        return results
+
+    async def execute_tools_async(
+        self, calls: List[Tuple[str, dict]]
+    ) -> List[ToolResult]:
+        """Async variant of `execute_tools`; tools still run on the thread pool."""
+        loop = asyncio.get_running_loop()
+        parent = current_deadline()
+        timeout = timeout_for(self.tool_timeout)
+        round_deadline = ChildDeadline(parent, self.tool_timeout)
+        pool = self._get_pool()
+
+        async def run(name, args):
+            with deadline_scope(round_deadline):
+                context = contextvars.copy_context()
+            future = loop.run_in_executor(
+                pool, context.run, self._execute_limited, name, args
+            )
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except (asyncio.TimeoutError, RequestAborted):
+                return self._overrun_result(name, timeout, parent)
+
+        try:
+            return list(
+                await asyncio.gather(*(run(name, args) for name, args in calls))
+            )
+        finally:
+            round_deadline.cancel()
+
+    def _execute_limited(self, tool_name: str, arguments: dict) -> ToolResult:
+        """execute_tool within the tool's concurrency limit."""
+        limit = self._limit_for(tool_name)
+        if limit is None:
+            return self.execute_tool(tool_name, arguments)
+        # Waiting on calls that hung holding the tool's slots ends with our
+        # deadline (timeout_for raises then)
+        while not limit.acquire(timeout=timeout_for(LIMIT_POLL_INTERVAL)):
+            pass
+        try:
+            return self.execute_tool(tool_name, arguments)
+        finally:
+            limit.release()
+
+    def _limit_for(self, tool_name: str) -> Optional[threading.BoundedSemaphore]:
+        """Semaphore bounding concurrent calls of a tool (None if unlimited)."""
+        with self._pool_lock:
+            if tool_name not in self._limits:
+                tool = self.available_tools.get(tool_name)
+                limit = self.tool_concurrency.get(
+                    tool_name, getattr(tool, "max_concurrency", None)
+                )
+                self._limits[tool_name] = (
+                    threading.BoundedSemaphore(int(limit)) if limit else None
+                )
+            return self._limits[tool_name]
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.tool_workers, thread_name_prefix="tool"
+                )
+            return self._pool
+
+    def _overrun_result(
+        self, tool_name: str, timeout: Optional[float], parent: Optional[Deadline]
+    ) -> ToolResult:
+        """Error result for a call that ran out of time; re-raises if the request should stop."""
+        if parent is not None:
+            parent.check()
+        after = f" after {timeout:.1f}s" if timeout is not None else ""
+        self.console.log(f"[red on cyan]Tool {tool_name} timed out{after}")
+        return ToolResult(text=f"Error: Tool '{tool_name}' timed out")
 
     def is_enabled(self) -> bool:
         """Check if tools are enabled."""
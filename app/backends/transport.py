@@ -0,0 +1,307 @@
+"""
+Pooled HTTP transport for chat completion requests.
+
+Opening a new connection for every chat call costs a TCP (and often TLS)
+handshake per LLM round, and a tool-using reply makes several rounds.
+ChatTransport keeps one `requests.Session` with a keep-alive connection
+pool for blocking calls and one `aiohttp.ClientSession` per event loop for
+async calls, so consecutive requests reuse their connections.
+
+Connect and read timeouts are separate: an unreachable server fails fast,
+while a slow generation may take as long as `read_timeout` (both capped by
+the request's deadline). Overloaded or restarting servers (429, 502, 503)
+and refused connections are retried with jittered exponential backoff,
+honouring `Retry-After`, for as long as the deadline allows.
+
+Payloads are encoded once, straight to bytes (with orjson when installed),
+and that buffer is handed to the HTTP client as the request body.
+
+For streamed responses, callers pass `on_line`, which receives each line of
+a successful response body as it arrives.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.lib.deadline import check_deadline, current_deadline, timeout_for
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 8.0
+DEFAULT_POOL_SIZE = 8
+
+# Statuses that mean "try again shortly" rather than "this request is bad"
+RETRY_STATUSES = frozenset({429, 502, 503})
+
+
+def encode_json(payload) -> bytes:
+    """Serialize a payload to a UTF-8 JSON request body."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (only the delta-seconds form)."""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+class ChatTransport:
+    """Sends JSON POSTs over pooled connections, with timeouts and retries. Thread-safe."""
+
+    def __init__(
+        self,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = None,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        verify: bool = False,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            connect_timeout: Seconds to establish a connection (None waits indefinitely)
+            read_timeout: Seconds to wait for the response (None waits indefinitely)
+            retries: Extra attempts after a 429/502/503 or refused connection
+            backoff: Base delay before the first retry, doubled per retry
+            max_backoff: Longest delay between attempts
+            pool_size: Keep-alive connections kept per host
+            verify: Verify TLS certificates
+            sleep: Blocking sleep, replaceable in tests
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = max(0, int(retries))
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.pool_size = max(1, int(pool_size))
+        self.verify = verify
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # aiohttp sessions are bound to the loop that created them
+        self._async_sessions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, oai_config: dict, **kwargs) -> "ChatTransport":
+        """Build a transport from the `openai` config section."""
+        return cls(
+            connect_timeout=oai_config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=oai_config.get("request_timeout"),
+            retries=oai_config.get("request_retries", DEFAULT_RETRIES),
+            backoff=oai_config.get("retry_backoff", DEFAULT_BACKOFF),
+            pool_size=oai_config.get("pool_size", DEFAULT_POOL_SIZE),
+            verify=oai_config.get("verify_tls", False),
+            **kwargs,
+        )
+
+    def retry_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (1-based).
+
+        A server-provided Retry-After wins (capped at max_backoff); otherwise
+        a random delay between half and all of the exponential backoff, so
+        concurrent callers don't retry in lockstep.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        ceiling = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def _timeouts(self) -> Tuple[Optional[float], Optional[float]]:
+        """(connect, read) timeouts for the next attempt, capped by the deadline."""
+        return timeout_for(self.connect_timeout), timeout_for(self.read_timeout)
+
+    def _may_retry(
+        self, attempt: int, delay: float, retries: Optional[int] = None
+    ) -> bool:
+        """True if another attempt is allowed and fits in the deadline."""
+        if attempt > (self.retries if retries is None else retries):
+            return False
+        deadline = current_deadline()
+        remaining = deadline.remaining() if deadline is not None else None
+        return remaining is None or delay < remaining
+
+    def post(
+        self,
+        url: str,
+        headers: dict,
+        payload,
+        attrs: Optional[dict] = None,
+        on_line: Optional[Callable[[bytes], None]] = None,
+        retries: Optional[int] = None,
+    ) -> Tuple[int, str]:
+        """
+        POST `payload` as JSON and return (status_code, response_text).
+
+        `attrs`, if given (e.g. a tracing span's attributes), receives the
+        number of attempts made. With `on_line`, a 2xx response body is
+        passed to it line by line as it arrives and "" is returned as the
+        text; error responses are returned whole as usual. `retries`
+        overrides the configured number of retries for this call.
+        """
+        body = encode_json(payload)
+        attempt = 0
+        while True:
+            attempt += 1
+            check_deadline()
+            if attrs is not None:
+                attrs["attempts"] = attempt
+            try:
+                response = self.session.post(
+                    url,
+                    headers=headers,
+                    data=body,
+                    verify=self.verify,
+                    timeout=self._timeouts(),
+                    stream=on_line is not None,
+                )
+            except requests.exceptions.Timeout:
+                # Report a spent request budget as such, not as a network error
+                check_deadline()
+                raise
+            except requests.exceptions.ConnectionError:
+                # Refused or dropped connection; chat requests are safe to resend
+                delay = self.retry_delay(attempt)
+                if not self._may_retry(attempt, delay, retries):
+                    raise
+                self.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUSES:
+                delay = self.retry_delay(
+                    attempt, _retry_after(response.headers.get("Retry-After"))
+                )
+                if self._may_retry(attempt, delay, retries):
+                    response.close()
+                    self.sleep(delay)
+                    continue
+            if on_line is not None and 200 <= response.status_code < 300:
+                with response:
+                    try:
+                        for line in response.iter_lines():
+                            check_deadline()
+                            on_line(line)
+                    except requests.exceptions.ConnectionError:
+                        # A stalled stream surfaces as a read timeout here
+                        check_deadline()
+                        raise
+                return response.status_code, ""
+            return response.status_code, response.text
+
+    async def post_async(
+        self,
+        url: str,
+        headers: dict,
+        payload,
+        attrs: Optional[dict] = None,
+        on_line: Optional[Callable[[bytes], None]] = None,
+        retries: Optional[int] = None,
+    ) -> Tuple[int, str]:
+        """Async variant of `post`; same arguments and return value."""
+        import aiohttp
+
+        session = self._async_session()
+        body = encode_json(payload)
+        attempt = 0
+        while True:
+            attempt += 1
+            check_deadline()
+            if attrs is not None:
+                attrs["attempts"] = attempt
+            connect, read = self._timeouts()
+            timeout = aiohttp.ClientTimeout(connect=connect, sock_read=read)
+            try:
+                async with session.post(
+                    url,
+                    headers=headers,
+                    data=body,
+                    ssl=None if self.verify else False,
+                    timeout=timeout,
+                ) as response:
+                    status = response.status
+                    if status in RETRY_STATUSES:
+                        delay = self.retry_delay(
+                            attempt, _retry_after(response.headers.get("Retry-After"))
+                        )
+                        if self._may_retry(attempt, delay, retries):
+                            await asyncio.sleep(delay)
+                            continue
+                    if on_line is not None and 200 <= status < 300:
+                        async for line in response.content:
+                            check_deadline()
+                            on_line(line)
+                        return status, ""
+                    return status, await response.text()
+            except aiohttp.ClientConnectorError:
+                delay = self.retry_delay(attempt)
+                if not self._may_retry(attempt, delay, retries):
+                    raise
+                await asyncio.sleep(delay)
+            except asyncio.TimeoutError:
+                check_deadline()
+                raise
+
+    def probe(self, url: str) -> bool:
+        """True if a GET of `url` answers 2xx within the connect timeout."""
+        try:
+            response = self.session.get(
+                url, verify=self.verify, timeout=self.connect_timeout
+            )
+        except requests.exceptions.RequestException:
+            return False
+        with response:
+            return 200 <= response.status_code < 300
+
+    def _async_session(self):
+        """The pooled aiohttp session for the running event loop."""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Drop sessions whose loops have gone away
+            for old_loop in [lp for lp in self._async_sessions if lp.is_closed()]:
+                del self._async_sessions[old_loop]
+            session = self._async_sessions.get(loop)
+            if session is None or session.closed:
+                session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit_per_host=self.pool_size)
+                )
+                self._async_sessions[loop] = session
+            return session
+
+    def close(self) -> None:
+        """Close pooled connections (async sessions only on their own loop)."""
+        self.session.close()
+        with self._lock:
+            sessions, self._async_sessions = self._async_sessions, {}
+        for loop, session in sessions.items():
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
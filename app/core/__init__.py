@@ -1,8 +1,28 @@
 """Core application services."""
 
-from app.core.message_router import MessageRouter
+from app.core.message_router import (
+    DeliveryQueue,
+    MessageRouter,
+    TransientDeliveryError,
+)
 from app.core.plugin_manager import PluginManager
 from app.core.media_manager import MediaManager
 from app.core.url_extractor import URLExtractor
+from app.core.conversation_store import ConversationStore
+from app.core.media_store import MediaStore
+from app.core.durable_queue import DurableQueue
+from app.core.broker import Broker, SqliteBroker
 
-__all__ = ["MessageRouter", "PluginManager", "MediaManager", "URLExtractor"]
+__all__ = [
+    "MessageRouter",
+    "PluginManager",
+    "MediaManager",
+    "URLExtractor",
+    "ConversationStore",
+    "MediaStore",
+    "DurableQueue",
+    "Broker",
+    "SqliteBroker",
+    "DeliveryQueue",
+    "TransientDeliveryError",
+]
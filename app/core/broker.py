@@ -0,0 +1,435 @@
+"""Work queue shared by an ingest process and worker processes.
+
+In distributed mode one process runs the frontend and only ingests: it
+puts each request on a Broker as a job. Any number of worker processes
+claim jobs, run them through their own MessageRouter, and put the replies
+back as results, which the ingest process delivers. `Broker` is the
+interface; `SqliteBroker` implements it on a SQLite file that every
+process opens, so it needs no outside services.
+
+Jobs and results are JSON-serializable dicts. A job carries its owner
+(for /cancel) and conversation key; a conversation stays with the worker
+that last handled it (so `+` history is found) unless that worker stops
+sending heartbeats, in which case its claimed jobs are requeued.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+# Seconds without a heartbeat before a worker counts as gone
+DEFAULT_LEASE = 60.0
+
+# Seconds a conversation stays with the worker that last handled it
+DEFAULT_AFFINITY_TTL = 3600.0
+
+# Jobs requeued from dead workers this many times are failed instead
+DEFAULT_MAX_ATTEMPTS = 2
+
+# Finished jobs are kept this long (for inspection), then pruned
+FINISHED_RETENTION_SECONDS = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    reply_to TEXT,
+    owner TEXT,
+    conv_key TEXT,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    claimed_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    final INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS affinity (
+    conv_key TEXT PRIMARY KEY,
+    worker TEXT NOT NULL,
+    seen_at REAL NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class RemoteAux:
+    """Stand-in aux for a job running on a worker; replies go back via the broker."""
+
+    job_id: int
+    conversation: Optional[tuple] = None
+
+
+@dataclass
+class Result:
+    """A reply put back by a worker."""
+
+    result_id: int
+    job_id: int
+    payload: dict
+    # serialized aux of the job, for rebuilding it in a restarted ingest process
+    reply_to: Optional[dict]
+    # True for the job's last result
+    final: bool
+
+
+def encode_files(paths: List[Optional[str]]) -> List[Optional[dict]]:
+    """Pack local files into {"name", "data"} dicts (None stays None) for a job or result."""
+    packed = []
+    for path in paths:
+        if not path or not os.path.isfile(path):
+            packed.append(None)
+            continue
+        with open(path, "rb") as f:
+            data = base64.b64encode(f.read()).decode("ascii")
+        packed.append({"name": os.path.basename(path), "data": data})
+    return packed
+
+
+def decode_files(packed: List[Optional[dict]], directory: str) -> List[Optional[str]]:
+    """Write files packed by encode_files() into `directory`; returns their paths."""
+    paths = []
+    for entry in packed:
+        if entry is None:
+            paths.append(None)
+            continue
+        path = os.path.join(directory, f"{uuid.uuid4()}_{entry['name']}")
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(entry["data"]))
+        paths.append(path)
+    return paths
+
+
+class Broker(ABC):
+    """Shared job queue between one ingest process and its workers."""
+
+    @abstractmethod
+    def put_job(
+        self,
+        payload: dict,
+        owner: Optional[str] = None,
+        conversation: Optional[tuple] = None,
+        reply_to: Optional[dict] = None,
+    ) -> int:
+        """Queue a job; returns its id."""
+
+    @abstractmethod
+    def claim_job(self, worker: str) -> Optional[Tuple[int, dict, Optional[tuple]]]:
+        """Take the next job this worker may run: (job_id, payload, conversation), or None."""
+
+    @abstractmethod
+    def heartbeat(self, worker: str) -> None:
+        """Report that `worker` is alive."""
+
+    @abstractmethod
+    def put_result(self, job_id: int, payload: dict, final: bool = True) -> None:
+        """Return a reply for a job; a final one also finishes the job."""
+
+    @abstractmethod
+    def take_results(self, limit: int = 20) -> List[Result]:
+        """Return undelivered results, oldest first."""
+
+    @abstractmethod
+    def ack_result(self, result_id: int) -> None:
+        """Forget a delivered result."""
+
+    @abstractmethod
+    def cancel(self, owner: str) -> int:
+        """Drop an owner's queued jobs and flag their running ones; returns the count."""
+
+    @abstractmethod
+    def take_cancellations(self, worker: str) -> List[str]:
+        """Return owners whose jobs on `worker` were cancelled, and finish those jobs."""
+
+    @abstractmethod
+    def pending(self) -> int:
+        """Number of jobs waiting to be claimed."""
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBroker(Broker):
+    """
+    Broker on a SQLite database file shared by every process.
+
+    Runs in WAL mode; claims take a write lock, so two workers never get
+    the same job. Thread-safe within a process.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease: float = DEFAULT_LEASE,
+        affinity_ttl: float = DEFAULT_AFFINITY_TTL,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            lease: Seconds without a heartbeat before a worker's jobs are requeued
+            affinity_ttl: Seconds a conversation sticks to its last worker
+            max_attempts: Claims allowed per job before it is failed
+        """
+        self.path = path
+        self.lease = lease
+        self.affinity_ttl = affinity_ttl
+        self.max_attempts = max(1, int(max_attempts))
+        self._lock = threading.Lock()
+        # Autocommit; transactions are explicit so claims can lock early
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._prune()
+
+    @classmethod
+    def from_config(cls, settings: dict) -> "SqliteBroker":
+        """Build a broker from the `distributed` config section."""
+        return cls(
+            settings["path"],
+            lease=settings.get("lease", DEFAULT_LEASE),
+            affinity_ttl=settings.get("affinity_ttl", DEFAULT_AFFINITY_TTL),
+            max_attempts=settings.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block as one write transaction."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def put_job(
+        self,
+        payload: dict,
+        owner: Optional[str] = None,
+        conversation: Optional[tuple] = None,
+        reply_to: Optional[dict] = None,
+    ) -> int:
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (payload, reply_to, owner, conv_key, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    json.dumps(payload),
+                    json.dumps(reply_to) if reply_to is not None else None,
+                    owner,
+                    json.dumps(list(conversation)) if conversation else None,
+                    time.time(),
+                ),
+            )
+            return cursor.lastrowid
+
+    def claim_job(self, worker: str) -> Optional[Tuple[int, dict, Optional[tuple]]]:
+        now = time.time()
+        with self._transaction() as db:
+            self._touch(db, worker, now)
+            self._requeue_abandoned(db, now)
+
+            # Oldest job whose conversation isn't running on, or sticking
+            # to, another live worker
+            row = db.execute(
+                """
+                SELECT j.id, j.payload, j.conv_key FROM jobs j
+                WHERE j.state = 'queued'
+                AND (j.conv_key IS NULL OR (
+                    NOT EXISTS (
+                        SELECT 1 FROM jobs c
+                        WHERE c.conv_key = j.conv_key AND c.worker != :worker
+                        AND c.state IN ('claimed', 'cancelling')
+                    )
+                    AND NOT EXISTS (
+                        SELECT 1 FROM affinity a JOIN workers w ON w.worker = a.worker
+                        WHERE a.conv_key = j.conv_key AND a.worker != :worker
+                        AND a.seen_at >= :sticky_since AND w.seen_at >= :alive_since
+                    )
+                ))
+                ORDER BY j.id LIMIT 1
+                """,
+                {
+                    "worker": worker,
+                    "sticky_since": now - self.affinity_ttl,
+                    "alive_since": now - self.lease,
+                },
+            ).fetchone()
+            if row is None:
+                return None
+
+            job_id, payload, conv_key = row
+            db.execute(
+                "UPDATE jobs SET state = 'claimed', worker = ?, claimed_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker, now, job_id),
+            )
+            if conv_key is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO affinity (conv_key, worker, seen_at) "
+                    "VALUES (?, ?, ?)",
+                    (conv_key, worker, now),
+                )
+
+        conversation = tuple(json.loads(conv_key)) if conv_key else None
+        return job_id, json.loads(payload), conversation
+
+    def heartbeat(self, worker: str) -> None:
+        with self._transaction() as db:
+            self._touch(db, worker, time.time())
+
+    def put_result(self, job_id: int, payload: dict, final: bool = True) -> None:
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO results (job_id, payload, final) VALUES (?, ?, ?)",
+                (job_id, json.dumps(payload), int(final)),
+            )
+            if final:
+                db.execute(
+                    "UPDATE jobs SET state = 'done', finished_at = ? WHERE id = ?",
+                    (time.time(), job_id),
+                )
+
+    def take_results(self, limit: int = 20) -> List[Result]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.id, r.job_id, r.payload, j.reply_to, r.final "
+                "FROM results r LEFT JOIN jobs j ON j.id = r.job_id "
+                "ORDER BY r.id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            Result(
+                result_id=row[0],
+                job_id=row[1],
+                payload=json.loads(row[2]),
+                reply_to=json.loads(row[3]) if row[3] else None,
+                final=bool(row[4]),
+            )
+            for row in rows
+        ]
+
+    def ack_result(self, result_id: int) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM results WHERE id = ?", (result_id,))
+
+    def cancel(self, owner: str) -> int:
+        now = time.time()
+        with self._transaction() as db:
+            dropped = db.execute(
+                "UPDATE jobs SET state = 'done', finished_at = ? "
+                "WHERE owner = ? AND state = 'queued'",
+                (now, owner),
+            ).rowcount
+            flagged = db.execute(
+                "UPDATE jobs SET state = 'cancelling' "
+                "WHERE owner = ? AND state = 'claimed'",
+                (owner,),
+            ).rowcount
+        return dropped + flagged
+
+    def take_cancellations(self, worker: str) -> List[str]:
+        with self._transaction() as db:
+            owners = [
+                row[0]
+                for row in db.execute(
+                    "SELECT DISTINCT owner FROM jobs "
+                    "WHERE worker = ? AND state = 'cancelling'",
+                    (worker,),
+                )
+            ]
+            db.execute(
+                "UPDATE jobs SET state = 'done', finished_at = ? "
+                "WHERE worker = ? AND state = 'cancelling'",
+                (time.time(), worker),
+            )
+        return owners
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'queued'"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _touch(self, db: sqlite3.Connection, worker: str, now: float) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO workers (worker, seen_at) VALUES (?, ?)",
+            (worker, now),
+        )
+
+    def _requeue_abandoned(self, db: sqlite3.Connection, now: float) -> None:
+        """Requeue (or fail) jobs held by workers that stopped heartbeating."""
+        dead = "SELECT worker FROM workers WHERE seen_at < ?"
+        cutoff = now - self.lease
+        for (job_id,) in db.execute(
+            f"SELECT id FROM jobs WHERE state = 'claimed' AND attempts >= ? "
+            f"AND worker IN ({dead})",
+            (self.max_attempts, cutoff),
+        ).fetchall():
+            db.execute(
+                "INSERT INTO results (job_id, payload, final) VALUES (?, ?, 1)",
+                (job_id, json.dumps({"failed": True})),
+            )
+        db.execute(
+            f"UPDATE jobs SET state = 'done', finished_at = ? "
+            f"WHERE (state = 'cancelling' OR (state = 'claimed' AND attempts >= ?)) "
+            f"AND worker IN ({dead})",
+            (now, self.max_attempts, cutoff),
+        )
+        db.execute(
+            f"UPDATE jobs SET state = 'queued', worker = NULL "
+            f"WHERE state = 'claimed' AND worker IN ({dead})",
+            (cutoff,),
+        )
+
+    def _prune(self) -> None:
+        cutoff = time.time() - FINISHED_RETENTION_SECONDS
+        with self._transaction() as db:
+            db.execute(
+                "DELETE FROM jobs WHERE state = 'done' AND finished_at < ? "
+                "AND id NOT IN (SELECT job_id FROM results)",
+                (cutoff,),
+            )
+            db.execute("DELETE FROM workers WHERE seen_at < ?", (cutoff,))
+            db.execute("DELETE FROM affinity WHERE seen_at < ?", (cutoff,))
+
+
+def make_broker(settings: dict) -> Broker:
+    """Build the broker named by `settings["broker"]` (default "sqlite")."""
+    kind = settings.get("broker", "sqlite")
+    if kind == "sqlite":
+        return SqliteBroker.from_config(settings)
+    raise ValueError(f"Unknown broker: {kind}")
+
+
+def new_worker_id() -> str:
+    """Return an id for this worker process, unique across hosts."""
+    return f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
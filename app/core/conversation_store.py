@@ -0,0 +1,200 @@
+"""Per-conversation chat history for `+` continuation."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+DEFAULT_MAX_TURNS = 20
+DEFAULT_IDLE_TTL = 60 * 60  # 1 hour
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _message_size(message: dict) -> int:
+    """Approximate memory used by a stored message (text plus media digests)."""
+    size = len(message.get("content") or "")
+    for digest in message.get("media_hashes") or []:
+        size += len(digest)
+    return size
+
+
+class _Conversation:
+    def __init__(self, now: float):
+        self.messages: List[dict] = []
+        self.size = 0
+        self.last_used = now
+
+
+class ConversationStore:
+    """
+    Thread-safe history store, one message list per conversation key.
+
+    Each conversation keeps at most `max_turns` user/assistant turns and is
+    dropped after `idle_ttl` seconds without use. When the combined size of
+    all conversations exceeds `max_bytes`, the least recently used ones are
+    evicted.
+
+    Messages are stored as:
+        {"role": "user", "content": "text", "media_hashes": ["<sha256>"]}
+        {"role": "assistant", "content": "text"}
+
+    Media digests refer to files in a MediaStore; the store's reference is
+    released when the message is dropped.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = DEFAULT_MAX_TURNS,
+        idle_ttl: float = DEFAULT_IDLE_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        media_store: Any = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_turns: Maximum user/assistant turns kept per conversation
+            idle_ttl: Seconds of inactivity before a conversation expires
+            max_bytes: Approximate cap on the size of all stored messages
+            media_store: MediaStore that owns the digests in `media_hashes`
+            clock: Monotonic time source (seconds)
+        """
+        self.max_turns = max(1, int(max_turns))
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.media_store = media_store
+        self.clock = clock
+        self.total_bytes = 0
+        # Least recently used first
+        self._conversations: "OrderedDict[Hashable, _Conversation]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs) -> "ConversationStore":
+        """Build a store from the `conversation_*` config keys."""
+        return cls(
+            max_turns=config.get("conversation_max_turns", DEFAULT_MAX_TURNS),
+            idle_ttl=config.get("conversation_idle_ttl", DEFAULT_IDLE_TTL),
+            max_bytes=config.get("conversation_max_bytes", DEFAULT_MAX_BYTES),
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._conversations)
+
+    def history(self, key: Hashable) -> List[dict]:
+        """
+        Get a conversation's messages, oldest first.
+
+        Args:
+            key: Conversation key
+
+        Returns:
+            A copy of the stored messages (empty if none)
+        """
+        with self._lock:
+            convo = self._touch(key)
+            return list(convo.messages) if convo else []
+
+    def last_assistant_message(self, key: Hashable) -> Optional[str]:
+        """Get the most recent assistant reply in a conversation, if any."""
+        with self._lock:
+            convo = self._touch(key)
+            if convo:
+                for message in reversed(convo.messages):
+                    if message.get("role") == "assistant":
+                        return message.get("content", "")
+            return None
+
+    def append_turn(
+        self, key: Hashable, user_message: dict, assistant_message: dict
+    ) -> None:
+        """
+        Record a user/assistant exchange, enforcing the turn and size caps.
+
+        Args:
+            key: Conversation key
+            user_message: The user's message dict
+            assistant_message: The assistant's reply dict
+        """
+        with self._lock:
+            convo = self._touch(key)
+            if convo is None:
+                convo = _Conversation(self.clock())
+                self._conversations[key] = convo
+
+            for message in (user_message, assistant_message):
+                convo.messages.append(message)
+                size = _message_size(message)
+                convo.size += size
+                self.total_bytes += size
+
+            while len(convo.messages) > self.max_turns * 2:
+                self._drop_oldest_turn(convo)
+
+            self._evict(keep=key)
+
+    def clear(self, key: Hashable) -> int:
+        """
+        Forget a conversation.
+
+        Args:
+            key: Conversation key
+
+        Returns:
+            Number of messages dropped
+        """
+        with self._lock:
+            convo = self._conversations.pop(key, None)
+            if convo is None:
+                return 0
+            self.total_bytes -= convo.size
+            for message in convo.messages:
+                self._release_media(message)
+            return len(convo.messages)
+
+    def _touch(self, key: Hashable) -> Optional[_Conversation]:
+        """Expire idle conversations, then mark `key` as most recently used."""
+        self._expire()
+        convo = self._conversations.get(key)
+        if convo is not None:
+            convo.last_used = self.clock()
+            self._conversations.move_to_end(key)
+        return convo
+
+    def _expire(self) -> None:
+        cutoff = self.clock() - self.idle_ttl
+        while self._conversations:
+            key, convo = next(iter(self._conversations.items()))
+            if convo.last_used > cutoff:
+                break
+            self.clear(key)
+
+    def _drop_oldest_turn(self, convo: _Conversation) -> None:
+        """Drop the oldest user/assistant pair so history never starts mid-turn."""
+        for message in convo.messages[:2]:
+            size = _message_size(message)
+            convo.size -= size
+            self.total_bytes -= size
+            self._release_media(message)
+        del convo.messages[:2]
+
+    def _release_media(self, message: dict) -> None:
+        if self.media_store is None:
+            return
+        for digest in message.get("media_hashes") or []:
+            self.media_store.release(digest)
+
+    def _evict(self, keep: Hashable) -> None:
+        """Evict least recently used conversations until under `max_bytes`."""
+        while self.total_bytes > self.max_bytes and len(self._conversations) > 1:
+            key = next(iter(self._conversations))
+            if key == keep:
+                break
+            self.clear(key)
+
+        # A single conversation larger than the cap keeps only its latest turn
+        convo = self._conversations.get(keep)
+        while self.total_bytes > self.max_bytes and convo and len(convo.messages) > 2:
+            self._drop_oldest_turn(convo)
@@ -0,0 +1,133 @@
+"""SQLite-backed journal of router requests for crash recovery."""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+# Finished requests are kept this long (for inspection), then pruned
+FINISHED_RETENTION_SECONDS = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS requests_state ON requests (state);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    request_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (request_id, name)
+);
+"""
+
+
+class DurableQueue:
+    """
+    Records each request's enqueue, start and finish so that requests
+    interrupted by a restart can be replayed.
+
+    Payloads and checkpoint values must be JSON-serializable. The database
+    runs in WAL mode so journal writes don't block readers. Thread-safe.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._prune()
+
+    def enqueue(self, payload: dict) -> int:
+        """
+        Journal a new request.
+
+        Args:
+            payload: JSON-serializable request data
+
+        Returns:
+            The request id
+        """
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO requests (payload, enqueued_at) VALUES (?, ?)",
+                (json.dumps(payload), time.time()),
+            )
+            return cursor.lastrowid
+
+    def mark_started(self, request_id: int) -> None:
+        """Record that a worker has begun processing a request."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE requests SET state = 'running', started_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (time.time(), request_id),
+            )
+
+    def mark_finished(self, request_id: int) -> None:
+        """Record that a request is done (answered or given up on); drops its checkpoints."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE requests SET state = 'done', finished_at = ? WHERE id = ?",
+                (time.time(), request_id),
+            )
+            self._db.execute(
+                "DELETE FROM checkpoints WHERE request_id = ?", (request_id,)
+            )
+
+    def unfinished(self) -> List[Tuple[int, dict, int]]:
+        """
+        List requests that were queued or running but never finished.
+
+        Returns:
+            List of (request_id, payload, attempts), oldest first
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, payload, attempts FROM requests "
+                "WHERE state != 'done' ORDER BY id"
+            ).fetchall()
+        return [(row[0], json.loads(row[1]), row[2]) for row in rows]
+
+    def load_checkpoint(self, request_id: int, name: str) -> Optional[Any]:
+        """Get a saved intermediate result for a request, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM checkpoints WHERE request_id = ? AND name = ?",
+                (request_id, name),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_checkpoint(self, request_id: int, name: str, value: Any) -> None:
+        """Save an intermediate result so a replay of the request can reuse it."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (request_id, name, value) "
+                "VALUES (?, ?, ?)",
+                (request_id, name, json.dumps(value)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - FINISHED_RETENTION_SECONDS
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM requests WHERE state = 'done' AND finished_at < ?",
+                (cutoff,),
+            )
@@ -0,0 +1,160 @@
+"""Content-addressed storage for media kept in conversation history."""
+
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from rich.console import Console
+
+from app.lib.hashing import sha256_file
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def process_store_dir(root: str) -> str:
+    """
+    Pick this process's store directory under `root`.
+
+    Processes on one host (an ingest process and its workers) share the
+    media dir, and each one's store is cleared when it starts, so each gets
+    its own subdirectory. Those left by processes that have exited are
+    removed.
+
+    Args:
+        root: Directory holding the per-process stores
+
+    Returns:
+        Path of this process's store directory
+    """
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    for old in root_path.iterdir():
+        if old.is_dir() and old.name.isdigit() and not _pid_alive(int(old.name)):
+            shutil.rmtree(old, ignore_errors=True)
+    return str(root_path / str(os.getpid()))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class _Entry:
+    def __init__(self, path: Path, size: int):
+        self.path = path
+        self.size = size
+        self.refs = 0
+
+
+class MediaStore:
+    """
+    Stores media files on disk under their SHA-256 digest.
+
+    Conversation history holds digests instead of file contents. Each
+    `put()` takes a reference that a matching `release()` gives back;
+    identical uploads share one file. Unreferenced files are kept (so a
+    re-sent image is free) until the store grows past `max_bytes`, then
+    deleted least recently used first. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        console: Console,
+        store_dir: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """
+        Args:
+            console: Rich console for logging
+            store_dir: Directory to keep stored files in
+            max_bytes: Size above which unreferenced files are deleted
+        """
+        self.console = console
+        self.store_dir = Path(store_dir)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: Dict[str, _Entry] = {}
+        # Unreferenced digests, least recently used first
+        self._unreferenced: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        # History doesn't survive a restart, so neither does anything it referenced
+        for leftover in self.store_dir.iterdir():
+            if leftover.is_file():
+                leftover.unlink(missing_ok=True)
+
+    def put(self, path: str) -> Optional[str]:
+        """
+        Add a file to the store (or reference an identical stored copy).
+
+        Args:
+            path: Path to the source file; it is copied, not moved
+
+        Returns:
+            The file's digest, or None if it couldn't be read
+        """
+        try:
+            digest = sha256_file(path)
+        except OSError as e:
+            self.console.log(f"[yellow]Failed to hash media '{path}': {e}")
+            return None
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                stored = self.store_dir / f"{digest}{Path(path).suffix.lower()}"
+                # A private copy: a hardlink would change under the digest
+                # if the source file is later rewritten in place
+                try:
+                    shutil.copyfile(path, stored)
+                except OSError as e:
+                    self.console.log(f"[yellow]Failed to store media '{path}': {e}")
+                    return None
+                entry = _Entry(stored, stored.stat().st_size)
+                self._entries[digest] = entry
+                self.total_bytes += entry.size
+
+            entry.refs += 1
+            self._unreferenced.pop(digest, None)
+            self._evict()
+            return digest
+
+    def path(self, digest: str) -> Optional[str]:
+        """Get the stored file path for a digest, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            return str(entry.path) if entry else None
+
+    def release(self, digest: str) -> None:
+        """Drop one reference to a digest taken by `put()`."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry.refs == 0:
+                return
+            entry.refs -= 1
+            if entry.refs == 0:
+                self._unreferenced[digest] = None
+                self._evict()
+
+    def refs(self, digest: str) -> int:
+        """Number of outstanding references to a digest."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            return entry.refs if entry else 0
+
+    def _evict(self) -> None:
+        """Delete unreferenced files until under `max_bytes`; caller holds the lock."""
+        while self.total_bytes > self.max_bytes and self._unreferenced:
+            digest, _ = self._unreferenced.popitem(last=False)
+            entry = self._entries.pop(digest)
+            self.total_bytes -= entry.size
+            entry.path.unlink(missing_ok=True)
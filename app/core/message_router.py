@@ -1,12 +1,56 @@
 """Message queue management and routing."""
 
-import queue as q
+import asyncio
+import itertools
+import mimetypes
 import re
 import threading
 import time
-from typing import Any, Callable, Optional, List
+from collections import deque
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+)
 from rich.console import Console
 
+from app.core.broker import (
+    RemoteAux,
+    decode_files,
+    encode_files,
+    make_broker,
+    new_worker_id,
+)
+from app.core.conversation_store import ConversationStore
+from app.core.durable_queue import DurableQueue
+from app.core.media_store import MediaStore
+from app.lib.checkpoint import checkpoint_scope
+from app.lib.conversation import conversation_key
+from app.lib.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    RequestAborted,
+    check_deadline,
+    current_deadline,
+    deadline_scope,
+)
+from app.lib.flow import run_flow, run_flow_async
+from app.lib.ratelimit import RateLimiter
+from app.lib.tracing import (
+    Trace,
+    TraceLog,
+    current_trace,
+    format_timing_footer,
+    span,
+    trace_scope,
+)
 from app.lib.thread_history import ThreadManager
 from app.core.plugin_manager import PluginManager
 from app.core.media_manager import MediaManager
@@ -34,12 +78,600 @@ def _is_youtube_url(url: str) -> bool:
     return bool(_YOUTUBE_URL_RE.search(url))
 
 
-# Global conversation history for + prefix continuation
-_conversation_history: list[dict] = []
-# Structure: [
-#     {"role": "user", "content": "text", "media_data_uris": ["data:image/..."]},
-#     {"role": "assistant", "content": "text"},
-# ]
+# Lane used for everything when lanes are not configured
+DEFAULT_LANE = "default"
+
+# Lane used for plain chat and for plugins that don't declare one
+LLM_LANE = "llm"
+
+# Built-in lane settings; `router_lanes` in config is merged over these
+LANE_DEFAULTS = {
+    "instant": {"workers": 2, "max_depth": 50, "deadline": 30},
+    "llm": {"workers": 1, "max_depth": 20, "deadline": 300},
+    "heavy": {"workers": 1, "max_depth": 5, "deadline": 900},
+}
+
+# Seconds a request may run once picked up, unless its lane or plugin says otherwise
+DEFAULT_DEADLINE = 300
+
+# Command that cancels the sender's queued and running requests
+CANCEL_COMMAND = "cancel"
+
+MSG_BUSY = "I'm busy right now; please try again in a bit."
+MSG_RATE_LIMITED = "Whoa, slow down! Give me a moment before the next one."
+MSG_REPLAY_GAVE_UP = "Sorry, I restarted while working on that and couldn't finish it."
+MSG_TIMED_OUT = "Sorry, that took too long, so I gave up on it."
+MSG_CANCELLED = "Cancelled {count} request(s)."
+MSG_NOTHING_TO_CANCEL = "You have nothing queued or running to cancel."
+
+# Replayed requests that already crashed this many times are dropped
+DEFAULT_DURABLE_MAX_ATTEMPTS = 2
+
+# Distributed mode: "ingest" runs the frontend and queues jobs on the
+# broker, "worker" runs them; "standalone" (default) does both in-process
+ROLE_STANDALONE = "standalone"
+ROLE_INGEST = "ingest"
+ROLE_WORKER = "worker"
+
+# Seconds between broker polls when there is nothing to do
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+def _auto_route(message: str) -> str:
+    """Rewrite a bare-URL message into the plugin command that handles it.
+
+    YouTube links go to /yt, everything else to /summarize. Other messages
+    are returned unchanged.
+    """
+    if message.startswith("/"):
+        return message
+
+    bare_url = _is_bare_url(message)
+    if not bare_url:
+        return message
+
+    if _is_youtube_url(bare_url):
+        return f"/yt {bare_url}"
+    return f"/summarize {bare_url}"
+
+
+def _step_span_name(step: tuple) -> str:
+    """Name the trace span for a MessageRouter flow step."""
+    kind, kwargs = step
+    if kind == "plugin":
+        return f"plugin.{kwargs.get('plugin_name')}"
+    return kind
+
+
+class FairQueue:
+    """
+    Weighted round-robin queue across tenants (users).
+
+    Each tenant has its own FIFO sub-queue; pops rotate between tenants,
+    taking up to `weight` items from a tenant per turn. Not thread-safe;
+    callers provide locking.
+    """
+
+    def __init__(self, weights: Optional[Dict[Hashable, int]] = None):
+        """
+        Initialize the queue.
+
+        Args:
+            weights: Optional {tenant: weight} map; unlisted tenants weigh 1
+        """
+        self.weights = weights or {}
+        self._queues: Dict[Hashable, Deque[Any]] = {}
+        # tenants with queued items, in service order
+        self._ring: Deque[Hashable] = deque()
+        self._served = 0  # items taken from the head tenant this turn
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, tenant: Hashable, item: Any) -> None:
+        """Append an item to a tenant's sub-queue."""
+        if tenant not in self._queues:
+            self._queues[tenant] = deque()
+            self._ring.append(tenant)
+        self._queues[tenant].append(item)
+        self._size += 1
+
+    def pop(self) -> Any:
+        """
+        Remove and return the next item in weighted round-robin order.
+
+        Raises:
+            IndexError: If the queue is empty
+        """
+        if not self._ring:
+            raise IndexError("pop from an empty FairQueue")
+
+        tenant = self._ring[0]
+        queue = self._queues[tenant]
+        item = queue.popleft()
+        self._size -= 1
+        self._served += 1
+
+        if not queue:
+            del self._queues[tenant]
+            self._ring.popleft()
+            self._served = 0
+        elif self._served >= max(1, int(self.weights.get(tenant, 1))):
+            self._ring.rotate(-1)
+            self._served = 0
+
+        return item
+
+    def remove(self, match: Callable[[Any], bool]) -> List[Any]:
+        """Remove and return every queued item for which `match(item)` is true."""
+        removed = []
+        for tenant in list(self._ring):
+            queue = self._queues[tenant]
+            kept = deque(item for item in queue if not match(item))
+            if len(kept) == len(queue):
+                continue
+            removed.extend(item for item in queue if match(item))
+            self._size -= len(queue) - len(kept)
+            if kept:
+                self._queues[tenant] = kept
+            else:
+                if self._ring[0] == tenant:
+                    self._served = 0
+                del self._queues[tenant]
+                self._ring.remove(tenant)
+        return removed
+
+
+class KeyedScheduler:
+    """
+    Bounded worker pool that runs items serially per key.
+
+    Items sharing a key are processed one at a time in submission order;
+    items with different keys run concurrently, up to `workers` at once.
+    Items submitted with key=None get a unique key, so an unkeyed scheduler
+    with a single worker is a plain FIFO queue. When `max_depth` is set,
+    submissions are refused once that many items are waiting.
+
+    Submissions first land in a per-tenant FairQueue backlog and are only
+    released to the keyed queues as workers free up, so one tenant's burst
+    can't crowd out everyone else.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], None],
+        console: Console,
+        workers: int = 1,
+        name: str = "router",
+        max_depth: Optional[int] = None,
+        weights: Optional[Dict[Hashable, int]] = None,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            handler: Callable invoked with each submitted item
+            console: Rich console for logging
+            workers: Maximum number of items processed concurrently
+            name: Name used for worker threads
+            max_depth: Maximum number of waiting items (None for unbounded)
+            weights: Optional {tenant: weight} map for fair queuing
+        """
+        self.handler = handler
+        self.console = console
+        self.num_workers = max(1, int(workers))
+        self.name = name
+        self.max_depth = max_depth
+        self.workers: List[threading.Thread] = []
+
+        self._cond = threading.Condition()
+        # submitted items not yet released to a key: (key, item)
+        self._backlog = FairQueue(weights)
+        # key -> released items waiting behind the key's running/ready item
+        self._pending: Dict[Hashable, Deque[Any]] = {}
+        # keys whose head item may run now, in FIFO order
+        self._ready: Deque[Hashable] = deque()
+        self._running = 0
+        self._unkeyed = itertools.count()
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start the worker threads."""
+        self._stopping = False
+        self.workers = []
+        for idx in range(self.num_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"ircawp-{self.name}-{idx}",
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(
+        self,
+        item: Any,
+        key: Optional[Hashable] = None,
+        tenant: Optional[Hashable] = None,
+    ) -> bool:
+        """
+        Queue an item for processing.
+
+        Args:
+            item: The item to pass to the handler
+            key: Ordering key; items with equal keys never run concurrently
+            tenant: Fair-queuing owner of the item (e.g. user id)
+
+        Returns:
+            True if the item was queued, False if the scheduler is full
+        """
+        with self._cond:
+            if self.max_depth is not None and self._depth() >= self.max_depth:
+                return False
+
+            if key is None:
+                key = ("__unkeyed__", next(self._unkeyed))
+
+            self._backlog.push(tenant, (key, item))
+            self._release()
+            return True
+
+    def pending(self) -> int:
+        """Return the number of queued items not yet picked up by a worker."""
+        with self._cond:
+            return self._depth()
+
+    def remove(self, match: Callable[[Any], bool]) -> List[Any]:
+        """
+        Drop waiting items for which `match(item)` is true.
+
+        Items already handed to a worker are not affected.
+
+        Returns:
+            The removed items
+        """
+        with self._cond:
+            removed = [
+                item
+                for _, item in self._backlog.remove(lambda entry: match(entry[1]))
+            ]
+            for key in list(self._pending):
+                items = self._pending[key]
+                kept = deque(item for item in items if not match(item))
+                if len(kept) == len(items):
+                    continue
+                removed.extend(item for item in items if match(item))
+                if kept or key not in self._ready:
+                    # Running keys keep their (possibly empty) queue for _finish
+                    self._pending[key] = kept
+                else:
+                    self._ready.remove(key)
+                    del self._pending[key]
+            self._release()
+            if self._stopping and self._drained():
+                self._wake_all()
+            return removed
+
+    def _depth(self) -> int:
+        """Count waiting items; caller must hold the lock."""
+        released = sum(len(items) for items in self._pending.values())
+        return len(self._backlog) + released
+
+    def _release(self) -> None:
+        """
+        Move backlog items onto their keys while workers would sit idle.
+
+        Caller must hold the lock.
+        """
+        while self._backlog and len(self._ready) < self.num_workers - self._running:
+            key, item = self._backlog.pop()
+            if key in self._pending:
+                # Key is running or already ready; wait behind it
+                self._pending[key].append(item)
+            else:
+                self._pending[key] = deque([item])
+                self._ready.append(key)
+                self._wake()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker threads once all queued items have been processed.
+
+        Args:
+            timeout: Maximum seconds to wait for each worker to finish
+        """
+        with self._cond:
+            self._stopping = True
+            self._wake_all()
+
+        for worker in self.workers:
+            worker.join(timeout)
+
+        self.workers = []
+
+    def _drained(self) -> bool:
+        """True when nothing is queued anywhere; caller must hold the lock."""
+        return not self._pending and not self._backlog
+
+    def _wake(self) -> None:
+        """Wake one idle worker; caller must hold the lock."""
+        self._cond.notify()
+
+    def _wake_all(self) -> None:
+        """Wake every idle worker; caller must hold the lock."""
+        self._cond.notify_all()
+
+    def _take(self) -> tuple:
+        """Claim the next ready key's head item; caller must hold the lock."""
+        key = self._ready.popleft()
+        item = self._pending[key].popleft()
+        self._running += 1
+        return key, item
+
+    def _finish(self, key: Hashable) -> None:
+        """Mark `key`'s running item done; caller must hold the lock."""
+        self._running -= 1
+        if self._pending[key]:
+            self._ready.append(key)
+            self._wake()
+        else:
+            del self._pending[key]
+        self._release()
+        if self._stopping and self._drained():
+            self._wake_all()
+
+    def _worker_loop(self) -> None:
+        """Take ready keys and run their head item until stopped and drained."""
+        while True:
+            with self._cond:
+                while not self._ready:
+                    if self._stopping and self._drained():
+                        return
+                    self._cond.wait()
+
+                key, item = self._take()
+
+            try:
+                self.handler(item)
+            except Exception as e:
+                self.console.log(f"[red]Unhandled error in {self.name} worker: {e}")
+            finally:
+                with self._cond:
+                    self._finish(key)
+
+
+class AsyncKeyedScheduler(KeyedScheduler):
+    """
+    KeyedScheduler whose workers are tasks on an asyncio event loop.
+
+    `handler` is a coroutine function. Items may still be submitted from
+    any thread; up to `workers` of them are awaited concurrently on `loop`.
+    start() and stop() must be called from outside the loop's thread.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        console: Console,
+        loop: asyncio.AbstractEventLoop,
+        **kwargs,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            handler: Coroutine function awaited with each submitted item
+            console: Rich console for logging
+            loop: Running event loop the workers are scheduled on
+            **kwargs: Other KeyedScheduler options (workers, name, ...)
+        """
+        super().__init__(handler, console, **kwargs)
+        self.loop = loop
+        self.tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        """Start the worker tasks."""
+        self._stopping = False
+
+        async def spawn():
+            self._wakeup = asyncio.Event()
+            self.tasks = [
+                asyncio.create_task(
+                    self._async_worker_loop(), name=f"ircawp-{self.name}-{idx}"
+                )
+                for idx in range(self.num_workers)
+            ]
+
+        asyncio.run_coroutine_threadsafe(spawn(), self.loop).result()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker tasks once all queued items have been processed.
+
+        Args:
+            timeout: Maximum seconds to wait for the workers to finish
+        """
+        with self._cond:
+            self._stopping = True
+            self._wake_all()
+
+        async def join():
+            if self.tasks:
+                await asyncio.wait(self.tasks, timeout=timeout)
+
+        asyncio.run_coroutine_threadsafe(join(), self.loop).result()
+        self.tasks = []
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _wake_all(self) -> None:
+        self._wake()
+
+    async def _async_worker_loop(self) -> None:
+        """Take ready keys and await their head item until stopped and drained."""
+        while True:
+            with self._cond:
+                if self._ready:
+                    key, item = self._take()
+                elif self._stopping and self._drained():
+                    self._wake_all()
+                    return
+                else:
+                    key = None
+                    self._wakeup.clear()
+
+            if key is None:
+                await self._wakeup.wait()
+                continue
+
+            try:
+                await self.handler(item)
+            except Exception as e:
+                self.console.log(f"[red]Unhandled error in {self.name} worker: {e}")
+            finally:
+                with self._cond:
+                    self._finish(key)
+
+
+class TransientDeliveryError(Exception):
+    """Sending a reply failed in a way worth retrying (rate limit, 5xx, network)."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        """
+        Args:
+            message: Error description
+            retry_after: Seconds the frontend asked us to wait (0 for our own backoff)
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeliveryQueue:
+    """
+    Outbound stage that sends replies on its own worker threads.
+
+    Inference workers hand replies off and move on, rather than waiting on
+    the frontend (e.g. Slack posts and file uploads). Replies to the same
+    conversation are delivered one at a time in submission order. A send
+    that raises TransientDeliveryError is retried with exponential backoff;
+    any other error, or running out of attempts, drops the reply.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[..., None],
+        console: Console,
+        workers: int = 2,
+        max_attempts: int = 4,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Args:
+            deliver: Callable taking (message=, media=, aux=) that sends a reply
+            console: Rich console for logging
+            workers: Number of delivery threads
+            max_attempts: Sends tried per reply before giving up
+            backoff: Seconds before the first retry; doubles with each retry
+            max_backoff: Longest wait between retries
+        """
+        self.deliver = deliver
+        self.console = console
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.scheduler = KeyedScheduler(
+            handler=self._send,
+            console=console,
+            workers=workers,
+            name="delivery",
+        )
+
+    @classmethod
+    def from_config(
+        cls, settings: Optional[dict], deliver: Callable[..., None], console: Console
+    ) -> "DeliveryQueue":
+        """Build a queue from the `router_delivery` config section."""
+        settings = settings or {}
+        return cls(
+            deliver,
+            console,
+            workers=settings.get("workers", 2),
+            max_attempts=settings.get("max_attempts", 4),
+            backoff=settings.get("backoff", 1.0),
+            max_backoff=settings.get("max_backoff", 30.0),
+        )
+
+    def start(self) -> None:
+        """Start the delivery threads."""
+        self.scheduler.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the delivery threads once every queued reply has been sent."""
+        self.scheduler.stop(timeout)
+
+    def pending(self) -> int:
+        """Return the number of replies waiting to be sent."""
+        return self.scheduler.pending()
+
+    def submit(
+        self,
+        message: str,
+        media: List[Optional[str]],
+        aux: Any,
+        trace: Optional[Trace] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Queue a reply for delivery.
+
+        Args:
+            message: Reply text
+            media: Media list as passed to the egest callback
+            aux: Frontend routing data; also decides the conversation ordering
+            trace: Trace to record the delivery span on (optional)
+            on_done: Called once the reply was sent or given up on
+        """
+        # Replies without a conversation share one key, so they stay in order too
+        key = conversation_key(aux) or "__default__"
+        self.scheduler.submit((message, media, aux, trace, on_done), key=key)
+
+    def retry_delay(self, attempt: int, retry_after: float = 0.0) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based)."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return max(delay, retry_after)
+
+    def _send(self, job: tuple) -> None:
+        """Deliver one reply, retrying transient failures."""
+        message, media, aux, trace, on_done = job
+        try:
+            with trace_scope(trace), span("deliver") as attrs:
+                for attempt in range(1, self.max_attempts + 1):
+                    attrs["attempts"] = attempt
+                    try:
+                        self.deliver(message=message, media=media, aux=aux)
+                        return
+                    except TransientDeliveryError as e:
+                        if attempt >= self.max_attempts:
+                            self.console.log(
+                                f"[red on white]Giving up on reply after {attempt} attempt(s): {e}"
+                            )
+                            return
+                        delay = self.retry_delay(attempt, e.retry_after)
+                        self.console.log(
+                            f"[yellow on black]Reply delivery failed ({e}); "
+                            f"retrying in {delay:.1f}s"
+                        )
+                        time.sleep(delay)
+        except Exception as e:
+            self.console.log(f"[red on white]Reply delivery failed: {e}")
+        finally:
+            if on_done is not None:
+                on_done()
 
 
 class MessageRouter:
@@ -54,6 +686,10 @@ class MessageRouter:
         egest_callback: Callable,
         config: dict,
         backend=None,
+        media_store: Optional[MediaStore] = None,
+        serialize_aux: Optional[Callable] = None,
+        deserialize_aux: Optional[Callable] = None,
+        process_text_async_callback: Optional[Callable] = None,
         debug: bool = True,
     ):
         """
@@ -67,10 +703,19 @@ class MessageRouter:
             egest_callback: Callback for sending responses to frontend
             config: Application configuration
             backend: Backend instance for accessing utilities like image conversion
+            media_store: MediaStore for images kept in conversation history
+                (optional; without it history is text-only)
+            serialize_aux: Converts aux to a JSON-serializable dict (or None if
+                it can't be) for the durable queue
+            deserialize_aux: Rebuilds aux from `serialize_aux` output on replay
+            process_text_async_callback: Coroutine version of
+                process_text_callback for asyncio mode (optional; without it
+                the blocking callback runs in a worker thread)
             debug: Whether to enable debug logging
         """
         self.console = console
         self.process_text_callback = process_text_callback
+        self.process_text_async_callback = process_text_async_callback
         self.media_manager = media_manager
         self.plugin_manager = plugin_manager
         self.egest_callback = egest_callback
@@ -78,18 +723,210 @@ class MessageRouter:
         self.backend = backend
         self.debug = debug
 
-        self.queue: q.Queue = None
-        self.queue_thread: threading.Thread = None
-        self.thread_sleep = config.get("thread_sleep", 0.250)
+        # History for + continuation; "user" scope keys it by
+        # (channel, thread, user), "thread" shares it within a thread
+        self.media_store = media_store
+        self.conversations = ConversationStore.from_config(
+            config, media_store=media_store
+        )
+        self.conversation_scope = config.get("conversation_scope", "user")
+
+        # Optional on-disk journal so queued requests survive a restart
+        self.serialize_aux = serialize_aux
+        self.deserialize_aux = deserialize_aux
+        self.durable: Optional[DurableQueue] = None
+        self.durable_max_attempts = int(
+            config.get("router_durable_max_attempts", DEFAULT_DURABLE_MAX_ATTEMPTS)
+        )
+
+        self.lanes: Dict[str, KeyedScheduler] = {}
+        self.num_workers = max(1, int(config.get("router_workers", 1)))
+        # "fifo" (default) or "conversation": serialize per (channel, thread)
+        self.ordering = config.get("router_ordering", "fifo")
+        self.lanes_enabled = config.get("router_lanes") is not None
+
+        # Time budget per request; lanes and plugins may override it
+        self.default_deadline = config.get("router_deadline", DEFAULT_DEADLINE)
+        self.lane_deadlines: Dict[str, Optional[float]] = {}
+        # Deadlines of submitted, unfinished requests, for cancellation
+        self._live: set = set()
+        self._live_lock = threading.Lock()
+
+        # Per-item latency traces: JSON-lines export and/or a reply footer
+        self.trace_log: Optional[TraceLog] = None
+        if config.get("trace_log"):
+            self.trace_log = TraceLog(config["trace_log"])
+        self.trace_footer = bool(config.get("trace_footer", False))
+
+        # Optional outbound stage: replies are sent by delivery workers so
+        # lane workers don't wait on the frontend
+        self.delivery: Optional[DeliveryQueue] = None
+        if config.get("router_delivery") is not None:
+            self.delivery = DeliveryQueue.from_config(
+                config["router_delivery"], egest_callback, console
+            )
+        # Distributed mode: requests travel between processes via a broker
+        distributed = config.get("distributed") or {}
+        self.role = distributed.get("role", ROLE_STANDALONE)
+        self.broker = None
+        if self.role in (ROLE_INGEST, ROLE_WORKER):
+            self.broker = make_broker(distributed)
+        self.worker_id = distributed.get("worker_id") or new_worker_id()
+        self.poll_interval = float(
+            distributed.get("poll_interval", DEFAULT_POLL_INTERVAL)
+        )
+        self._pump: Optional[threading.Thread] = None
+        self._pump_stop = threading.Event()
+        if config.get("router_durable_queue"):
+            if self.role == ROLE_WORKER:
+                # Workers' aux is the broker's job handle, and the broker
+                # already requeues the jobs of a worker that dies
+                console.log(
+                    "[yellow]Ignoring router_durable_queue in the worker role; "
+                    "the broker keeps its jobs"
+                )
+            else:
+                self.durable = DurableQueue(config["router_durable_queue"])
+        # Aux of jobs put on the broker by this process, until their final reply
+        self._remote_aux: Dict[int, Any] = {}
+        self._remote_lock = threading.Lock()
+
+        # Items whose journal entry and trace are closed once both the worker
+        # and any handed-off reply are done: deadline -> [holds, request_id, trace]
+        self._holds: Dict[Deadline, list] = {}
+
+        # asyncio mode: lane workers are tasks on one event loop thread
+        self.async_mode = bool(config.get("router_async", False))
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+        # Backpressure: global queue depth cap and per-user/per-plugin token buckets
+        self.max_depth = config.get("router_max_depth")
+        self.user_weights = config.get("router_user_weights") or {}
+        rate_limits = config.get("router_rate_limits") or {}
+        self.user_limiter = RateLimiter.from_config(rate_limits.get("user"))
+        self.plugin_limiters: Dict[str, RateLimiter] = {}
+        for plugin_name, limit in (rate_limits.get("plugins") or {}).items():
+            limiter = RateLimiter.from_config(limit)
+            if limiter:
+                self.plugin_limiters[plugin_name] = limiter
+
+    def _lane_settings(self) -> Dict[str, dict]:
+        """Return {lane_name: {"workers": n, "max_depth": n, "deadline": s}} for this config."""
+        if not self.lanes_enabled:
+            return {
+                DEFAULT_LANE: {
+                    "workers": self.num_workers,
+                    "max_depth": None,
+                    "deadline": self.default_deadline,
+                }
+            }
+
+        settings = {name: dict(opts) for name, opts in LANE_DEFAULTS.items()}
+        for name, opts in (self.config.get("router_lanes") or {}).items():
+            settings.setdefault(name, {"deadline": self.default_deadline}).update(
+                opts or {}
+            )
+        return settings
 
     def start(self) -> None:
-        """Start the message queue processing thread."""
-        self.console.log("[green on white]Starting message queue thread...")
-        self.queue = q.Queue()
-        self.queue_thread = threading.Thread(
-            target=self._message_queue_loop, daemon=True
+        """Start the worker threads (or, in asyncio mode, tasks) for every lane."""
+        if self.async_mode:
+            self._start_loop()
+
+        if self.delivery is not None:
+            self.delivery.start()
+
+        if self.role == ROLE_INGEST:
+            # Workers in other processes run the requests; just relay replies
+            self.console.log("[green on white]Ingest role: queueing requests for workers")
+            self._start_pump(self._result_pump, "results")
+            return
+
+        self.lanes = {}
+        for name, opts in self._lane_settings().items():
+            workers = max(1, int(opts.get("workers", 1)))
+            self.lane_deadlines[name] = opts.get("deadline")
+            self.console.log(
+                f"[green on white]Starting lane '{name}': {workers} worker(s), "
+                f"max depth {opts.get('max_depth')}, deadline {opts.get('deadline')}s, "
+                f"{self.ordering} ordering"
+            )
+            options = dict(
+                console=self.console,
+                workers=workers,
+                name=f"lane-{name}",
+                max_depth=opts.get("max_depth"),
+                weights=self.user_weights,
+            )
+            if self.async_mode:
+                lane = AsyncKeyedScheduler(
+                    handler=self._process_item_async, loop=self.loop, **options
+                )
+            else:
+                lane = KeyedScheduler(handler=self._process_item, **options)
+            lane.start()
+            self.lanes[name] = lane
+
+        if self.durable is not None:
+            self._replay()
+
+        if self.role == ROLE_WORKER:
+            self.console.log(f"[green on white]Worker role: claiming jobs as {self.worker_id}")
+            self._start_pump(self._job_pump, "jobs")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the worker threads.
+
+        Items already queued are processed, and their replies delivered, first.
+
+        Args:
+            timeout: Maximum seconds to wait for each worker to finish
+        """
+        self._stop_pump(timeout)
+
+        for lane in self.lanes.values():
+            lane.stop(timeout)
+
+        if self.delivery is not None:
+            self.delivery.stop(timeout)
+
+        if self.loop is not None:
+            self._stop_loop(timeout)
+
+    def _start_pump(self, target: Callable[[], None], name: str) -> None:
+        """Start the thread that exchanges jobs or results with the broker."""
+        self._pump_stop.clear()
+        self._pump = threading.Thread(
+            target=target, name=f"ircawp-broker-{name}", daemon=True
+        )
+        self._pump.start()
+
+    def _stop_pump(self, timeout: Optional[float] = None) -> None:
+        """Stop the broker thread, if running."""
+        if self._pump is None:
+            return
+        self._pump_stop.set()
+        self._pump.join(timeout)
+        self._pump = None
+
+    def _start_loop(self) -> None:
+        """Start the event loop that drives the lanes in asyncio mode."""
+        self.loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self.loop.run_forever, name="ircawp-router-loop", daemon=True
         )
-        self.queue_thread.start()
+        self._loop_thread.start()
+
+    def _stop_loop(self, timeout: Optional[float] = None) -> None:
+        """Stop and close the asyncio-mode event loop."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join(timeout)
+        if not self._loop_thread.is_alive():
+            self.loop.close()
+        self.loop = None
+        self._loop_thread = None
 
     def ingest(
         self,
@@ -102,6 +939,11 @@ class MessageRouter:
         """
         Add a message to the processing queue.
 
+        The message is placed on the lane matching its command, queued
+        fairly behind other users' messages. Messages over the sender's rate
+        limit, or arriving while the queues are full, are answered with a
+        notice instead.
+
         Args:
             message: The message text
             username: Username of the sender
@@ -112,225 +954,826 @@ class MessageRouter:
         if media is None:
             media = []
 
-        self.queue.put((message, username, media, thread_history, aux))
+        command = self._command_name(message)
+        if command == CANCEL_COMMAND:
+            count = self.cancel(username)
+            notice = MSG_CANCELLED.format(count=count) if count else MSG_NOTHING_TO_CANCEL
+            self._reject(notice, media, aux)
+            return
+
+        if self.max_depth is not None and self.pending() >= int(self.max_depth):
+            self.console.log(
+                f"[yellow on black]Queue depth limit reached; rejecting message from {username}"
+            )
+            self._reject(MSG_BUSY, media, aux)
+            return
+
+        if not self._within_rate_limits(username, command):
+            self.console.log(
+                f"[yellow on black]Rate limit hit by {username} ({command or 'chat'})"
+            )
+            self._reject(MSG_RATE_LIMITED, media, aux)
+            return
+
+        if self.role == ROLE_INGEST:
+            self._dispatch(message, username, media, aux)
+            return
+
+        request_id = self._journal(message, username, media, aux)
+        self._submit(message, username, media, thread_history, aux, request_id)
+
+    def _submit(
+        self,
+        message: str,
+        username: str,
+        media: List[str],
+        thread_history: Optional[ThreadManager],
+        aux: Any,
+        request_id: Optional[int],
+    ) -> None:
+        """Place an item on its lane, answering with a busy notice if the lane is full."""
+        lane_name = self.classify_lane(message)
+        trace = self._new_trace(username, lane_name, request_id)
+        deadline = Deadline(self._deadline_budget(message, lane_name), owner=username)
+        with self._live_lock:
+            self._live.add(deadline)
+        accepted = self.lanes[lane_name].submit(
+            (message, username, media, thread_history, aux, request_id, trace, deadline),
+            key=self._ordering_key(aux),
+            tenant=username,
+        )
+
+        if not accepted:
+            self.console.log(
+                f"[yellow on black]Lane '{lane_name}' is full; rejecting message from {username}"
+            )
+            self._forget(deadline)
+            if request_id is not None:
+                self.durable.mark_finished(request_id)
+            self._reject(MSG_BUSY, media, aux)
+
+    def _dispatch(
+        self, message: str, username: str, media: List[str], aux: Any
+    ) -> None:
+        """Queue a request on the broker for a worker process (ingest role)."""
+        reply_to = None
+        if self.serialize_aux is not None:
+            try:
+                reply_to = self.serialize_aux(aux)
+            except Exception as e:
+                self.console.log(f"[yellow]Could not serialize aux for broker: {e}")
+
+        with self._remote_lock:
+            job_id = self.broker.put_job(
+                {"message": message, "username": username, "media": encode_files(media)},
+                owner=username,
+                conversation=conversation_key(aux),
+                reply_to=reply_to,
+            )
+            self._remote_aux[job_id] = aux
+        self.media_manager.cleanup_media_files(media)
+
+    def _result_pump(self) -> None:
+        """Deliver replies from workers until stopped (ingest role)."""
+        while True:
+            stopping = self._pump_stop.is_set()
+            try:
+                delivered = self._deliver_results()
+            except Exception as e:
+                self.console.log(f"[red]Error reading results from broker: {e}")
+                delivered = 0
+            if stopping:
+                return
+            if not delivered:
+                self._pump_stop.wait(self.poll_interval)
+
+    def _deliver_results(self) -> int:
+        """Send waiting worker replies to their users; returns how many were handled."""
+        results = self.broker.take_results()
+        for result in results:
+            with self._remote_lock:
+                if result.final:
+                    aux = self._remote_aux.pop(result.job_id, None)
+                else:
+                    aux = self._remote_aux.get(result.job_id)
+
+            # Jobs queued before this process restarted
+            if aux is None and result.reply_to is not None and self.deserialize_aux:
+                try:
+                    aux = self.deserialize_aux(result.reply_to)
+                except Exception as e:
+                    self.console.log(f"[red]Bad aux for job {result.job_id}: {e}")
+
+            if aux is None:
+                self.console.log(
+                    f"[red]Dropping reply to job {result.job_id}: nowhere to send it"
+                )
+            elif result.payload.get("failed"):
+                self._reject(MSG_REPLAY_GAVE_UP, [], aux)
+            else:
+                media = decode_files(
+                    result.payload.get("media") or [None], self.media_manager.media_dir
+                )
+                try:
+                    self._send(message=result.payload["message"], media=media, aux=aux)
+                except Exception as e:
+                    self.console.log(f"[red on white]Failed to send worker reply: {e}")
+
+            self.broker.ack_result(result.result_id)
+        return len(results)
+
+    def _job_pump(self) -> None:
+        """Claim and run jobs from the broker until stopped (worker role)."""
+        while not self._pump_stop.is_set():
+            try:
+                self.broker.heartbeat(self.worker_id)
+                for owner in self.broker.take_cancellations(self.worker_id):
+                    self.cancel(owner)
+                claimed = self._claim_jobs()
+            except Exception as e:
+                self.console.log(f"[red]Error claiming jobs from broker: {e}")
+                claimed = 0
+            if not claimed:
+                self._pump_stop.wait(self.poll_interval)
+
+    def _claim_jobs(self) -> int:
+        """Claim jobs onto the lanes while nothing is waiting locally; returns the count."""
+        claimed = 0
+        while self.pending() == 0 and not self._pump_stop.is_set():
+            job = self.broker.claim_job(self.worker_id)
+            if job is None:
+                break
+            job_id, payload, conversation = job
+            media = decode_files(payload.get("media") or [], self.media_manager.media_dir)
+            self._submit(
+                payload["message"],
+                payload["username"],
+                media,
+                None,
+                RemoteAux(job_id, conversation),
+                None,
+            )
+            claimed += 1
+        return claimed
+
+    def _journal(
+        self, message: str, username: str, media: List[str], aux: Any
+    ) -> Optional[int]:
+        """Record a request in the durable queue; returns its id, or None if not journaled."""
+        if self.durable is None or self.serialize_aux is None:
+            return None
+
+        try:
+            aux_data = self.serialize_aux(aux)
+        except Exception as e:
+            self.console.log(f"[yellow]Could not serialize aux for durable queue: {e}")
+            return None
+        if aux_data is None:
+            return None
+
+        return self.durable.enqueue(
+            {"message": message, "username": username, "media": media, "aux": aux_data}
+        )
+
+    def _replay(self) -> None:
+        """Resubmit requests left unfinished by a previous run."""
+        unfinished = self.durable.unfinished()
+        if unfinished:
+            self.console.log(
+                f"[green on white]Replaying {len(unfinished)} unfinished request(s)"
+            )
 
-    def _message_queue_loop(self) -> None:
+        for request_id, payload, attempts in unfinished:
+            try:
+                aux = self.deserialize_aux(payload["aux"])
+            except Exception as e:
+                self.console.log(f"[red]Dropping request {request_id}: bad aux ({e})")
+                self.durable.mark_finished(request_id)
+                continue
+            if aux is None:
+                self.console.log(
+                    f"[yellow]Dropping request {request_id}: the frontend can't replay it"
+                )
+                self.durable.mark_finished(request_id)
+                continue
+
+            media = self.media_manager.validate_media_files(payload.get("media") or [])
+
+            if attempts >= self.durable_max_attempts:
+                self.console.log(
+                    f"[red]Dropping request {request_id}: failed {attempts} time(s)"
+                )
+                self.durable.mark_finished(request_id)
+                self._reject(MSG_REPLAY_GAVE_UP, media, aux)
+                continue
+
+            self._submit(
+                payload["message"], payload["username"], media, None, aux, request_id
+            )
+
+    def cancel(self, username: str) -> int:
         """
-        Main queue processing loop.
+        Cancel a user's queued and running requests.
 
-        Continuously processes messages from the queue and routes them
-        to appropriate handlers (plugins or text processing).
+        Queued requests are dropped. Running ones stop at their next
+        deadline check or outbound call (in asyncio mode, immediately) and
+        send no reply.
+
+        Args:
+            username: The user whose requests to cancel
+
+        Returns:
+            Number of requests cancelled
         """
-        while True:
-            time.sleep(self.thread_sleep)
+        if self.role == ROLE_INGEST:
+            # Workers stop running ones when they next poll the broker
+            count = self.broker.cancel(username)
+            if count:
+                self.console.log(
+                    f"[yellow on black]Cancelled {count} request(s) from {username}"
+                )
+            return count
 
-            if not self.queue.empty():
-                self.console.rule("[white on purple]START QUEUE ITEM PROCESSING")
+        removed = []
+        for lane in self.lanes.values():
+            removed.extend(lane.remove(lambda item: item[1] == username))
 
-                # Get message from queue
-                message, user_id, incoming_media, thread_history, aux = self.queue.get()
-                message = message.strip()
+        for _, _, media, _, _, request_id, _, deadline in removed:
+            self._forget(deadline)
+            if request_id is not None:
+                self.durable.mark_finished(request_id)
+            self.media_manager.cleanup_media_files(media)
 
-                # Handle ^ prefix: prepend last generated image to media list
-                if message and message[0] == "^":
-                    message = message[1:].strip()
+        with self._live_lock:
+            running = [d for d in self._live if d.owner == username]
+        for deadline in running:
+            deadline.cancel()
+            if deadline.task is not None and self.loop is not None:
+                self.loop.call_soon_threadsafe(deadline.task.cancel)
 
-                    # Check if last generated image exists
-                    from pathlib import Path
+        count = len(removed) + len(running)
+        if count:
+            self.console.log(
+                f"[yellow on black]Cancelled {count} request(s) from {username}"
+            )
+        return count
 
-                    last_image_path = Path(LAST_GENERATED_IMAGE_PATH)
+    def _forget(self, deadline: Deadline) -> None:
+        """Stop tracking a finished or dropped request's deadline."""
+        with self._live_lock:
+            self._live.discard(deadline)
 
-                    if last_image_path.is_file():
-                        # Prepend to media list (last image comes FIRST, user media AFTER)
-                        incoming_media = [str(last_image_path)] + (incoming_media or [])
+    def _deadline_budget(self, message: str, lane_name: str) -> Optional[float]:
+        """Return the time budget for a message: its plugin's, else its lane's."""
+        command = self._command_name(message)
+        budget = self.plugin_manager.get_plugin_deadline(command) if command else None
+        if budget is None:
+            budget = self.lane_deadlines.get(lane_name, self.default_deadline)
+        return budget
 
-                        if self.debug:
-                            self.console.log(
-                                "[cyan on black]^ prefix: prepending last generated image to media"
-                            )
-                    else:
-                        # Image doesn't exist - log warning but continue processing
-                        self.console.log(
-                            "[yellow on black]^ prefix detected but no last generated image found"
-                        )
+    def pending(self) -> int:
+        """Return the number of queued items across all lanes (or on the broker, when ingesting)."""
+        if self.role == ROLE_INGEST:
+            return self.broker.pending()
+        return sum(lane.pending() for lane in self.lanes.values())
 
-                # Check if plugin will need the most recent response (before we clear history)
-                saved_most_recent_response = None
-                if message.startswith("/"):
-                    parts = message.split(" ", 1)
-                    if len(parts) > 1 and parts[1].strip() == "+":
-                        # Plugin wants to use most recent response - save it before clearing
-                        if _conversation_history:
-                            for msg in reversed(_conversation_history):
-                                if msg.get("role") == "assistant":
-                                    saved_most_recent_response = msg.get("content", "")
-                                    break
-
-                # Handle + prefix: continue previous conversation
-                continue_conversation = False
-                if message and message[0] == "+":
-                    message = message[1:].strip()
-                    continue_conversation = True
-
-                    if self.debug:
-                        self.console.log(
-                            f"[cyan on black]+ prefix: continuing conversation with "
-                            f"{len(_conversation_history)} prior messages"
-                        )
-                else:
-                    # Clear conversation when user doesn't use + (starting fresh)
-                    if _conversation_history:  # Only log if there was history
-                        if self.debug:
-                            self.console.log(
-                                f"[cyan on black]Starting fresh conversation "
-                                f"(cleared {len(_conversation_history)} prior messages)"
-                            )
-                        _conversation_history.clear()
-
-                # Auto-route bare URLs to the appropriate plugin
-                if not message.startswith("/"):
-                    bare_url = _is_bare_url(message)
-                    if bare_url:
-                        if _is_youtube_url(bare_url):
-                            message = f"/yt {bare_url}"
-                        else:
-                            message = f"/summarize {bare_url}"
-                        if self.debug:
-                            self.console.log(
-                                f"[cyan on black]Auto-routing bare URL to: {message.split()[0]}"
-                            )
+    def classify_lane(self, message: str) -> str:
+        """
+        Pick the lane a message should run on.
+
+        Plugin commands (including auto-routed bare URLs) use the plugin's
+        declared lane; plain chat runs on the LLM lane.
+
+        Args:
+            message: The raw message text
+
+        Returns:
+            Name of a started lane
+        """
+        if not self.lanes_enabled:
+            return DEFAULT_LANE
+
+        command = self._command_name(message)
+        lane = self.plugin_manager.get_plugin_lane(command) if command else None
+
+        return lane if lane in self.lanes else LLM_LANE
+
+    def _command_name(self, message: str) -> Optional[str]:
+        """Return the plugin command a message will run (after auto-routing), if any."""
+        text = _auto_route(message.strip().lstrip("^+").strip())
+        if not text.startswith("/"):
+            return None
+        return text.split(" ")[0][1:]
+
+    def _within_rate_limits(self, username: str, command: Optional[str]) -> bool:
+        """Take a token from the user's bucket and the user's bucket for the plugin."""
+        if self.user_limiter and not self.user_limiter.allow(username):
+            return False
+
+        limiter = self.plugin_limiters.get(command) if command else None
+        if limiter and not limiter.allow((username, command)):
+            return False
+
+        return True
+
+    def _reject(self, notice: str, media: List[str], aux: Any) -> None:
+        """Answer a message that won't be processed and discard its media."""
+        self.media_manager.cleanup_media_files(media)
+        try:
+            self._send(message=notice, media=[None], aux=aux)
+        except Exception as e:
+            self.console.log(f"[red on white]Failed to send rejection notice: {e}")
+
+    def _send(self, message: str, media: List[Optional[str]], aux: Any) -> None:
+        """
+        Send a reply: hand it to the delivery queue, or egest it now without
+        one. On a distributed-mode worker, replies go back to the broker.
+
+        A handed-off reply from a queue item keeps the item's journal entry
+        and trace open until it has been delivered.
+        """
+        if isinstance(aux, RemoteAux):
+            # A worker's reply goes back to the ingest process
+            self.broker.put_result(
+                aux.job_id, {"message": message, "media": encode_files(media)}
+            )
+            return
+
+        if self.delivery is None:
+            self.egest_callback(message=message, media=media, aux=aux)
+            return
+
+        deadline = current_deadline()
+        on_done = None
+        if deadline is not None and self._hold(deadline):
+            on_done = lambda: self._release(deadline)  # noqa: E731
+        self.delivery.submit(message, media, aux, trace=current_trace(), on_done=on_done)
+
+    def _hold(
+        self,
+        deadline: Deadline,
+        request_id: Optional[int] = None,
+        trace: Optional[Trace] = None,
+        new: bool = False,
+    ) -> bool:
+        """
+        Keep an item's journal entry and trace open until a matching _release().
+
+        Args:
+            deadline: The item's deadline, which identifies it
+            request_id: The item's durable queue id (when `new`)
+            trace: The item's trace (when `new`)
+            new: Start tracking the item rather than adding to its holds
+
+        Returns:
+            True if a hold was taken
+        """
+        with self._live_lock:
+            if new:
+                self._holds[deadline] = [1, request_id, trace]
+                return True
+            entry = self._holds.get(deadline)
+            if entry is None:
+                return False
+            entry[0] += 1
+            return True
+
+    def _release(self, deadline: Deadline) -> None:
+        """Drop one hold on an item; the last one marks it finished and exports its trace."""
+        with self._live_lock:
+            entry = self._holds[deadline]
+            entry[0] -= 1
+            if entry[0]:
+                return
+            del self._holds[deadline]
+
+        _, request_id, trace = entry
+        if request_id is not None:
+            self.durable.mark_finished(request_id)
+        self._finish_trace(trace)
+
+    def _ordering_key(self, aux: Any) -> Optional[tuple]:
+        """Return the scheduler key for an item, or None for plain FIFO."""
+        if self.ordering == "conversation":
+            return conversation_key(aux)
+        return None
+
+    def _history_key(self, user_id: str, aux: Any) -> tuple:
+        """Return the conversation store key for a message."""
+        channel, thread_ts = conversation_key(aux) or (None, None)
+        if self.conversation_scope == "thread":
+            return (channel, thread_ts)
+        return (channel, thread_ts, user_id)
+
+    def _store_media(self, media: Optional[List[str]]) -> List[str]:
+        """Add incoming images to the media store; return their digests."""
+        if not media or self.media_store is None:
+            return []
+        digests = []
+        for media_path in media:
+            mime, _ = mimetypes.guess_type(str(media_path))
+            if not mime or not mime.startswith("image/"):
+                continue
+            digest = self.media_store.put(media_path)
+            if digest:
+                digests.append(digest)
+        return digests
+
+    def _resolve_media(self, history: List[dict]) -> List[dict]:
+        """Replace stored media digests with file paths the backend can read."""
+        resolved = []
+        for msg in history:
+            digests = msg.get("media_hashes")
+            if digests:
+                msg = {k: v for k, v in msg.items() if k != "media_hashes"}
+                msg["media_paths"] = [
+                    path
+                    for path in (self.media_store.path(d) for d in digests)
+                    if path
+                ]
+            resolved.append(msg)
+        return resolved
+
+    def _new_trace(
+        self, username: str, lane_name: str, request_id: Optional[int]
+    ) -> Optional[Trace]:
+        """Start the latency trace for a queue item, if tracing is enabled."""
+        if self.trace_log is None and not self.trace_footer:
+            return None
+        return Trace(user=username, lane=lane_name, request_id=request_id)
+
+    def _finish_trace(self, trace: Optional[Trace]) -> None:
+        """Export a finished item's trace."""
+        if trace is None or self.trace_log is None:
+            return
+        try:
+            self.trace_log.write(trace)
+        except Exception as e:
+            self.console.log(f"[yellow]Could not write trace {trace.trace_id}: {e}")
+
+    @contextmanager
+    def _item_scope(
+        self,
+        request_id: Optional[int],
+        trace: Optional[Trace],
+        deadline: Deadline,
+    ) -> Iterator[None]:
+        """
+        Start the item's deadline and trace, and journal its start and finish.
+
+        The item counts as finished once it leaves this block and its reply,
+        if handed to the delivery queue, has been delivered.
+        """
+        deadline.start()
+        self._hold(deadline, request_id, trace, new=True)
+        with trace_scope(trace), deadline_scope(deadline):
+            if trace is not None:
+                trace.add_span("queue_wait", trace.start, time.monotonic())
+            try:
+                if request_id is None:
+                    yield
+                    return
+
+                self.durable.mark_started(request_id)
+                with checkpoint_scope(self.durable, request_id):
+                    yield
+            finally:
+                self._forget(deadline)
+                self._release(deadline)
+
+    def _process_item(self, item: tuple) -> None:
+        """
+        Process a single queue item within its deadline, trace and journal entry.
+
+        Args:
+            item: (message, user_id, media, thread_history, aux, request_id,
+                trace, deadline) tuple; request_id is None for requests not
+                in the durable queue, trace is None when tracing is off
+        """
+        *fields, request_id, trace, deadline = item
+        with self._item_scope(request_id, trace, deadline):
+            self._handle_item(tuple(fields))
+
+    async def _process_item_async(self, item: tuple) -> None:
+        """
+        Async variant of _process_item(), used by asyncio-mode lanes.
+
+        The item runs as its own task so the deadline and cancellation can
+        interrupt it mid-call.
+        """
+        *fields, request_id, trace, deadline = item
+        aux = fields[4]
+        with self._item_scope(request_id, trace, deadline):
+            task = asyncio.create_task(self._handle_item_async(tuple(fields)))
+            deadline.task = task
+            try:
+                await asyncio.wait_for(task, deadline.remaining())
+            except TimeoutError:
+                self.console.log("[yellow on black]Request hit its deadline; abandoned")
+                await asyncio.to_thread(self._reject, MSG_TIMED_OUT, [], aux)
+            except asyncio.CancelledError:
+                if not task.cancelled() or not deadline.cancelled:
+                    raise
+                self.console.log("[yellow on black]Request cancelled by its user")
+            finally:
+                deadline.task = None
+
+    def _handle_item(self, item: tuple) -> None:
+        """
+        Route a message to the appropriate handler (plugin or text
+        processing) and egest the response.
+
+        Args:
+            item: (message, user_id, media, thread_history, aux) tuple
+        """
+        run_flow(self._handle_flow(item), self._perform)
+
+    async def _handle_item_async(self, item: tuple) -> None:
+        """Async variant of _handle_item()."""
+        await run_flow_async(self._handle_flow(item), self._perform_async)
+
+    def _perform(self, step: tuple) -> Any:
+        """Run a `_handle_flow` step with the blocking callbacks."""
+        kind, kwargs = step
+        if kind != "egest":
+            check_deadline()
+        with span(_step_span_name(step)):
+            if kind == "plugin":
+                return self.plugin_manager.execute_plugin(**kwargs)
+            if kind == "text":
+                return self.process_text_callback(**kwargs)
+            if kind == "egest":
+                return self._send(**kwargs)
+        raise ValueError(f"Unknown flow step: {kind}")
+
+    async def _perform_async(self, step: tuple) -> Any:
+        """Run a `_handle_flow` step on the event loop.
+
+        Blocking callbacks without an async counterpart run in a worker thread.
+        """
+        kind, kwargs = step
+        if kind != "egest":
+            check_deadline()
+        with span(_step_span_name(step)):
+            if kind == "plugin":
+                return await self.plugin_manager.execute_plugin_async(**kwargs)
+            if kind == "text":
+                if self.process_text_async_callback is not None:
+                    return await self.process_text_async_callback(**kwargs)
+                return await asyncio.to_thread(
+                    lambda: self.process_text_callback(**kwargs)
+                )
+            if kind == "egest":
+                if self.delivery is not None:
+                    return self._send(**kwargs)
+                return await asyncio.to_thread(lambda: self._send(**kwargs))
+        raise ValueError(f"Unknown flow step: {kind}")
+
+    def _handle_flow(self, item: tuple):
+        """
+        The body of _handle_item() as a flow generator (see app.lib.flow).
+
+        Yields ("plugin", kwargs), ("text", kwargs) and ("egest", kwargs)
+        steps for the plugin manager, text callback and egest callback.
+
+        Args:
+            item: (message, user_id, media, thread_history, aux) tuple
+        """
+        self.console.rule("[white on purple]START QUEUE ITEM PROCESSING")
+
+        message, user_id, incoming_media, thread_history, aux = item
+        message = message.strip()
+
+        # Handle ^ prefix: prepend last generated image to media list
+        if message and message[0] == "^":
+            message = message[1:].strip()
+
+            # Check if last generated image exists
+            from pathlib import Path
+
+            last_image_path = Path(LAST_GENERATED_IMAGE_PATH)
+
+            if last_image_path.is_file():
+                # Prepend to media list (last image comes FIRST, user media AFTER)
+                incoming_media = [str(last_image_path)] + (incoming_media or [])
 
                 if self.debug:
                     self.console.log(
-                        "[white on purple]Dequeued message:\n",
-                        f"    [purple]|[/purple] '{message}'\n",
-                        f"    [purple]|[/purple] from user {user_id},\n",
-                        f"    [purple]|[/purple] with media {incoming_media},\n",
-                        f"    [purple]|[/purple] and aux {aux}",
+                        "[cyan on black]^ prefix: prepending last generated image to media"
                     )
+            else:
+                # Image doesn't exist - log warning but continue processing
+                self.console.log(
+                    "[yellow on black]^ prefix detected but no last generated image found"
+                )
 
-                # Convert incoming media to data URIs for conversation storage
-                user_media_data_uris = []
-                if incoming_media and self.backend:
-                    for media_path in incoming_media:
-                        data_uri = self.backend._image_to_data_uri(media_path)
-                        if data_uri:
-                            user_media_data_uris.append(data_uri)
+        history_key = self._history_key(user_id, aux)
 
-                inf_response: str = ""
-                outgoing_media_filename: Optional[str] = None
-                skip_imagegen = True
+        # Check if plugin will need the most recent response (before we clear history)
+        saved_most_recent_response = None
+        if message.startswith("/"):
+            parts = message.split(" ", 1)
+            if len(parts) > 1 and parts[1].strip() == "+":
+                # Plugin wants to use most recent response - save it before clearing
+                saved_most_recent_response = (
+                    self.conversations.last_assistant_message(history_key)
+                )
 
-                try:
-                    # Check if this is a plugin command
-                    if message.startswith("/"):
-                        plugin_name = message.split(" ")[0][1:]
-
-                        # Check if plugin arguments are just "+"
-                        # This means "use the most recent assistant response"
-                        parts = message.split(" ", 1)
-                        if len(parts) > 1 and parts[1].strip() == "+":
-                            # Use the saved response from before history was cleared
-                            if saved_most_recent_response:
-                                message = f"{parts[0]} {saved_most_recent_response}"
-
-                                if self.debug:
-                                    self.console.log(
-                                        "[cyan on black]Plugin + argument: using most recent assistant response"
-                                    )
-                            else:
-                                if self.debug:
-                                    self.console.log(
-                                        "[yellow on black]Plugin + argument used but no prior assistant response found"
-                                    )
-
-                        # Delegate to plugin processing callback
-                        (
-                            inf_response,
-                            outgoing_media_filename,
-                            skip_imagegen,
-                        ) = self.plugin_manager.execute_plugin(
-                            plugin_name=plugin_name,
-                            message=message,
-                            user_id=user_id,
-                            media=incoming_media or [],
-                        )
+        # Handle + prefix: continue previous conversation
+        continue_conversation = False
+        conversation_history: Optional[List[dict]] = None
+        if message and message[0] == "+":
+            message = message[1:].strip()
+            continue_conversation = True
+            conversation_history = (
+                self._resolve_media(self.conversations.history(history_key)) or None
+            )
+
+            if self.debug:
+                self.console.log(
+                    f"[cyan on black]+ prefix: continuing conversation with "
+                    f"{len(conversation_history or [])} prior messages"
+                )
+        else:
+            # Clear conversation when user doesn't use + (starting fresh)
+            cleared = self.conversations.clear(history_key)
+            if cleared and self.debug:
+                self.console.log(
+                    f"[cyan on black]Starting fresh conversation "
+                    f"(cleared {cleared} prior messages)"
+                )
+
+        # Auto-route bare URLs to the appropriate plugin
+        routed = _auto_route(message)
+        if routed != message:
+            message = routed
+            if self.debug:
+                self.console.log(
+                    f"[cyan on black]Auto-routing bare URL to: {message.split()[0]}"
+                )
+
+        if self.debug:
+            self.console.log(
+                "[white on purple]Dequeued message:\n",
+                f"    [purple]|[/purple] '{message}'\n",
+                f"    [purple]|[/purple] from user {user_id},\n",
+                f"    [purple]|[/purple] with media {incoming_media},\n",
+                f"    [purple]|[/purple] and aux {aux}",
+            )
+
+        # Keep incoming images for conversation storage (by content hash)
+        user_media_hashes = self._store_media(incoming_media)
+
+        inf_response: str = ""
+        outgoing_media_filename: Optional[str] = None
+        skip_imagegen = True
+        # A stored turn takes over the media references; otherwise they are released
+        store_turn = False
+
+        try:
+            # Check if this is a plugin command
+            if message.startswith("/"):
+                plugin_name = message.split(" ")[0][1:]
+
+                # Check if plugin arguments are just "+"
+                # This means "use the most recent assistant response"
+                parts = message.split(" ", 1)
+                if len(parts) > 1 and parts[1].strip() == "+":
+                    # Use the saved response from before history was cleared
+                    if saved_most_recent_response:
+                        message = f"{parts[0]} {saved_most_recent_response}"
 
                         if self.debug:
                             self.console.log(
-                                f"[white on green]Plugin returned {inf_response, outgoing_media_filename}."
+                                "[cyan on black]Plugin + argument: using most recent assistant response"
                             )
-
-                    # Otherwise, process as regular text message
                     else:
-                        inf_response, tool_images = self.process_text_callback(
-                            message=message,
-                            user_id=user_id,
-                            incoming_media=incoming_media,
-                            aux=aux,
-                        )
-
-                        # Use first tool-generated image if available
-                        outgoing_media_filename = (
-                            tool_images[0] if tool_images else None
-                        )
-
-                    if outgoing_media_filename and self.debug:
-                        self.console.log(
-                            f"[yellow]Media filename: {outgoing_media_filename}"
-                        )
+                        if self.debug:
+                            self.console.log(
+                                "[yellow on black]Plugin + argument used but no prior assistant response found"
+                            )
 
-                except Exception as e:
-                    self.console.log(f"[red]Error processing message: {e}")
-                    inf_response = "An error occurred processing your request."
-                    outgoing_media_filename = None
-
-                finally:
-                    # Clean up incoming media files - they are no longer needed
-                    self.media_manager.cleanup_media_files(incoming_media)
-
-                # Always store conversation turn (fresh start or continuation)
-                # Store user message
-                user_msg = {"role": "user", "content": message}
-                if user_media_data_uris:
-                    user_msg["media_data_uris"] = user_media_data_uris
-                _conversation_history.append(user_msg)
-
-                # Store assistant response
-                _conversation_history.append(
-                    {"role": "assistant", "content": inf_response}
+                # Delegate to plugin processing callback
+                (
+                    inf_response,
+                    outgoing_media_filename,
+                    skip_imagegen,
+                ) = yield (
+                    "plugin",
+                    dict(
+                        plugin_name=plugin_name,
+                        message=message,
+                        user_id=user_id,
+                        media=incoming_media or [],
+                    ),
                 )
 
                 if self.debug:
-                    conv_type = (
-                        "continuing" if continue_conversation else "starting new"
-                    )
                     self.console.log(
-                        f"[cyan on black]Stored conversation turn ({conv_type}). "
-                        f"History now has {len(_conversation_history)} messages"
+                        f"[white on green]Plugin returned {inf_response, outgoing_media_filename}."
                     )
 
-                # Always attempt to egest; protect the queue thread from frontend errors
-                try:
-                    self.egest_callback(
-                        message=inf_response,
-                        media=[outgoing_media_filename]
-                        if outgoing_media_filename
-                        else [None],
+            # Otherwise, process as regular text message
+            else:
+                inf_response, tool_images = yield (
+                    "text",
+                    dict(
+                        message=message,
+                        user_id=user_id,
+                        incoming_media=incoming_media,
                         aux=aux,
-                    )
-                except Exception as e:
-                    # egestMessage already handles errors, but double-guard here
-                    try:
-                        self.console.log(f"[red on white]Unhandled egest error: {e}")
-                    except Exception:
-                        pass
+                        conversation_history=conversation_history,
+                    ),
+                )
 
-                if self.debug:
-                    self.console.log(
-                        "[white on purple]egested response:\n",
-                        f"    [purple]|[/purple] '{inf_response}'\n",
-                        f"    [purple]|[/purple] with media '{outgoing_media_filename}'",
-                    )
+                # Use first tool-generated image if available
+                outgoing_media_filename = (
+                    tool_images[0] if tool_images else None
+                )
+
+            if outgoing_media_filename and self.debug:
+                self.console.log(
+                    f"[yellow]Media filename: {outgoing_media_filename}"
+                )
+            store_turn = True
 
+        except RequestAborted as e:
+            deadline = current_deadline()
+            if deadline is not None and deadline.cancelled:
+                # The user already got a notice from the cancel command
+                self.console.log(f"[yellow on black]Request cancelled: {e}")
                 self.console.rule("[white on purple]END QUEUE ITEM PROCESSING")
+                return
+            self.console.log(f"[yellow on black]Request aborted: {e}")
+            inf_response = (
+                MSG_TIMED_OUT
+                if isinstance(e, DeadlineExceeded)
+                else "An error occurred processing your request."
+            )
+            outgoing_media_filename = None
+
+        except Exception as e:
+            self.console.log(f"[red]Error processing message: {e}")
+            inf_response = "An error occurred processing your request."
+            outgoing_media_filename = None
+            store_turn = True
+
+        finally:
+            # Clean up incoming media files - they are no longer needed
+            self.media_manager.cleanup_media_files(incoming_media)
+            if not store_turn:
+                # Cancelled or aborted: no stored turn will own these references
+                for digest in user_media_hashes:
+                    self.media_store.release(digest)
+
+        # Store the conversation turn (fresh start or continuation) unless it never finished
+        if store_turn:
+            user_msg = {"role": "user", "content": message}
+            if user_media_hashes:
+                user_msg["media_hashes"] = user_media_hashes
+            self.conversations.append_turn(
+                history_key, user_msg, {"role": "assistant", "content": inf_response}
+            )
+
+        if self.debug and store_turn:
+            conv_type = (
+                "continuing" if continue_conversation else "starting new"
+            )
+            self.console.log(
+                f"[cyan on black]Stored conversation turn ({conv_type}) for {history_key}. "
+                f"{len(self.conversations)} conversations, "
+                f"{self.conversations.total_bytes} bytes stored"
+            )
+
+        # Always attempt to egest; protect the queue thread from frontend errors
+        try:
+            outgoing_message = inf_response
+            trace = current_trace()
+            if self.trace_footer and trace is not None:
+                outgoing_message = f"{inf_response}\n\n{format_timing_footer(trace)}"
+
+            yield (
+                "egest",
+                dict(
+                    message=outgoing_message,
+                    media=[outgoing_media_filename]
+                    if outgoing_media_filename
+                    else [None],
+                    aux=aux,
+                ),
+            )
+        except Exception as e:
+            # egestMessage already handles errors, but double-guard here
+            try:
+                self.console.log(f"[red on white]Unhandled egest error: {e}")
+            except Exception:
+                pass
+
+        if self.debug:
+            self.console.log(
+                "[white on purple]egested response:\n",
+                f"    [purple]|[/purple] '{inf_response}'\n",
+                f"    [purple]|[/purple] with media '{outgoing_media_filename}'",
+            )
+
+        self.console.rule("[white on purple]END QUEUE ITEM PROCESSING")
@@ -1,9 +1,13 @@
 """Plugin discovery, loading, and execution."""
 
+import asyncio
+import inspect
 from typing import Dict, Optional, Tuple, List, Any
 from rich.console import Console
 
 import app.plugins as plugins
+from app.lib.hashing import sha256_file
+from app.lib.singleflight import SingleFlight
 from app.plugins import PLUGINS
 
 
@@ -27,6 +31,10 @@ class PluginManager:
         self.imagegen = imagegen
         self.debug = debug
         self.plugins: Dict = {}
+        # Shares one execution between identical concurrent calls to
+        # plugins that set `coalesce`
+        self.inflight = SingleFlight()
+        self.coalesced_calls = 0
 
     def load_plugins(self) -> None:
         """Load all available plugins."""
@@ -58,6 +66,36 @@ class PluginManager:
         """
         return name in self.plugins
 
+    def get_plugin_lane(self, name: str) -> Optional[str]:
+        """
+        Get the execution lane a plugin declared.
+
+        Args:
+            name: The plugin name
+
+        Returns:
+            The lane name, or None if the plugin doesn't exist
+        """
+        plugin = self.get_plugin(name)
+        if plugin is None:
+            return None
+        return getattr(plugin, "lane", None)
+
+    def get_plugin_deadline(self, name: str) -> Optional[float]:
+        """
+        Get the time budget (seconds) a plugin declared.
+
+        Args:
+            name: The plugin name
+
+        Returns:
+            The deadline, or None if the plugin doesn't exist or didn't set one
+        """
+        plugin = self.get_plugin(name)
+        if plugin is None:
+            return None
+        return getattr(plugin, "deadline", None)
+
     def execute_plugin(
         self, plugin_name: str, message: str, user_id: str, media: List[str] = None
     ) -> Tuple[str, Optional[str], bool]:
@@ -84,16 +122,82 @@ class PluginManager:
         if media is None:
             media = []
 
-        # Execute the plugin
-        response, outgoing_media, skip_imagegen, meta = self.plugins[
-            plugin_name
-        ].execute(
+        plugin = self.plugins[plugin_name]
+
+        def run():
+            return plugin.execute(
+                query=clean_message,
+                backend=self.backend,
+                media=media,
+                media_backend=self.imagegen,
+            )
+
+        key = self._coalesce_key(plugin, clean_message, media)
+        if key is None:
+            response, outgoing_media, skip_imagegen, meta = run()
+        else:
+            (response, outgoing_media, skip_imagegen, meta), shared = (
+                self.inflight.do(key, run)
+            )
+            if shared:
+                self.coalesced_calls += 1
+                self.console.log(
+                    f"[white on green]Coalesced with in-flight {plugin_name} call"
+                )
+
+        if self.debug:
+            self.console.log(
+                f"[black on green]Plugin response: {response[0:10] if response else 'None'}, "
+                f"media: {outgoing_media}, skip_imagegen: {skip_imagegen}"
+            )
+
+        return response, outgoing_media, skip_imagegen
+
+    async def execute_plugin_async(
+        self, plugin_name: str, message: str, user_id: str, media: List[str] = None
+    ) -> Tuple[str, Optional[str], bool]:
+        """
+        Async variant of execute_plugin(); same arguments and return value.
+
+        Plugins without an `executeAsync` method run in a worker thread.
+        """
+        if not self.has_plugin(plugin_name):
+            return f"Plugin {plugin_name} not found.", None, True
+
+        self.console.log(f"[white on green]Processing plugin: {plugin_name}")
+
+        clean_message = message.replace(f"/{plugin_name}", "").strip()
+
+        if media is None:
+            media = []
+
+        plugin = self.plugins[plugin_name]
+        kwargs = dict(
             query=clean_message,
             backend=self.backend,
             media=media,
             media_backend=self.imagegen,
         )
 
+        async def run():
+            execute_async = getattr(plugin, "executeAsync", None)
+            if inspect.iscoroutinefunction(execute_async):
+                return await execute_async(**kwargs)
+            return await asyncio.to_thread(lambda: plugin.execute(**kwargs))
+
+        key = self._coalesce_key(plugin, clean_message, media)
+        if key is None:
+            response, outgoing_media, skip_imagegen, meta = await run()
+        else:
+            (response, outgoing_media, skip_imagegen, meta), shared = (
+                await self.inflight.do_async(key, run)
+            )
+            if shared:
+                self.coalesced_calls += 1
+                self.console.log(
+                    f"[white on green]Coalesced with in-flight {plugin_name} call"
+                )
+
         if self.debug:
             self.console.log(
                 f"[black on green]Plugin response: {response[0:10] if response else 'None'}, "
@@ -102,6 +206,31 @@ class PluginManager:
 
         return response, outgoing_media, skip_imagegen
 
+    def _coalesce_key(
+        self, plugin: Any, query: str, media: List[str]
+    ) -> Optional[Tuple]:
+        """
+        Build the key identifying equivalent calls to a coalescing plugin.
+
+        Args:
+            plugin: The plugin instance
+            query: The plugin arguments
+            media: List of media file paths
+
+        Returns:
+            Tuple of (plugin name, normalized args, media hashes), or None
+            if the plugin doesn't coalesce or the media can't be read
+        """
+        if not getattr(plugin, "coalesce", False):
+            return None
+
+        try:
+            media_hashes = tuple(sha256_file(path) for path in media if path)
+        except OSError:
+            return None
+
+        return (plugin.name, " ".join(query.split()), media_hashes)
+
     def is_plugin_command(self, message: str) -> bool:
         """
         Check if a message is a plugin command.
@@ -4,6 +4,15 @@ import re
 from typing import Optional
 from rich.console import Console
 
+from app.lib.tracing import traced
+
+# Fetched page text is pasted ahead of the user's message in this block
+URL_CONTENT_BLOCK = "####{url} content: ```\n{content}\n```\n####\n\n"
+# Finds pasted blocks (groups: opening, page text, closing), e.g. to trim them
+URL_CONTENT_RE = re.compile(
+    r"(####\S+ content: ```\n)(.*?)(\n```\n####\n\n)", re.DOTALL
+)
+
 
 class URLExtractor:
     """Handles URL extraction from text and content fetching."""
@@ -72,6 +81,7 @@ class URLExtractor:
             self.console.log(f"[red]Error fetching URL {url}: {e}")
             return None
 
+    @traced("url_augment")
     def augment_message_with_url(self, message: str) -> str:
         """
         Extract URL from message, fetch its content, and augment the message.
@@ -94,5 +104,5 @@ class URLExtractor:
             return message
 
         # Prepend URL content to the message
-        augmented = f"####{url} content: ```\n{content}\n```\n####\n\n{message}"
+        augmented = URL_CONTENT_BLOCK.format(url=url, content=content) + message
         return augmented
@@ -29,3 +29,40 @@ class Ircawp_Frontend:
     @abc.abstractmethod
     def egestEvent(self, message, media, aux=None):
         pass
+
+    def serializeAux(self, aux) -> dict | None:
+        """Convert aux to a JSON-serializable dict for the durable queue.
+
+        Frontends that can't rebuild their aux after a restart return None,
+        and their requests aren't journaled.
+        """
+        return None
+
+    def deserializeAux(self, data: dict):
+        """Rebuild aux from the output of serializeAux, or return None if
+        this frontend can't (the request is then not replayed).
+        """
+        return None
+
+    def streamReply(self, aux):
+        """Return a ReplyStream (app.lib.streaming) that shows a reply while it
+        is being generated, or None if this frontend can't edit sent messages.
+
+        The egestEvent for the same aux must close the stream and replace
+        the partial message with the final reply.
+        """
+        return None
+
+    def abandonReply(self, aux):
+        """Close the stream from streamReply(aux) and remove its partial
+        message; called when the request ends without a reply to egest.
+        """
+        pass
+
+    def retryDelay(self, error: Exception) -> float | None:
+        """Classify an egestEvent failure for the delivery queue.
+
+        Returns None if sending again won't help, otherwise the number of
+        seconds the service asked us to wait (0 to use the normal backoff).
+        """
+        return None
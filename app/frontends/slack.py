@@ -1,16 +1,42 @@
 import re
 import os
 import sys
+import threading
 import uuid
+from collections import OrderedDict
 import dotenv
 import requests
+from urllib.error import URLError
 from .Ircawp_Frontend import Ircawp_Frontend
 
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_sdk.errors import SlackApiError
 
 # from app.lib.thread_history import ThreadManager
+from app.lib.dedupe import IdempotencyStore
 from app.lib.network import depipeText
+from app.lib.streaming import DEFAULT_INTERVAL as STREAM_INTERVAL, ReplyStream
+from app.lib.tracing import traced
+
+# Reacting to a message with one of these cancels the user's requests
+CANCEL_REACTIONS = {"x", "no_entry_sign"}
+# Requests remembered for cancel reactions; older ones are forgotten
+MAX_TRACKED_REQUESTS = 1000
+
+# Slack API errors that mean "try again later" rather than "bad request"
+TRANSIENT_ERRORS = {
+    "ratelimited",
+    "service_unavailable",
+    "internal_error",
+    "fatal_error",
+    "request_timeout",
+}
+
+# Shown after a partial reply while the LLM is still writing
+STREAM_CURSOR = " …"
+# Longest partial reply shown; longer ones show their most recent text
+STREAM_MAX_CHARS = 3000
 
 
 class Slack(Ircawp_Frontend):
@@ -24,6 +50,17 @@ class Slack(Ircawp_Frontend):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.configure()
+        # Slack redelivers events it thinks we missed; remember what we've seen
+        self.seen_events = IdempotencyStore.from_config(self.config.get("ingest_dedupe"))
+        # Replies being shown while they're generated: id(aux) -> placeholder state
+        self.live_replies = {}
+        self.live_replies_lock = threading.Lock()
+        self.stream_interval = self.config.get("stream_update_interval", STREAM_INTERVAL)
+        # Messages that asked for a reply not yet sent: (channel, ts) -> user id
+        self.pending_requests = OrderedDict()
+        # Media replies whose text went out before the upload failed, so a
+        # retried delivery only redoes the upload: id(aux) -> aux
+        self.text_delivered = OrderedDict()
         # self.thread_history = ThreadManager()
 
     ###############################
@@ -108,6 +145,7 @@ class Slack(Ircawp_Frontend):
             self.bolt.command(slack_command)(make_plugin_handler(plugin_name))
 
         self.bolt.event("message")(self.ingestEvent)
+        self.bolt.event("reaction_added")(self.reactionEvent)
         SocketModeHandler(self.bolt, self.slack_creds["SLACK_APP_TOKEN"]).start()
 
     def ingestEvent(self, event, message, client, say, body):
@@ -159,6 +197,19 @@ class Slack(Ircawp_Frontend):
         if not mentioned:
             return
 
+        # Drop redeliveries before they cost a user lookup, downloads or a queue slot
+        event_keys = [
+            ("event", body.get("event_id")) if body.get("event_id") else None,
+            ("msg", event["client_msg_id"]) if event.get("client_msg_id") else None,
+        ]
+        if not self.seen_events.first_seen(event_keys):
+            stats = self.seen_events.stats()
+            self.console.log(
+                f"[black on light_salmon3]Dropped duplicate event {body.get('event_id')} "
+                f"({stats['duplicates']} of {stats['checked']} events were duplicates)"
+            )
+            return
+
         # Extract the prompt text
         # If @mentioned, strip the mention; otherwise use full text (for thread replies)
         if mentioned:
@@ -213,6 +264,8 @@ class Slack(Ircawp_Frontend):
         # if conversation_id:
         # self.thread_history.addToThreadHistory(conversation_id, "user", prompt)
 
+        self._trackRequest(channel, event.get("ts"), user_id)
+
         self.parent.ingestMessage(
             depipeText(prompt),
             username,
@@ -229,6 +282,65 @@ class Slack(Ircawp_Frontend):
             ),
         )
 
+    def reactionEvent(self, event, say, body):
+        """
+        Cancel the reacting user's requests when they put a cancel reaction
+        on one of their pending requests or on the bot's reply to them.
+        Reactions anywhere else are ignored.
+        """
+        if event.get("reaction") not in CANCEL_REACTIONS:
+            return
+
+        item = event.get("item", {})
+        if item.get("type") != "message":
+            return
+
+        user_id = event["user"]
+        if not self._isUsersRequest(item.get("channel"), item.get("ts"), user_id):
+            return
+
+        username = self.bolt.client.users_info(user=user_id)["user"]["profile"][
+            "display_name"
+        ]
+        count = self.parent.cancelRequests(username)
+        if not count:
+            return
+
+        self._untrackUser(user_id)
+        say(text=f"Cancelled {count} request(s).", thread_ts=item["ts"])
+
+    def _trackRequest(self, channel, ts, user_id) -> None:
+        """Remember a message waiting for a reply, so reacting to it cancels."""
+        if not ts:
+            return
+        with self.live_replies_lock:
+            self.pending_requests[(channel, ts)] = user_id
+            while len(self.pending_requests) > MAX_TRACKED_REQUESTS:
+                self.pending_requests.popitem(last=False)
+
+    def _untrackRequest(self, aux) -> None:
+        """Forget the message a delivered reply answers."""
+        user_id, channel, say, body, thread_ts, conversation_id = aux
+        ts = (body or {}).get("event", {}).get("ts")
+        with self.live_replies_lock:
+            self.pending_requests.pop((channel, ts), None)
+
+    def _untrackUser(self, user_id) -> None:
+        with self.live_replies_lock:
+            for key in [k for k, v in self.pending_requests.items() if v == user_id]:
+                del self.pending_requests[key]
+
+    def _isUsersRequest(self, channel, ts, user_id) -> bool:
+        """True if the message is user_id's pending request or a reply being written to them."""
+        with self.live_replies_lock:
+            if self.pending_requests.get((channel, ts)) == user_id:
+                return True
+            return any(
+                live["ts"] == ts and live["aux"][:2] == (user_id, channel)
+                for live in self.live_replies.values()
+            )
+
+    @traced("slack.egest")
     def egestEvent(self, message, media, aux={}):
         user_id, channel, say, body, thread_ts, conversation_id = aux
 
@@ -242,27 +354,155 @@ class Slack(Ircawp_Frontend):
         # HACK:
         media = media[0]
 
+        # A partial reply shown while generating is replaced by the final one
+        placeholder_ts = self._closeStream(aux)
+
         if not media:
             blocks = self._build_blocks_with_prefix(f"<@{user_id}> ", message or "")
+            self._sayBlocks(blocks, aux, placeholder_ts)
+        else:
+            self._postMedia(message, media, aux, placeholder_ts)
+            with self.live_replies_lock:
+                self.text_delivered.pop(id(aux), None)
 
-            # Only reply in thread if thread_ts exists (user initiated thread)
-            if thread_ts:
-                say(blocks=blocks, thread_ts=thread_ts)
+        self._forgetStream(aux)
+        self._untrackRequest(aux)
+
+    def streamReply(self, aux):
+        user_id, channel, say, body, thread_ts, conversation_id = aux
+        live = {"aux": aux, "ts": None}
+
+        def send(text):
+            if len(text) > STREAM_MAX_CHARS:
+                text = "…" + text[-STREAM_MAX_CHARS:]
+            preview = f"<@{user_id}> {text}{STREAM_CURSOR}"
+            if live["ts"] is None:
+                kwargs = {"text": preview}
+                if thread_ts:
+                    kwargs["thread_ts"] = thread_ts
+                live["ts"] = say(**kwargs)["ts"]
             else:
-                say(blocks=blocks)  # Post to channel, not in thread
+                self.bolt.client.chat_update(channel=channel, ts=live["ts"], text=preview)
+
+        live["stream"] = ReplyStream(
+            send, interval=self.stream_interval, console=self.console
+        )
+        with self.live_replies_lock:
+            self.live_replies[id(aux)] = live
+        return live["stream"]
+
+    def abandonReply(self, aux):
+        placeholder_ts = self._closeStream(aux)
+        self._forgetStream(aux)
+        if placeholder_ts:
+            user_id, channel, say, body, thread_ts, conversation_id = aux
+            try:
+                self.bolt.client.chat_delete(channel=channel, ts=placeholder_ts)
+            except Exception as e:
+                self.console.log(
+                    f"[yellow on light_salmon3]Failed to remove partial reply: {e}"
+                )
+
+    def _closeStream(self, aux) -> str | None:
+        """Stop a partial reply for aux; returns its message ts if one was posted."""
+        with self.live_replies_lock:
+            live = self.live_replies.get(id(aux))
+        if live is None or live["aux"] is not aux:
+            return None
+        live["stream"].close()
+        return live["ts"]
+
+    def _forgetStream(self, aux) -> None:
+        """Drop a partial reply's state once the final reply is delivered."""
+        with self.live_replies_lock:
+            live = self.live_replies.get(id(aux))
+            if live is not None and live["aux"] is aux:
+                del self.live_replies[id(aux)]
+
+    def _sayBlocks(self, blocks, aux, placeholder_ts=None):
+        """Post blocks as a reply, or put them in place of a partial reply."""
+        user_id, channel, say, body, thread_ts, conversation_id = aux
+        if placeholder_ts:
+            self.bolt.client.chat_update(
+                channel=channel,
+                ts=placeholder_ts,
+                blocks=blocks,
+                text=blocks[0]["text"]["text"],
+            )
+        # Only reply in thread if thread_ts exists (user initiated thread)
+        elif thread_ts:
+            say(blocks=blocks, thread_ts=thread_ts)
         else:
-            self._postMedia(message, media, aux)
-        pass
+            say(blocks=blocks)  # Post to channel, not in thread
+
+    def retryDelay(self, error: Exception) -> float | None:
+        if isinstance(error, SlackApiError):
+            response = error.response
+            status = getattr(response, "status_code", 0) or 0
+            if status == 429 or response.get("error") == "ratelimited":
+                headers = getattr(response, "headers", None) or {}
+                try:
+                    return float(headers.get("Retry-After", 0))
+                except (TypeError, ValueError):
+                    return 0.0
+            if status >= 500 or response.get("error") in TRANSIENT_ERRORS:
+                return 0.0
+            return None
+
+        # Network trouble talking to Slack (includes socket timeouts)
+        if isinstance(
+            error,
+            (
+                ConnectionError,
+                TimeoutError,
+                URLError,
+                requests.exceptions.ConnectionError,
+            ),
+        ):
+            return 0.0
+        return None
 
-    def _postMedia(self, message, media, aux):
+    def serializeAux(self, aux) -> dict | None:
         user_id, channel, say, body, thread_ts, conversation_id = aux
+        return {
+            "user_id": user_id,
+            "channel": channel,
+            "thread_ts": thread_ts,
+            "conversation_id": conversation_id,
+        }
+
+    def deserializeAux(self, data: dict):
+        channel = data["channel"]
+
+        # The original `say` doesn't survive a restart; post through the client
+        # instead. Resolved at call time since replay starts before the bolt app.
+        def say(**kwargs):
+            return self.bolt.client.chat_postMessage(channel=channel, **kwargs)
+
+        return (
+            data["user_id"],
+            channel,
+            say,
+            {},
+            data.get("thread_ts"),
+            data.get("conversation_id"),
+        )
 
-        if message:
-            blocks = self._build_blocks_with_prefix(f"<@{user_id}> ", message)
-            if thread_ts:
-                say(blocks=blocks, thread_ts=thread_ts)
-            else:
-                say(blocks=blocks)
+    def _postMedia(self, message, media, aux, placeholder_ts=None):
+        user_id, channel, say, body, thread_ts, conversation_id = aux
+
+        with self.live_replies_lock:
+            text_sent = self.text_delivered.get(id(aux)) is aux
+        if not text_sent:
+            if message:
+                blocks = self._build_blocks_with_prefix(f"<@{user_id}> ", message)
+                self._sayBlocks(blocks, aux, placeholder_ts)
+            elif placeholder_ts:
+                self.bolt.client.chat_delete(channel=channel, ts=placeholder_ts)
+            with self.live_replies_lock:
+                self.text_delivered[id(aux)] = aux
+                while len(self.text_delivered) > MAX_TRACKED_REQUESTS:
+                    self.text_delivered.popitem(last=False)
 
         with open(media, "rb") as f:
             upload_kwargs = {
@@ -1,15 +1,25 @@
 import argparse
+import asyncio
 import importlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
 
 from rich import console as rich_console
 from rich.traceback import install
 from app.lib.thread_history import ThreadManager
-from app.core import MessageRouter, PluginManager, MediaManager, URLExtractor
-from app.core.message_router import _conversation_history
-
-install(show_locals=True)
-
-DEBUG = True
+from app.core import (
+    MessageRouter,
+    PluginManager,
+    MediaManager,
+    MediaStore,
+    TransientDeliveryError,
+    URLExtractor,
+)
+from app.core.media_store import DEFAULT_MAX_BYTES as MEDIA_STORE_MAX_BYTES
+from app.core.media_store import process_store_dir
+from app.lib import log
+from app.lib.streaming import stream_scope
 
 BANNER = r"""
 [red] __[/red]
@@ -37,6 +47,14 @@ class Ircawp:
         Args:
             config: Application configuration dictionary
         """
+        log.configure(config)
+        # Locals in tracebacks can hold whole prompts and image payloads
+        install(
+            show_locals=(config.get("logging") or {}).get(
+                "tracebacks_show_locals", False
+            )
+        )
+
         self.console = rich_console.Console()
         self.console.log(BANNER)
 
@@ -55,13 +73,20 @@ class Ircawp:
             media_dir=self.config.get("media_dir", "/tmp/ircawp_media"),
         )
 
+        # Images referenced by conversation history, stored by content hash
+        self.media_store = MediaStore(
+            console=self.console,
+            store_dir=process_store_dir(Path(self.media_manager.media_dir) / "store"),
+            max_bytes=self.config.get("media_store_max_bytes", MEDIA_STORE_MAX_BYTES),
+        )
+
         self.url_extractor = URLExtractor(console=self.console)
 
         self.plugin_manager = PluginManager(
             console=self.console,
             backend=self.backend,
             imagegen=self.imagegen,
-            debug=DEBUG,
+            debug=log.is_enabled("plugins"),
         )
         self.plugin_manager.load_plugins()
 
@@ -70,14 +95,21 @@ class Ircawp:
             plugin_manager=self.plugin_manager,
             media_manager=self.media_manager,
             process_text_callback=self._process_text_message,
+            process_text_async_callback=self._process_text_message_async,
             egest_callback=self._egest_message,
             config=self.config,
             backend=self.backend,
-            debug=DEBUG,
+            media_store=self.media_store,
+            serialize_aux=self._serialize_aux,
+            deserialize_aux=self._deserialize_aux,
+            debug=log.is_enabled("router"),
         )
 
-        # Initialize frontend (must be last, as it may reference parent services)
-        self._init_frontend()
+        # Initialize frontend (must be last, as it may reference parent services).
+        # Distributed-mode workers have none; the ingest process replies for them.
+        self.frontend = None
+        if self.message_router.role != "worker":
+            self._init_frontend()
 
     def _init_frontend(self) -> None:
         """Initialize the frontend from config."""
@@ -120,9 +152,11 @@ class Ircawp:
             server_url = imagegen_config.get(
                 "media_server_url", "http://localhost:8100"
             )
+            timeout = imagegen_config.get("timeout")
         else:
             backend_id = None
             server_url = None
+            timeout = None
 
         if backend_id:
             self.console.log(
@@ -130,7 +164,9 @@ class Ircawp:
             )
             self.console.log(f"  media-server: {server_url}")
 
-            self.imagegen = MediaBackend(server_url=server_url, backend_id=backend_id)
+            self.imagegen = MediaBackend(
+                server_url=server_url, backend_id=backend_id, timeout=timeout
+            )
 
             if hasattr(self.backend, "update_media_backend"):
                 self.backend.update_media_backend(self.imagegen)
@@ -164,6 +200,18 @@ class Ircawp:
         """
         self.message_router.ingest(message, username, media, thread_history, aux)
 
+    def cancelRequests(self, username) -> int:
+        """
+        Cancel a user's queued and running requests without replying.
+
+        Args:
+            username (str): The user whose requests to cancel.
+
+        Returns:
+            int: Number of requests cancelled.
+        """
+        return self.message_router.cancel(username)
+
     def _egest_message(self, message: str, media: list, aux: dict) -> None:
         """
         Send a response to the frontend (internal callback).
@@ -172,6 +220,10 @@ class Ircawp:
             message (str): Outgoing message to the frontend.
             media (list): Placeholder for media attachments.
             aux (list, optional): Bundle of optional data needed to route the message back to the user.
+
+        Raises:
+            TransientDeliveryError: If the frontend failed in a way worth retrying
+                and the router has a delivery queue to retry it
         """
         # Enforce size limit before sending to frontend to avoid transport errors
         try:
@@ -185,6 +237,16 @@ class Ircawp:
             self.frontend.egestEvent(message, media, aux)
 
         except Exception as e:
+            # Rate limits and outages: let the delivery queue retry the original.
+            # Without one, nothing would retry it, so fall back as below.
+            retry_after = (
+                self.frontend.retryDelay(e)
+                if self.message_router.delivery is not None
+                else None
+            )
+            if retry_after is not None:
+                raise TransientDeliveryError(str(e), retry_after=retry_after) from e
+
             # Never let frontend errors kill the queue thread; log and attempt a safe fallback
             try:
                 self.console.log(
@@ -212,8 +274,21 @@ class Ircawp:
         # Note: Plugin execution is handled by `MessageRouter`. Avoid invoking plugins here
         # to keep egestion isolated to frontend delivery.
 
+    def _serialize_aux(self, aux) -> dict | None:
+        """Convert frontend routing data for the durable queue (internal callback)."""
+        return self.frontend.serializeAux(aux)
+
+    def _deserialize_aux(self, data: dict):
+        """Rebuild frontend routing data for a replayed request (internal callback)."""
+        return self.frontend.deserializeAux(data)
+
     def _process_text_message(
-        self, message: str, user_id: str, incoming_media: list = None, aux=None
+        self,
+        message: str,
+        user_id: str,
+        incoming_media: list = None,
+        aux=None,
+        conversation_history: list[dict] | None = None,
     ) -> tuple:
         """
         Process a regular text message (internal callback).
@@ -223,6 +298,7 @@ class Ircawp:
             user_id (str): User ID who sent the message
             incoming_media (list): An array of local file path strings to incoming media.
             aux: Auxiliary routing data
+            conversation_history (list[dict]): Prior turns when continuing with +
 
         Returns:
             tuple[str, list[str]]: (response_text, tool_generated_image_paths)
@@ -233,23 +309,88 @@ class Ircawp:
         if incoming_media is None:
             incoming_media = []
 
-        response, tool_images = self.backend.runInference(
-            prompt=message,
-            system_prompt=None,
-            username=user_id,
-            media=incoming_media,
-            aux=aux,
-            conversation_history=_conversation_history
-            if _conversation_history
-            else None,
+        with self._streaming_reply(aux):
+            response, tool_images = self.backend.runInference(
+                prompt=message,
+                system_prompt=None,
+                username=user_id,
+                media=incoming_media,
+                aux=aux,
+                conversation_history=conversation_history,
+            )
+
+        return response, tool_images
+
+    async def _process_text_message_async(
+        self,
+        message: str,
+        user_id: str,
+        incoming_media: list = None,
+        aux=None,
+        conversation_history: list[dict] | None = None,
+    ) -> tuple:
+        """
+        Async variant of _process_text_message (internal callback for the
+        router's asyncio mode).
+        """
+        # URL content is fetched with JS rendering, which only has a blocking path
+        message = await asyncio.to_thread(
+            self.url_extractor.augment_message_with_url, message
         )
 
+        if incoming_media is None:
+            incoming_media = []
+
+        with self._streaming_reply(aux):
+            response, tool_images = await self.backend.runInferenceAsync(
+                prompt=message,
+                system_prompt=None,
+                username=user_id,
+                media=incoming_media,
+                aux=aux,
+                conversation_history=conversation_history,
+            )
+
         return response, tool_images
 
+    def _reply_stream(self, aux):
+        """The frontend's stream for showing this reply while it's generated, if any."""
+        if self.frontend is None or aux is None:
+            return None
+        if not getattr(self.backend, "stream_replies", False):
+            return None
+        return self.frontend.streamReply(aux)
+
+    @contextmanager
+    def _streaming_reply(self, aux):
+        """
+        Stream the reply for aux within this block, if possible.
+
+        If the block fails (an error, a timeout, a cancel), no final reply
+        may ever replace the partial one, so the frontend drops it here.
+        """
+        stream = self._reply_stream(aux)
+        try:
+            with stream_scope(stream):
+                yield
+        except BaseException:
+            if stream is not None:
+                self.frontend.abandonReply(aux)
+            raise
+
     def start(self):
         """Start the bot: begin message processing and start the frontend."""
         self.console.log("[green on white]Here we go...")
         self.message_router.start()
+
+        if self.frontend is None:
+            # Worker process: the router's threads do everything
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                self.message_router.stop()
+            return
+
         self.frontend.start()
 
 
@@ -260,6 +401,11 @@ def __main__():
         default="config.yml",
         help="Path to config file (default: config.yml)",
     )
+    parser.add_argument(
+        "--role",
+        choices=["standalone", "ingest", "worker"],
+        help="Distributed mode role (overrides distributed.role in the config)",
+    )
 
     args = parser.parse_args()
 
@@ -279,5 +425,8 @@ def __main__():
 
     print(f"* Using config file: {args.config}")
 
+    if args.role:
+        cfg["distributed"] = {**(cfg.get("distributed") or {}), "role": args.role}
+
     ircawp = Ircawp(cfg)
     ircawp.start()
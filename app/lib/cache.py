@@ -2,42 +2,48 @@
 
 Entries are stored with insertion timestamp and per-item TTL.
 A cleanup pass runs on every read to purge expired items.
-Not thread-safe; suitable for single-process usage.
+Thread-safe (tool calls run concurrently); suitable for single-process usage.
 """
 
+import threading
 from time import time
 from typing import Any, Dict, Tuple
 
 # key -> (stored_at, ttl_seconds, value)
 _store: Dict[str, Tuple[float, int, Any]] = {}
+_lock = threading.Lock()
 DEFAULT_TTL_SECONDS = 600  # 10 minutes
 
 
 def set_cache(key: str, value: Any, ttl: int = DEFAULT_TTL_SECONDS) -> None:
-    _store[key] = (time(), ttl, value)
+    with _lock:
+        _store[key] = (time(), ttl, value)
 
 
 def get_cache(key: str) -> Any:
     now = time()
-    # Cleanup expired entries
-    expired = [k for k, (t, ttl, _) in _store.items() if now - t > ttl]
-    for k in expired:
-        del _store[k]
-
-    entry = _store.get(key)
-    if entry is None:
+    with _lock:
+        # Cleanup expired entries
+        expired = [k for k, (t, ttl, _) in _store.items() if now - t > ttl]
+        for k in expired:
+            del _store[k]
+
+        entry = _store.get(key)
+        if entry is None:
+            return None
+        stored_at, ttl, value = entry
+        if now - stored_at <= ttl:
+            return value
+        # Expired; remove and return None
+        del _store[key]
         return None
-    stored_at, ttl, value = entry
-    if now - stored_at <= ttl:
-        return value
-    # Expired; remove and return None
-    del _store[key]
-    return None
 
 
 def cache_size() -> int:
-    return len(_store)
+    with _lock:
+        return len(_store)
 
 
 def clear_cache() -> None:
-    _store.clear()
+    with _lock:
+        _store.clear()
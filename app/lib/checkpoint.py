@@ -0,0 +1,65 @@
+"""Checkpoints for expensive intermediate results of a durable request.
+
+While the router processes a request from its durable queue, code deep in
+the call stack (plugins, prompt helpers) can save results such as refined
+prompts or transcripts. If the bot restarts mid-request, the replayed
+request picks them up instead of recomputing. Outside a durable request
+these helpers do nothing.
+"""
+
+import hashlib
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# (durable queue, request id) for the request being processed, if any
+_active: ContextVar[Optional[tuple]] = ContextVar("ircawp_checkpoint", default=None)
+
+
+@contextmanager
+def checkpoint_scope(store: Any, request_id: int) -> Iterator[None]:
+    """Make checkpoints within this block belong to `request_id` in `store`."""
+    token = _active.set((store, request_id))
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def checkpoint_name(prefix: str, *parts: Any) -> str:
+    """Build a checkpoint name from a prefix and the inputs that determine the result."""
+    digest = hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return f"{prefix}:{digest}"
+
+
+def load_checkpoint(name: str) -> Optional[Any]:
+    """Get a saved result for the current request, or None."""
+    active = _active.get()
+    if active is None:
+        return None
+    store, request_id = active
+    return store.load_checkpoint(request_id, name)
+
+
+def save_checkpoint(name: str, value: Any) -> None:
+    """Save a JSON-serializable result for the current request."""
+    active = _active.get()
+    if active is None:
+        return
+    store, request_id = active
+    store.save_checkpoint(request_id, name, value)
+
+
+def checkpointed(name: str, compute: Callable[[], T]) -> T:
+    """Return the saved result for `name`, or compute and save it."""
+    saved = load_checkpoint(name)
+    if saved is not None:
+        return saved
+    value = compute()
+    save_checkpoint(name, value)
+    return value
@@ -0,0 +1,18 @@
+"""Identifying the conversation a request belongs to."""
+
+from typing import Any, Optional
+
+
+def conversation_key(aux: Any) -> Optional[tuple]:
+    """Return the (channel, thread_ts) ordering key carried in a Slack aux tuple.
+
+    Slack aux layout: (user_id, channel, say, body, thread_ts, conversation_id).
+    Jobs from a distributed-mode broker (app.core.broker.RemoteAux) carry
+    the key taken at ingest in their `conversation` attribute.
+    Returns None for aux shapes that don't identify a conversation.
+    """
+    if hasattr(aux, "conversation"):
+        return aux.conversation
+    if isinstance(aux, tuple) and len(aux) >= 5:
+        return (aux[1], aux[4])
+    return None
@@ -0,0 +1,177 @@
+"""Per-request deadlines and cancellation.
+
+The router gives every queue item a Deadline: a time budget that starts
+when a worker picks the item up, plus a cancel flag a user can set. Code
+below it in the call stack caps outbound timeouts with `timeout_for` and
+calls `check_deadline` at safe points (e.g. between tool rounds), which
+raises once the budget is spent or the request was cancelled. Outside a
+request these helpers do nothing. Like checkpoints, the active deadline
+lives in a ContextVar, so it follows asyncio tasks and worker threads.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+# Shortest timeout handed to an outbound call, so a nearly spent budget
+# fails fast instead of passing 0 (which some clients treat as "no timeout")
+MIN_TIMEOUT = 0.1
+
+_active: ContextVar[Optional["Deadline"]] = ContextVar(
+    "ircawp_deadline", default=None
+)
+
+
+class RequestAborted(Exception):
+    """The request must stop: its deadline passed or it was cancelled."""
+
+
+class DeadlineExceeded(RequestAborted):
+    """The request ran out of its time budget."""
+
+
+class RequestCancelled(RequestAborted):
+    """The user cancelled the request."""
+
+
+class Deadline:
+    """Time budget and cancel flag for one request. Thread-safe."""
+
+    def __init__(self, budget: Optional[float] = None, owner: Any = None):
+        """
+        Args:
+            budget: Seconds allowed once started (None for no limit)
+            owner: Who may cancel the request (e.g. username)
+        """
+        self.budget = budget
+        self.owner = owner
+        self.expires_at: Optional[float] = None
+        # asyncio task running the request, set by async workers
+        self.task = None
+        self._cancelled = threading.Event()
+
+    def start(self) -> None:
+        """Start the clock."""
+        if self.budget is not None:
+            self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None if unlimited or not started."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        """True once the budget is spent."""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def cancel(self) -> None:
+        """Ask the request to stop at its next check."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """True if cancel() was called."""
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        """
+        Raise if the request should stop.
+
+        Raises:
+            RequestCancelled: If the request was cancelled
+            DeadlineExceeded: If the budget is spent
+        """
+        if self.cancelled:
+            raise RequestCancelled("Request cancelled")
+        if self.expired():
+            raise DeadlineExceeded(f"Request exceeded its {self.budget}s deadline")
+
+
+class ChildDeadline(Deadline):
+    """
+    A request's deadline narrowed for one piece of work (e.g. a tool call).
+
+    Expires at its own budget (started at once) or the parent's, whichever
+    comes first, and is cancelled by its own cancel() or the parent's, so
+    work can be stopped without cancelling the whole request.
+    """
+
+    def __init__(self, parent: Optional[Deadline], budget: Optional[float] = None):
+        """
+        Args:
+            parent: The enclosing request's deadline (None outside a request)
+            budget: Seconds allowed for this work (None for the parent's)
+        """
+        super().__init__(budget, owner=parent.owner if parent else None)
+        self.parent = parent
+        self.start()
+
+    def remaining(self) -> Optional[float]:
+        own = super().remaining()
+        inherited = self.parent.remaining() if self.parent is not None else None
+        if own is None or inherited is None:
+            return inherited if own is None else own
+        return min(own, inherited)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set() or (
+            self.parent is not None and self.parent.cancelled
+        )
+
+    def check(self) -> None:
+        # The parent's errors first, so they report the request's budget
+        if self.parent is not None:
+            self.parent.check()
+        super().check()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[None]:
+    """Make `deadline` apply to everything within this block."""
+    token = _active.set(deadline)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Return the deadline of the request being processed, or None."""
+    return _active.get()
+
+
+def check_deadline() -> None:
+    """Raise RequestAborted if the current request should stop."""
+    deadline = _active.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def timeout_for(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Cap an outbound call's timeout by the current request's remaining time.
+
+    Args:
+        timeout: The call's own timeout in seconds (None for none)
+
+    Returns:
+        The smaller of the two, or `timeout` outside a request
+
+    Raises:
+        RequestAborted: If the request should already have stopped
+    """
+    deadline = _active.get()
+    if deadline is None:
+        return timeout
+    deadline.check()
+
+    remaining = deadline.remaining()
+    if remaining is None:
+        return timeout
+    remaining = max(MIN_TIMEOUT, remaining)
+    return remaining if timeout is None else min(timeout, remaining)
@@ -0,0 +1,96 @@
+"""Idempotency store for absorbing redelivered events.
+
+Chat platforms resend an event when it isn't acknowledged quickly enough
+(Slack retries up to three times), so the same message can arrive more
+than once. `IdempotencyStore.first_seen` records event keys and reports
+repeats, so callers can drop a duplicate before it does any work. Keys are
+forgotten after `ttl` seconds, and the oldest are evicted beyond
+`max_entries`. Thread-safe.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+DEFAULT_MAX_ENTRIES = 10000
+# Slack gives up on redelivery after about 5 minutes; keep keys a bit longer
+DEFAULT_TTL = 600.0
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_entries: Most keys remembered at once
+            ttl: Seconds a key is remembered
+            clock: Monotonic time source (seconds)
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.clock = clock
+        # key -> time first seen, oldest first
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    @classmethod
+    def from_config(cls, config: Optional[dict], **kwargs) -> "IdempotencyStore":
+        """Build a store from a {max_entries, ttl} dict (defaults if omitted)."""
+        config = config or {}
+        return cls(
+            max_entries=config.get("max_entries", DEFAULT_MAX_ENTRIES),
+            ttl=config.get("ttl", DEFAULT_TTL),
+            **kwargs,
+        )
+
+    def first_seen(self, keys: Iterable[Optional[Hashable]]) -> bool:
+        """
+        Record an event's keys and report whether it is new.
+
+        An event may carry several identifiers (e.g. a delivery id and a
+        message id); it is a duplicate if any of them was seen before.
+        None keys are ignored, and an event with no keys is always new.
+
+        Returns:
+            True the first time, False for a duplicate
+        """
+        keys = [key for key in keys if key is not None]
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            self.checked += 1
+
+            duplicate = any(key in self._seen for key in keys)
+            for key in keys:
+                if key not in self._seen:
+                    self._seen[key] = now
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+
+            if duplicate:
+                self.duplicates += 1
+            return not duplicate
+
+    def stats(self) -> Dict[str, int]:
+        """Return {"checked", "duplicates", "tracked"} counters."""
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+                "tracked": len(self._seen),
+            }
+
+    def _expire(self, now: float) -> None:
+        """Forget keys older than the TTL; caller must hold the lock."""
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._seen[key]
@@ -0,0 +1,52 @@
+"""Drivers for "flow" generators shared by blocking and asyncio code paths.
+
+A flow is a generator holding request logic once. Each I/O step it needs
+is yielded as a (kind, args) tuple, and the driver sends back the step's
+result (or throws its exception back in at the yield). The flow's return
+value is the driver's result. If driving stops early (an exception the
+flow doesn't handle, or the task being cancelled), the flow is closed so
+its `finally` blocks run. `run_flow` performs steps with blocking
+calls; `run_flow_async` awaits them, so the same logic serves both.
+"""
+
+from typing import Any, Awaitable, Callable, Generator
+
+Flow = Generator[tuple, Any, Any]
+
+
+def run_flow(flow: Flow, perform: Callable[[tuple], Any]) -> Any:
+    """Drive `flow`, performing each step with the blocking `perform(step)`."""
+    try:
+        step = next(flow)
+        while True:
+            try:
+                result = perform(step)
+            except Exception as e:
+                step = flow.throw(e)
+            else:
+                step = flow.send(result)
+    except StopIteration as done:
+        return done.value
+    finally:
+        # Runs the flow's cleanup if we stopped early (e.g. task cancelled)
+        flow.close()
+
+
+async def run_flow_async(
+    flow: Flow, perform: Callable[[tuple], Awaitable[Any]]
+) -> Any:
+    """Drive `flow`, awaiting `perform(step)` for each step."""
+    try:
+        step = next(flow)
+        while True:
+            try:
+                result = await perform(step)
+            except Exception as e:
+                step = flow.throw(e)
+            else:
+                step = flow.send(result)
+    except StopIteration as done:
+        return done.value
+    finally:
+        # Runs the flow's cleanup if we stopped early (e.g. task cancelled)
+        flow.close()
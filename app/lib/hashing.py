@@ -0,0 +1,22 @@
+"""Content hashing helpers."""
+
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: str) -> str:
+    """
+    Hash a file's contents without loading it all into memory.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
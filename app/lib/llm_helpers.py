@@ -1,4 +1,5 @@
 from app.backends.Ircawp_Backend import Ircawp_Backend
+from app.lib.checkpoint import checkpoint_name, checkpointed
 
 SYSTEM_PROMPT_MEDIA = """You are an expert image analysis assistant. Your task is to provide a comprehensive, detailed description of the provided image.
 
@@ -97,8 +98,28 @@ def refinePrompt(
 ) -> str:
     """
     Refine the user prompt for image generation.
+
+    Within a durable request the result is checkpointed, so a replay after
+    a restart doesn't refine the same prompt again.
     """
+    name = checkpoint_name(
+        "refine_prompt", user_prompt, media, override_system_prompt, is_edit
+    )
+    return checkpointed(
+        name,
+        lambda: _refinePrompt(
+            user_prompt, backend, media, override_system_prompt, is_edit
+        ),
+    )
 
+
+def _refinePrompt(
+    user_prompt: str,
+    backend: Ircawp_Backend,
+    media=None,
+    override_system_prompt: str | None = None,
+    is_edit: bool = False,
+) -> str:
     if is_edit:
         if not media:
             backend.console.log(
@@ -108,6 +129,7 @@ def refinePrompt(
 
         backend.console.log("[blue]Refining edit prompt based on provided image.")
         refined_prompt, _ = backend.runInference(
+            purpose="refine_prompt",
             prompt=user_prompt,
             system_prompt=override_system_prompt or SYSTEM_PROMPT_EDIT_MEDIA,
             use_tools=False,
@@ -119,6 +141,7 @@ def refinePrompt(
     if media:
         sprompt = override_system_prompt or SYSTEM_PROMPT_MEDIA
         refined_prompt, _ = backend.runInference(
+            purpose="refine_prompt",
             prompt="",
             system_prompt=sprompt,
             use_tools=False,
@@ -132,6 +155,7 @@ def refinePrompt(
                 f"[blue]Refining image description based on user prompt: {sprompt}"
             )
             refined_prompt, _ = backend.runInference(
+                purpose="refine_prompt",
                 prompt=user_prompt,
                 system_prompt=sprompt,
                 use_tools=False,
@@ -143,6 +167,7 @@ def refinePrompt(
         sprompt = override_system_prompt or SYSTEM_PROMPT
 
         refined_prompt, _ = backend.runInference(
+            purpose="refine_prompt",
             prompt=user_prompt,
             system_prompt=sprompt,
             use_tools=False,
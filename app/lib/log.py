@@ -0,0 +1,180 @@
+"""Level-gated, per-subsystem logging on top of the Rich console.
+
+Each subsystem (openai, router, wikipedia, network, ...) gets a Logger
+whose threshold comes from the `logging` config section:
+
+    logging:
+      level: info              # default for every subsystem
+      subsystems:
+        openai: debug
+        wikipedia: warning
+      max_field_chars: 500     # longer values are truncated in log lines
+
+Messages are built lazily: pass printf-style arguments (or a zero-argument
+callable) and nothing is formatted unless the level is enabled. Arguments
+are redacted before formatting: base64 data URIs are reduced to their size
+and long strings are truncated, so logging a request payload never dumps
+megabytes of image data.
+"""
+
+import re
+from typing import Any, Callable, Optional, Union
+
+from rich.console import Console
+from rich.markup import escape
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+
+DEFAULT_LEVEL = INFO
+DEFAULT_MAX_FIELD_CHARS = 500
+
+# Rich styles per subsystem, matching docs/LOG_COLORS.md
+STYLES = {
+    "router": "white on purple",
+    "openai": "black on yellow",
+    "plugins": "white on green",
+    "tools": "black on cyan",
+    "wikipedia": "cyan",
+    "network": "dim",
+    "slack": "black on light_salmon3",
+    "ircawp": "black on white",
+}
+
+LEVEL_STYLES = {WARNING: "yellow", ERROR: "red"}
+
+_DATA_URI_RE = re.compile(r"data:([\w.+/-]+);base64,[A-Za-z0-9+/=]+")
+
+_settings = {
+    "level": DEFAULT_LEVEL,
+    "subsystems": {},
+    "max_field_chars": DEFAULT_MAX_FIELD_CHARS,
+}
+_default_console: Optional[Console] = None
+
+
+def _parse_level(level: Union[str, int, None], default: int) -> int:
+    if level is None:
+        return default
+    if isinstance(level, int):
+        return level
+    return LEVELS.get(str(level).lower(), default)
+
+
+def configure(config: Optional[dict]) -> None:
+    """Apply the `logging` section of the application config."""
+    section = (config or {}).get("logging") or {}
+    _settings["level"] = _parse_level(section.get("level"), DEFAULT_LEVEL)
+    _settings["subsystems"] = {
+        name: _parse_level(level, _settings["level"])
+        for name, level in (section.get("subsystems") or {}).items()
+    }
+    _settings["max_field_chars"] = int(
+        section.get("max_field_chars", DEFAULT_MAX_FIELD_CHARS)
+    )
+
+
+def level_for(subsystem: str) -> int:
+    """Return the threshold for a subsystem."""
+    return _settings["subsystems"].get(subsystem, _settings["level"])
+
+
+def is_enabled(subsystem: str, level: int = DEBUG) -> bool:
+    """True if `subsystem` logs messages at `level`."""
+    return level >= level_for(subsystem)
+
+
+def redact(value: Any, limit: Optional[int] = None) -> Any:
+    """
+    Shrink a value for logging.
+
+    Strings lose base64 data URI bodies and are truncated to `limit`
+    characters; dicts, lists and tuples are redacted recursively. Other
+    values are returned unchanged.
+    """
+    if limit is None:
+        limit = _settings["max_field_chars"]
+
+    if isinstance(value, str):
+        value = _DATA_URI_RE.sub(
+            lambda m: f"data:{m.group(1)};base64,<{len(m.group(0))} chars>", value
+        )
+        if len(value) > limit:
+            value = f"{value[:limit]}...<{len(value)} chars>"
+        return value
+    if isinstance(value, dict):
+        return {k: redact(v, limit) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v, limit) for v in value)
+    return value
+
+
+class Logger:
+    """Logger for one subsystem. Cheap to create; levels are read at call time."""
+
+    def __init__(self, subsystem: str, console: Optional[Console] = None):
+        """
+        Args:
+            subsystem: Name used to look up the level and style
+            console: Rich console to write to (a shared one if omitted)
+        """
+        self.subsystem = subsystem
+        self.console = console
+        self.style = STYLES.get(subsystem)
+
+    def enabled(self, level: int = DEBUG) -> bool:
+        """True if messages at `level` are written."""
+        return is_enabled(self.subsystem, level)
+
+    def debug(self, msg: Union[str, Callable[[], str]], *args: Any) -> None:
+        self.log(DEBUG, msg, *args)
+
+    def info(self, msg: Union[str, Callable[[], str]], *args: Any) -> None:
+        self.log(INFO, msg, *args)
+
+    def warning(self, msg: Union[str, Callable[[], str]], *args: Any) -> None:
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg: Union[str, Callable[[], str]], *args: Any) -> None:
+        self.log(ERROR, msg, *args)
+
+    def log(self, level: int, msg: Union[str, Callable[[], str]], *args: Any) -> None:
+        """
+        Write a message if `level` is enabled for this subsystem.
+
+        Args:
+            level: DEBUG, INFO, WARNING or ERROR
+            msg: Rich-markup format string, or a callable returning the
+                message (only called when enabled)
+            *args: printf-style arguments; redacted and markup-escaped
+        """
+        if not self.enabled(level):
+            return
+
+        if callable(msg):
+            msg = msg()
+        if args:
+            msg = msg % tuple(escape(str(redact(arg))) for arg in args)
+
+        style = LEVEL_STYLES.get(level, self.style)
+        if style:
+            msg = f"[{style}]{msg}"
+        self._console().log(msg)
+
+    def _console(self) -> Console:
+        global _default_console
+        if self.console is not None:
+            return self.console
+        if _default_console is None:
+            _default_console = Console()
+        return _default_console
+
+
+def get_logger(subsystem: str, console: Optional[Console] = None) -> Logger:
+    """Return a logger for `subsystem` writing to `console`."""
+    return Logger(subsystem, console)
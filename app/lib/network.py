@@ -1,13 +1,21 @@
+import asyncio
 import re
 import requests
 from . import cache
+from .deadline import timeout_for
+from .log import get_logger
+from .tracing import traced
 import hashlib
 
-DEBUG = False
+log = get_logger("network")
 DEFAULT_UA = "Mozilla/5.0 (X11; Linux x86_64; rv:145.0) Gecko/20100101 Firefox/145.0"
 
 
+@traced("render_js")
 def fetchHtmlWithJs(url, timeout=12, headers=None):
+    # Never wait past the current request's deadline
+    timeout = timeout_for(timeout)
+
     try:
         from playwright.sync_api import sync_playwright
     except ImportError:
@@ -18,8 +26,7 @@ def fetchHtmlWithJs(url, timeout=12, headers=None):
         )
 
     try:
-        if DEBUG:
-            print(f"[fetchHtmlWithJs] fetching URL with JS: {url}")
+        log.debug("fetchHtmlWithJs: fetching URL with JS: %s", url)
         with sync_playwright() as p:
             # Launch headless (necessary for servers without X11/display)
             # Use stealth measures to avoid bot detection
@@ -64,7 +71,9 @@ def fetchHtmlWithJs(url, timeout=12, headers=None):
             page.goto(url, timeout=timeout * 1000)
 
             try:
-                page.wait_for_load_state("networkidle", timeout=timeout * 1000)
+                page.wait_for_load_state(
+                    "networkidle", timeout=timeout_for(timeout) * 1000
+                )
             except Exception:
                 pass
 
@@ -82,6 +91,7 @@ def _make_cache_key(url, timeout, allow_redirects, headers, text_only, use_js):
     return hashlib.sha256(raw.encode()).hexdigest()
 
 
+@traced("fetch_html")
 def fetchHtml(
     url,
     timeout=12,
@@ -110,69 +120,138 @@ def fetchHtml(
     cache_key = _make_cache_key(
         url, timeout, allow_redirects, headers, text_only, use_js
     )
-    if not bypass_cache:
-        cached = cache.get_cache(cache_key)
-        if cached is not None:
-            print(f"[fetchHtml] cache hit: {url}")
-            return cached
-        else:
-            print(f"[fetchHtml] cache miss: {url}")
-    else:
-        print(f"[fetchHtml] cache bypass requested: {url}")
+    cached = _cached(cache_key, url, bypass_cache)
+    if cached is not None:
+        return cached
+
+    # Never wait past the current request's deadline
+    timeout = timeout_for(timeout)
 
     if use_js:
         content = fetchHtmlWithJs(url, timeout=timeout, headers=headers)
         if isinstance(content, tuple):
             return content  # Error; do not cache
-
-        if text_only:
-            from bs4 import BeautifulSoup
-
-            soup = BeautifulSoup(content, "html.parser")
-            result = soup.get_text(separator="\n", strip=True)
-        else:
-            result = content
-
-        # Cache successful result
-        if DEBUG:
-            print(f"[fetchHtml] cache store: {url}")
-        cache.set_cache(cache_key, result)
-        return result
+        return _store(cache_key, url, content, text_only)
 
     try:
         if headers is None:
             headers = {
                 "User-Agent": DEFAULT_UA,
             }
-        print(f"[fetchHtml] fetching URL: {url}")
+        log.debug("fetchHtml: fetching URL: %s", url)
         resp = requests.get(
             url, timeout=timeout, headers=headers, allow_redirects=allow_redirects
         )
-        if DEBUG:
-            print(f"[fetchHtml] received: `{resp}`")
+        log.debug("fetchHtml: received: `%s`", resp)
         resp.raise_for_status()
+        return _store(cache_key, url, resp.text, text_only)
 
-        if text_only:
-            from bs4 import BeautifulSoup
+    except requests.exceptions.HTTPError as e:
+        return f"[fetchHtml] HTTPError: {e}"
+    except requests.exceptions.Timeout:
+        return _timed_out(url)
+    except Exception:
+        return _failed(url)
 
-            soup = BeautifulSoup(resp.text, "html.parser")
-            result = soup.get_text(separator="\n", strip=True)
-        else:
-            result = resp.text
 
-        cache.set_cache(cache_key, result)
+@traced("fetch_html")
+async def fetchHtmlAsync(
+    url,
+    timeout=12,
+    allow_redirects=True,
+    headers=None,
+    text_only=False,
+    use_js=False,
+    bypass_cache=False,
+) -> str:
+    """Async variant of fetchHtml; same arguments, caching and return values.
 
-        if DEBUG:
-            print(f"[fetchHtml] cache store: {url}")
+    Plain fetches use aiohttp, so waiting on the site doesn't hold a thread.
+    JS rendering has no async path; it runs fetchHtml in a worker thread.
+    """
+    if use_js:
+        # Unwrapped, so the call isn't traced twice
+        return await asyncio.to_thread(
+            fetchHtml.__wrapped__,
+            url,
+            timeout=timeout,
+            allow_redirects=allow_redirects,
+            headers=headers,
+            text_only=text_only,
+            use_js=True,
+            bypass_cache=bypass_cache,
+        )
 
-        return result
+    import aiohttp
 
-    except requests.exceptions.HTTPError as e:
+    cache_key = _make_cache_key(
+        url, timeout, allow_redirects, headers, text_only, use_js
+    )
+    cached = _cached(cache_key, url, bypass_cache)
+    if cached is not None:
+        return cached
+
+    # Never wait past the current request's deadline
+    timeout = timeout_for(timeout)
+
+    try:
+        if headers is None:
+            headers = {
+                "User-Agent": DEFAULT_UA,
+            }
+        log.debug("fetchHtmlAsync: fetching URL: %s", url)
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as session:
+            async with session.get(
+                url, headers=headers, allow_redirects=allow_redirects
+            ) as resp:
+                resp.raise_for_status()
+                text = await resp.text()
+        return _store(cache_key, url, text, text_only)
+
+    except aiohttp.ClientResponseError as e:
         return f"[fetchHtml] HTTPError: {e}"
-    except requests.exceptions.Timeout:
-        return f"[fetchHtml] Timed out while trying to fetch ({url}). Sites can be fussy; try again in a minute."
+    except asyncio.TimeoutError:
+        return _timed_out(url)
     except Exception:
-        return f"[fetchHtml] An error occurred while trying to fetch ({url})."
+        return _failed(url)
+
+
+def _cached(cache_key, url, bypass_cache):
+    """A cached fetch result, or None to fetch."""
+    if bypass_cache:
+        log.debug("fetchHtml: cache bypass requested: %s", url)
+        return None
+    cached = cache.get_cache(cache_key)
+    if cached is not None:
+        log.debug("fetchHtml: cache hit: %s", url)
+    else:
+        log.debug("fetchHtml: cache miss: %s", url)
+    return cached
+
+
+def _store(cache_key, url, content, text_only):
+    """Extract the visible text if asked, cache the result and return it."""
+    if text_only:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(content, "html.parser")
+        result = soup.get_text(separator="\n", strip=True)
+    else:
+        result = content
+
+    log.debug("fetchHtml: cache store: %s", url)
+    cache.set_cache(cache_key, result)
+    return result
+
+
+def _timed_out(url):
+    return f"[fetchHtml] Timed out while trying to fetch ({url}). Sites can be fussy; try again in a minute."
+
+
+def _failed(url):
+    return f"[fetchHtml] An error occurred while trying to fetch ({url})."
 
 
 def depipeText(string: str) -> str:
@@ -0,0 +1,96 @@
+"""Token-bucket rate limiting.
+
+A bucket holds up to `burst` tokens and refills at `rate` tokens per
+second. Each allowed request takes one token; an empty bucket means the
+caller should back off. Buckets are thread-safe.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable
+
+# Drop idle (full) buckets once a limiter tracks more than this many keys
+MAX_TRACKED_KEYS = 1000
+
+
+class TokenBucket:
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity (maximum tokens)
+            clock: Monotonic time source (seconds)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` if available; return False without waiting otherwise."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def is_full(self) -> bool:
+        """True if the bucket has refilled to capacity."""
+        with self._lock:
+            self._refill()
+            return self._tokens >= self.burst
+
+
+class RateLimiter:
+    """A lazily-populated set of identical token buckets, one per key."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict | None, **kwargs) -> "RateLimiter | None":
+        """Build a limiter from a {rate, burst} dict; None if not configured."""
+        if not config or "rate" not in config:
+            return None
+        rate = float(config["rate"])
+        burst = float(config.get("burst", max(1.0, rate)))
+        return cls(rate=rate, burst=burst, **kwargs)
+
+    def allow(self, key: Hashable) -> bool:
+        """Take a token from `key`'s bucket; False if it is empty."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= MAX_TRACKED_KEYS:
+                    self._prune()
+                bucket = TokenBucket(self.rate, self.burst, clock=self.clock)
+                self._buckets[key] = bucket
+        return bucket.try_acquire()
+
+    def _prune(self) -> None:
+        """Forget buckets that have refilled; caller must hold the lock."""
+        for key in [k for k, b in self._buckets.items() if b.is_full()]:
+            del self._buckets[key]
@@ -0,0 +1,152 @@
+"""In-flight call coalescing ("singleflight").
+
+Concurrent calls made with the same key share a single execution: the
+first caller runs the function and every caller that arrives while it is
+still running waits for, and receives, the same result (or exception).
+Nothing is cached; once the call finishes the key is forgotten.
+
+Callers that join wait within their own request's deadline. If the call
+they joined was aborted (its request was cancelled or ran out of time),
+they don't inherit that: they start over, joining a newer call or
+running `fn` themselves. Thread-safe. `do_async` is the coroutine equivalent for callers on a
+single event loop.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from app.lib.deadline import RequestAborted, timeout_for
+
+# How often callers waiting on another's call check their own deadline
+POLL_INTERVAL = 0.1
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `fn`, or join an identical call that's already running.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Zero-argument callable to execute
+
+        Returns:
+            Tuple of (result, shared); shared is True if this caller
+            received another caller's result
+
+        Raises:
+            RequestAborted: If this caller's own request should stop
+                while it waits on another's call
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    call.waiters += 1
+                    leader = False
+                else:
+                    call = _Call()
+                    self._calls[key] = call
+                    leader = True
+
+            if leader:
+                break
+            try:
+                # timeout_for raises once our own request should stop
+                while not call.done.wait(timeout_for(POLL_INTERVAL)):
+                    pass
+            finally:
+                with self._lock:
+                    call.waiters -= 1
+            if isinstance(call.error, RequestAborted):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    async def do_async(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Await `fn()`, or join an identical call that's already running.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Zero-argument coroutine function to execute
+
+        Returns:
+            Tuple of (result, shared), as for `do`
+        """
+        while True:
+            with self._lock:
+                future = self._async_calls.get(key)
+                leader = future is None
+                if leader:
+                    future = asyncio.get_running_loop().create_future()
+                    # Don't warn about an unretrieved error if nobody joined
+                    future.add_done_callback(
+                        lambda f: f.cancelled() or f.exception()
+                    )
+                    self._async_calls[key] = future
+
+            if leader:
+                break
+            # asyncio.wait leaves the leader's future alone if we're cancelled
+            while not future.done():
+                await asyncio.wait({future}, timeout=timeout_for(POLL_INTERVAL))
+            if future.cancelled() or isinstance(future.exception(), RequestAborted):
+                continue
+            return future.result(), True
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+        return result, False
+
+    def waiting(self, key: Hashable) -> int:
+        """Number of callers of `do` waiting on the in-flight call for `key`."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently executing."""
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
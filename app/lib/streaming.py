@@ -0,0 +1,104 @@
+"""Progressive delivery of a reply while the LLM is still writing it.
+
+A frontend that can edit a message it already posted (Slack's
+`chat.update`) hands out a ReplyStream for a request. The text callback
+opens `stream_scope(stream)` around inference, and the backend, when
+streaming is enabled, reports the text generated so far with
+`stream.update(text)`. Updates are sent from the stream's own thread at
+most every `interval` seconds, always with the latest text, so neither
+token rate nor a slow chat API holds up generation. The final reply goes
+through the normal egest path, which closes the stream and replaces the
+partial message. Like tracing, the active stream lives in a ContextVar,
+so it follows asyncio tasks and `asyncio.to_thread` calls.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+DEFAULT_INTERVAL = 1.0
+
+_active: ContextVar[Optional["ReplyStream"]] = ContextVar(
+    "ircawp_reply_stream", default=None
+)
+
+
+class ReplyStream:
+    """Throttled partial-text updates for one reply. Thread-safe."""
+
+    def __init__(
+        self,
+        send: Callable[[str], None],
+        interval: float = DEFAULT_INTERVAL,
+        console=None,
+    ):
+        """
+        Args:
+            send: Shows the partial text to the user (first call posts, later calls edit)
+            interval: Shortest time between two sends, in seconds
+            console: Rich console for logging failed sends
+        """
+        self.send = send
+        self.interval = float(interval)
+        self.console = console
+        self.sent = 0
+        self._pending: Optional[str] = None
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._cond = threading.Condition()
+
+    def update(self, text: str) -> None:
+        """Replace the partial text; sent soon, never blocks."""
+        with self._cond:
+            if self._closed or not text:
+                return
+            self._pending = text
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="reply-stream", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop sending; waits for a send in progress so it can't land after the final reply."""
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                if self._closed:
+                    return
+                text, self._pending = self._pending, None
+            try:
+                self.send(text)
+                self.sent += 1
+            except Exception as e:
+                # A lost partial update is harmless; the final reply replaces it
+                if self.console is not None:
+                    self.console.log(f"[yellow]Partial reply update failed: {e}")
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed, timeout=self.interval)
+
+
+@contextmanager
+def stream_scope(stream: Optional[ReplyStream]) -> Iterator[None]:
+    """Make `stream` receive partial text within this block (None disables streaming)."""
+    token = _active.set(stream)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def current_stream() -> Optional[ReplyStream]:
+    """Return the reply stream for the request being processed, or None."""
+    return _active.get()
@@ -0,0 +1,196 @@
+"""Lightweight per-request latency tracing.
+
+The router opens a Trace for every queue item. Code anywhere below it in
+the call stack (backend, tools, fetches, media-server, frontend) wraps
+slow steps in `span(name)`, which records monotonic start/end times on the
+active trace. Outside a traced request `span` does nothing. Like
+checkpoints, the active trace lives in a ContextVar, so it follows asyncio
+tasks and `asyncio.to_thread` calls.
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_active: ContextVar[Optional["Trace"]] = ContextVar("ircawp_trace", default=None)
+# index of the enclosing span within the active trace, if any
+_parent: ContextVar[Optional[int]] = ContextVar("ircawp_trace_parent", default=None)
+
+
+class Trace:
+    """Spans recorded while processing one request."""
+
+    def __init__(self, trace_id: Optional[str] = None, **attrs: Any):
+        """
+        Start a trace now.
+
+        Args:
+            trace_id: Identifier for the trace (random if omitted)
+            **attrs: Extra fields exported with the trace (user, request id, ...)
+        """
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.start = time.monotonic()
+        self.wall_start = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        parent: Optional[int] = None,
+        **attrs: Any,
+    ) -> int:
+        """Record a finished span (monotonic times); returns its index."""
+        with self._lock:
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": start,
+                    "end": end,
+                    "parent": parent,
+                    "attrs": attrs,
+                }
+            )
+            return len(self.spans) - 1
+
+    def elapsed(self) -> float:
+        """Seconds since the trace started."""
+        return time.monotonic() - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the trace as JSON-serializable data; times are relative to its start."""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.wall_start,
+            "duration": round(self.elapsed(), 6),
+            **self.attrs,
+            "spans": [
+                {
+                    "name": s["name"],
+                    "start": round(s["start"] - self.start, 6),
+                    "duration": round(s["end"] - s["start"], 6),
+                    "parent": s["parent"],
+                    **({"attrs": s["attrs"]} if s["attrs"] else {}),
+                }
+                for s in spans
+            ],
+        }
+
+    def summary(self) -> Dict[str, tuple]:
+        """Return {span name: (count, total seconds)}, in first-seen order.
+
+        Nested spans are included, so totals overlap their parents'.
+        """
+        totals: Dict[str, tuple] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            count, total = totals.get(s["name"], (0, 0.0))
+            totals[s["name"]] = (count + 1, total + s["end"] - s["start"])
+        return totals
+
+
+@contextmanager
+def trace_scope(trace: Optional[Trace]) -> Iterator[None]:
+    """Make spans within this block belong to `trace` (None disables tracing)."""
+    token = _active.set(trace)
+    parent_token = _parent.set(None)
+    try:
+        yield
+    finally:
+        _parent.reset(parent_token)
+        _active.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    """Return the trace for the request being processed, or None."""
+    return _active.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time the enclosed block as a span of the active trace.
+
+    Yields a dict the block may add attributes to (e.g. whether a cache hit).
+    Spans are recorded even if the block raises.
+    """
+    trace = _active.get()
+    if trace is None:
+        yield attrs
+        return
+
+    # Reserve our index up front so nested spans can point at it
+    start = time.monotonic()
+    index = trace.add_span(name, start, start, parent=_parent.get())
+    token = _parent.set(index)
+    try:
+        yield attrs
+    finally:
+        _parent.reset(token)
+        with trace._lock:
+            trace.spans[index]["end"] = time.monotonic()
+            trace.spans[index]["attrs"] = attrs
+
+
+def traced(name: str) -> Callable:
+    """Decorator: run each call of the function (sync or async) inside `span(name)`."""
+
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def format_timing_footer(trace: Trace) -> str:
+    """Render a short per-stage timing footer for a response."""
+    parts = []
+    for name, (count, total) in trace.summary().items():
+        times = f"{count}x " if count > 1 else ""
+        parts.append(f"{name} {times}{total:.2f}s")
+    parts.append(f"total {trace.elapsed():.2f}s")
+    return f"`[Timing: {', '.join(parts)}]`"
+
+
+class TraceLog:
+    """Appends finished traces to a file as JSON lines. Thread-safe."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: File to append to (created if missing)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, trace: Trace) -> None:
+        """Append one trace as a single JSON line."""
+        line = json.dumps(trace.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
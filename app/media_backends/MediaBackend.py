@@ -6,27 +6,41 @@ Maintains the same execute() signature so all plugin call-sites remain unchanged
 Uses the OpenAI-compatible JSON API (POST /images/generations, POST /images/edits).
 """
 
+import asyncio
 import base64
+import json
 import tempfile
 from pathlib import Path
 
 import requests
 import urllib3
 
+from app.lib.deadline import check_deadline, timeout_for
+from app.lib.tracing import traced
+
 
 class MediaBackend:
     """HTTP client wrapper for the media-server image generation API."""
 
-    def __init__(self, server_url: str, backend_id: str = "flux2klein"):
+    def __init__(
+        self,
+        server_url: str,
+        backend_id: str = "flux2klein",
+        timeout: float | None = None,
+    ):
         """
         Args:
             server_url: Base URL of the media-server (e.g. "http://localhost:8100")
             backend_id: Default backend to use (e.g. "flux2klein")
+            timeout: Seconds before a request gives up (None waits
+                indefinitely); also capped by the request's deadline
         """
         self.server_url = server_url.rstrip("/")
         self.backend_id = backend_id
+        self.timeout = timeout
         self.last_imagegen_prompt = None
 
+    @traced("media.generate")
     def execute(
         self,
         prompt: str,
@@ -47,6 +61,74 @@ class MediaBackend:
         Returns:
             tuple[str, str]: (local_image_path, final_prompt)
         """
+        url, body = self._build_request(prompt, config, media)
+
+        try:
+            # Disable SSL verification for self-signed / private CA certs.
+            # Safe for private/home setups; for production, trust the CA instead.
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            response = requests.post(
+                url, json=body, verify=False, timeout=timeout_for(self.timeout)
+            )
+            response.raise_for_status()
+            return self._save_result(response.json(), prompt, batch_id)
+
+        except requests.exceptions.HTTPError as e:
+            # Surface the actual server error response
+            try:
+                error_detail = response.json().get("detail", str(e))
+            except Exception:
+                error_detail = (
+                    response.text[:200] if hasattr(response, "text") else str(e)
+                )
+            raise RuntimeError(
+                f"Media server error ({response.status_code}): {error_detail}"
+            ) from e
+        except requests.exceptions.Timeout as e:
+            # Report a spent request budget as such, not as a server error
+            check_deadline()
+            raise RuntimeError(f"Media server request timed out: {e}") from e
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Media server request failed: {e}") from e
+
+    @traced("media.generate")
+    async def executeAsync(
+        self,
+        prompt: str,
+        config: dict = {},
+        batch_id=None,
+        media=[],
+        backend=None,
+    ) -> tuple[str, str]:
+        """Async variant of execute(); same arguments and return value."""
+        import aiohttp
+
+        url, body = self._build_request(prompt, config, media)
+
+        timeout = aiohttp.ClientTimeout(total=timeout_for(self.timeout))
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(url, json=body, ssl=False) as response:
+                    if response.status >= 400:
+                        text = await response.text()
+                        try:
+                            error_detail = json.loads(text).get("detail", text[:200])
+                        except Exception:
+                            error_detail = text[:200]
+                        raise RuntimeError(
+                            f"Media server error ({response.status}): {error_detail}"
+                        )
+                    result = await response.json()
+        except asyncio.TimeoutError as e:
+            check_deadline()
+            raise RuntimeError(f"Media server request timed out: {e}") from e
+        except aiohttp.ClientError as e:
+            raise RuntimeError(f"Media server request failed: {e}") from e
+
+        return self._save_result(result, prompt, batch_id)
+
+    def _build_request(self, prompt: str, config: dict, media: list) -> tuple[str, dict]:
+        """Return the (url, json body) for a generation or edit request."""
         has_media = len(media) > 0
 
         # Build JSON body
@@ -113,54 +195,36 @@ class MediaBackend:
         else:
             url = f"{self.server_url}/images/generations"
 
-        try:
-            # Disable SSL verification for self-signed / private CA certs.
-            # Safe for private/home setups; for production, trust the CA instead.
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            response = requests.post(url, json=body, verify=False)
-            response.raise_for_status()
-            result = response.json()
-
-            # Extract the first image from the response
-            data = result.get("data", [])
-            if not data:
-                raise ValueError("No image data in response")
+        return url, body
 
-            image_b64 = data[0].get("b64_json", "")
-            image_bytes = base64.b64decode(image_b64)
+    def _save_result(self, result: dict, prompt: str, batch_id) -> tuple[str, str]:
+        """Write the first returned image to a temp file; return (path, final_prompt)."""
+        # Extract the first image from the response
+        data = result.get("data", [])
+        if not data:
+            raise ValueError("No image data in response")
 
-            # Determine extension from content (default to png)
-            ext = ".png"
+        image_b64 = data[0].get("b64_json", "")
+        image_bytes = base64.b64decode(image_b64)
 
-            # Write to temp file
-            if batch_id is not None:
-                local_path = tempfile.NamedTemporaryFile(
-                    suffix=f".{batch_id}{ext}", delete=False, dir="/tmp"
-                ).name
-            else:
-                local_path = tempfile.NamedTemporaryFile(
-                    suffix=ext, delete=False, dir="/tmp"
-                ).name
+        # Determine extension from content (default to png)
+        ext = ".png"
 
-            with open(local_path, "wb") as f:
-                f.write(image_bytes)
+        # Write to temp file
+        if batch_id is not None:
+            local_path = tempfile.NamedTemporaryFile(
+                suffix=f".{batch_id}{ext}", delete=False, dir="/tmp"
+            ).name
+        else:
+            local_path = tempfile.NamedTemporaryFile(
+                suffix=ext, delete=False, dir="/tmp"
+            ).name
 
-            # Get final prompt from revised_prompt if available
-            final_prompt = data[0].get("revised_prompt", prompt)
-            self.last_imagegen_prompt = final_prompt
+        with open(local_path, "wb") as f:
+            f.write(image_bytes)
 
-            return local_path, final_prompt
+        # Get final prompt from revised_prompt if available
+        final_prompt = data[0].get("revised_prompt", prompt)
+        self.last_imagegen_prompt = final_prompt
 
-        except requests.exceptions.HTTPError as e:
-            # Surface the actual server error response
-            try:
-                error_detail = response.json().get("detail", str(e))
-            except Exception:
-                error_detail = (
-                    response.text[:200] if hasattr(response, "text") else str(e)
-                )
-            raise RuntimeError(
-                f"Media server error ({response.status_code}): {error_detail}"
-            ) from e
-        except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"Media server request failed: {e}") from e
+        return local_path, final_prompt
@@ -66,4 +66,5 @@ plugin = PluginBase(
     main=eightball,
     use_imagegen=False,
     prompt_required=False,
+    lane="instant",
 )
@@ -1,5 +1,8 @@
+import asyncio
+import inspect
 from typing import Optional
 from app.backends.Ircawp_Backend import Ircawp_Backend
+from app.lib.deadline import RequestAborted
 from app.media_backends.MediaBackend import MediaBackend
 
 
@@ -17,6 +20,9 @@ class PluginBase:
         prompt_required: bool = True,
         media_required: bool = False,
         use_imagegen: bool = False,
+        lane: str = "llm",
+        coalesce: bool = False,
+        deadline: float | None = None,
         backend: Ircawp_Backend | None = None,
         media_backend: MediaBackend | None = None,
         init=None,
@@ -31,6 +37,13 @@ class PluginBase:
         self.triggers = triggers
         self.group = group
         self.use_imagegen = use_imagegen
+        # Router execution lane: "instant" (no LLM), "llm", or "heavy" (media jobs)
+        self.lane = lane
+        # Let identical concurrent calls share one execution; only for
+        # output that doesn't depend on who asked
+        self.coalesce = coalesce
+        # Seconds a request may run; None uses the lane's deadline
+        self.deadline = deadline
         self.prompt_required = prompt_required
         self.media_required = media_required
         self.backend: Ircawp_Backend = backend
@@ -43,6 +56,26 @@ class PluginBase:
     def setMain(self, main):
         self.main = main
 
+    def is_async(self) -> bool:
+        """True if `main` is an `async def` function."""
+        return inspect.iscoroutinefunction(self.main)
+
+    def _check_input(self, query: str, media: list):
+        if self.media_required and not media:
+            return "Media required for this plugin.", "", True, {}
+
+        if not query.strip() and self.prompt_required:
+            return self.msg_empty_query, "", True, {}
+
+        return None
+
+    def _wrap_result(self, result) -> tuple[str, str | dict, bool, dict]:
+        response, outgoing_media, skip_imagegen, meta = result
+        media_return = ""
+        if outgoing_media and isinstance(outgoing_media, str):
+            media_return = outgoing_media
+        return (response, media_return, skip_imagegen, meta)
+
     def execute(
         self,
         query: str,
@@ -51,21 +84,44 @@ class PluginBase:
         media_backend: MediaBackend | None = None,
     ) -> tuple[str, str | dict, bool, dict]:
         backend.console.log("[black on green]= PluginBase execute: ", query, media)
-        if self.media_required and not media:
-            return "Media required for this plugin.", "", True, {}
+        rejected = self._check_input(query, media)
+        if rejected:
+            return rejected
 
-        if not query.strip() and self.prompt_required:
-            return self.msg_empty_query, "", True, {}
         try:
-            media_return = ""
-
-            response, outgoing_media, skip_imagegen, meta = self.main(
-                query, media, backend, media_backend
-            )
+            if self.is_async():
+                # Called from a worker thread with no event loop of its own
+                result = asyncio.run(self.main(query, media, backend, media_backend))
+            else:
+                result = self.main(query, media, backend, media_backend)
+            return self._wrap_result(result)
+        except RequestAborted:
+            raise
+        except Exception as e:
+            return (f"{self.msg_exception_prefix}: {e}", "", True, {})
 
-            if outgoing_media and isinstance(outgoing_media, str):
-                media_return = outgoing_media
+    async def executeAsync(
+        self,
+        query: str,
+        media: list,
+        backend: Ircawp_Backend,
+        media_backend: MediaBackend | None = None,
+    ) -> tuple[str, str | dict, bool, dict]:
+        """Async variant of execute(); synchronous mains run in a worker thread."""
+        backend.console.log("[black on green]= PluginBase executeAsync: ", query, media)
+        rejected = self._check_input(query, media)
+        if rejected:
+            return rejected
 
-            return (response, media_return, skip_imagegen, meta)
+        try:
+            if self.is_async():
+                result = await self.main(query, media, backend, media_backend)
+            else:
+                result = await asyncio.to_thread(
+                    self.main, query, media, backend, media_backend
+                )
+            return self._wrap_result(result)
+        except RequestAborted:
+            raise
         except Exception as e:
             return (f"{self.msg_exception_prefix}: {e}", "", True, {})
@@ -1,5 +1,7 @@
 from typing import Optional
 from app.backends.Ircawp_Backend import Ircawp_Backend
+from app.lib.deadline import RequestAborted
+from app.lib.flow import Flow, run_flow, run_flow_async
 from app.media_backends.MediaBackend import MediaBackend
 
 
@@ -15,6 +17,8 @@ class PluginCharacter:
         msg_empty_query: str = "No question provided",
         msg_exception_prefix: Optional[str] = "GENERIC PROBLEMS",
         imagegen_template: str = "{}",
+        lane: str = "heavy",
+        deadline: float | None = None,
     ):
         self.system_prompt = system_prompt
         self.emoji_prefix = emoji_prefix
@@ -25,6 +29,10 @@ class PluginCharacter:
         self.triggers = triggers
         self.group = group
         self.imagegen_template = imagegen_template
+        # Characters also render an image when imagegen is configured
+        self.lane = lane
+        # Seconds a request may run; None uses the lane's deadline
+        self.deadline = deadline
 
     def execute(
         self,
@@ -36,30 +44,67 @@ class PluginCharacter:
         print(
             "STEALTH: PluginCharacter execute: ", query, media, backend, media_backend
         )
+
+        def perform(step):
+            kind, kwargs = step
+            if kind == "inference":
+                return backend.runInference(**kwargs)
+            return media_backend.execute(backend=backend, **kwargs)
+
+        return run_flow(self._flow(query, media, bool(media_backend)), perform)
+
+    async def executeAsync(
+        self,
+        query: str,
+        media: list,
+        backend: Ircawp_Backend,
+        media_backend: MediaBackend | None = None,
+    ) -> tuple[str, str | dict]:
+        """Async variant of execute()."""
+
+        async def perform(step):
+            kind, kwargs = step
+            if kind == "inference":
+                return await backend.runInferenceAsync(**kwargs)
+            return await media_backend.executeAsync(backend=backend, **kwargs)
+
+        return await run_flow_async(
+            self._flow(query, media, bool(media_backend)), perform
+        )
+
+    def _flow(self, query: str, media: list, with_image: bool) -> Flow:
+        """The character's reply as a flow (see app.lib.flow)."""
         image_url = []
         if not query.strip() and not media:
             return self.msg_empty_query, "", True, {}
         try:
-            inf_response, _ = backend.runInference(
-                prompt=query,
-                system_prompt=self.system_prompt.strip(),
-                use_tools=False,
-                media=media,
-                temperature=0.8,
+            inf_response, _ = yield (
+                "inference",
+                dict(
+                    prompt=query,
+                    system_prompt=self.system_prompt.strip(),
+                    use_tools=False,
+                    media=media,
+                    temperature=0.8,
+                ),
             )
 
-            if media_backend:
+            if with_image:
                 # if we have a template, it looks like this: "prompt prompt {} prompt"
                 imagen_prompt = self.imagegen_template.format(inf_response)
 
-                image_url, _ = media_backend.execute(
-                    imagen_prompt,
-                    backend=backend,
-                    config={
-                        "skip_refinement": True,
-                    },
+                image_url, _ = yield (
+                    "imagegen",
+                    dict(
+                        prompt=imagen_prompt,
+                        config={
+                            "skip_refinement": True,
+                        },
+                    ),
                 )
 
             return self.emoji_prefix + " " + inf_response, image_url, True, {}
+        except RequestAborted:
+            raise
         except Exception as e:
             return f"{self.msg_exception_prefix}: " + str(e), "", True, {}
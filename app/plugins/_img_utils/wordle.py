@@ -60,6 +60,7 @@ Rules:
         use_tools=False,
         format=WordleWordsResponse,
         temperature=0.1,
+        purpose="wordle_extract",
     )
 
     # print(response)
@@ -121,6 +122,7 @@ Analyze the composite image, which contains four distinct scenes. For each scene
             use_tools=False,
             format=WordleAlleyCountResponse,
             temperature=0.1,
+            purpose="wordle_extract",
         )
         alley_data = WordleAlleyCountResponse.model_validate_json(alley_response)
         alley_count = alley_data.alley_count
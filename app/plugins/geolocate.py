@@ -39,6 +39,7 @@ def geolocate(
     inf_response = backend.runInference(
         system_prompt="Provide a condensed summary of this LLM analysis. Provide just the conclusion and basic reasoning.",
         prompt=inf_response,
+        purpose="geolocate_summary",
     )
 
     return (inf_response, "", DISABLE_IMAGEGEN, {})
@@ -53,4 +53,5 @@ plugin = PluginBase(
     use_imagegen=False,
     group="system",
     prompt_required=False,
+    lane="instant",
 )
@@ -47,4 +47,6 @@ plugin = PluginBase(
     main=hn,
     use_imagegen=False,
     prompt_required=False,
+    lane="instant",
+    coalesce=True,
 )
@@ -201,4 +201,5 @@ plugin = PluginBase(
     msg_exception_prefix="ARTISTIC PROBLEMS",
     main=img,
     use_imagegen=False,
+    lane="heavy",
 )
@@ -199,4 +199,5 @@ plugin = PluginBase(
     main=news,
     use_imagegen=False,
     prompt_required=False,
+    coalesce=True,
 )
@@ -117,4 +117,5 @@ plugin = PluginBase(
     main=summarize,
     use_imagegen=True,
     prompt_required=True,
+    coalesce=True,
 )
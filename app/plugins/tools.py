@@ -78,4 +78,5 @@ plugin = PluginBase(
     main=tools,
     use_imagegen=False,
     prompt_required=False,
+    lane="instant",
 )
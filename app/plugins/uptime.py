@@ -49,4 +49,5 @@ plugin = PluginBase(
     main=uptime,
     use_imagegen=False,
     prompt_required=False,
+    lane="instant",
 )
@@ -394,4 +394,5 @@ plugin = PluginBase(
     msg_exception_prefix="WTTR PROBLEMS",
     main=doWeather,
     use_imagegen=False,
+    coalesce=True,
 )
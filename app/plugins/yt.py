@@ -20,6 +20,7 @@ from app.lib.youtube import (
 )
 from app.lib.transcription import get_transcription_backend
 from app.lib.cache import get_cache, set_cache
+from app.lib.checkpoint import load_checkpoint, save_checkpoint
 from app.lib.args import parse_arguments, help_arguments
 from app.lib.network import depipeText
 from .__PluginBase import PluginBase
@@ -207,8 +208,10 @@ def yt(
     transcript_cache_key = _get_cache_key(video_id, "transcript")
     audio_cache_key = _get_cache_key(video_id, "audio")
 
-    # Check if transcript is already cached
-    cached_data = get_cache(transcript_cache_key)
+    # Check if transcript is already cached (or was checkpointed before a restart)
+    cached_data = get_cache(transcript_cache_key) or load_checkpoint(
+        transcript_cache_key
+    )
     if cached_data:
         backend.console.log(f"[green]Using cached transcript for video {video_id}")
         transcript = cached_data["transcript"]
@@ -393,6 +396,7 @@ def yt(
         # Cache the transcript
         cache_data = {"transcript": transcript, "metadata": metadata}
         set_cache(transcript_cache_key, cache_data, ttl=cfg["cache_ttl_seconds"])
+        save_checkpoint(transcript_cache_key, cache_data)
         backend.console.log("[green]Transcript cached")
 
         # Format metadata for display
@@ -478,4 +482,6 @@ plugin = PluginBase(
     prompt_required=True,
     media_required=False,
     msg_empty_query="Please provide a YouTube URL to transcribe",
+    lane="heavy",
+    coalesce=True,
 )
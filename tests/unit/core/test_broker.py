@@ -0,0 +1,205 @@
+import time
+
+import pytest
+
+from app.core.broker import SqliteBroker, decode_files, encode_files
+from app.core.message_router import MSG_CANCELLED, MessageRouter
+from app.core.plugin_manager import PluginManager
+from app.core.media_manager import MediaManager
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "broker.db")
+
+
+class TestSqliteBroker:
+    def test_jobs_claimed_once_in_order(self, db):
+        broker = SqliteBroker(db)
+        first = broker.put_job({"n": 1})
+        second = broker.put_job({"n": 2})
+
+        assert broker.pending() == 2
+        assert broker.claim_job("w1") == (first, {"n": 1}, None)
+        assert broker.claim_job("w2") == (second, {"n": 2}, None)
+        assert broker.claim_job("w1") is None
+
+    def test_conversation_sticks_to_its_worker(self, db):
+        broker = SqliteBroker(db)
+        broker.put_job({"n": 1}, conversation=("C1", None))
+        broker.put_job({"n": 2}, conversation=("C1", None))
+        broker.put_job({"n": 3}, conversation=("C2", None))
+
+        job_id, _, conversation = broker.claim_job("w1")
+        assert conversation == ("C1", None)
+        broker.put_result(job_id, {"message": "done"})
+
+        # w2 skips C1 (it belongs to w1 now) and gets C2
+        assert broker.claim_job("w2")[1] == {"n": 3}
+        assert broker.claim_job("w1")[1] == {"n": 2}
+
+    def test_dead_workers_jobs_are_requeued_then_failed(self, db):
+        broker = SqliteBroker(db, lease=0.05, max_attempts=2)
+        job_id = broker.put_job({"n": 1}, conversation=("C1", None))
+        broker.claim_job("w1")
+
+        time.sleep(0.1)
+        assert broker.claim_job("w2")[0] == job_id
+
+        time.sleep(0.1)
+        assert broker.claim_job("w3") is None
+        (result,) = broker.take_results()
+        assert result.job_id == job_id
+        assert result.payload == {"failed": True}
+
+    def test_results_round_trip(self, db):
+        broker = SqliteBroker(db)
+        job_id = broker.put_job({"n": 1}, reply_to={"channel": "C1"})
+        broker.claim_job("w1")
+        broker.put_result(job_id, {"message": "hi"})
+
+        (result,) = broker.take_results()
+        assert (result.job_id, result.payload, result.reply_to, result.final) == (
+            job_id,
+            {"message": "hi"},
+            {"channel": "C1"},
+            True,
+        )
+        broker.ack_result(result.result_id)
+        assert broker.take_results() == []
+
+    def test_cancel_drops_queued_and_flags_running(self, db):
+        broker = SqliteBroker(db)
+        broker.put_job({"n": 1}, owner="u1")
+        broker.put_job({"n": 2}, owner="u1")
+        broker.put_job({"n": 3}, owner="u2")
+        broker.claim_job("w1")
+
+        assert broker.cancel("u1") == 2
+        assert broker.pending() == 1
+        assert broker.take_cancellations("w1") == ["u1"]
+        assert broker.take_cancellations("w1") == []
+
+    def test_files_round_trip(self, tmp_path):
+        source = tmp_path / "in.png"
+        source.write_bytes(b"\x89PNG data")
+        out_dir = tmp_path / "out"
+        out_dir.mkdir()
+
+        packed = encode_files([str(source), None])
+        (path, missing) = decode_files(packed, str(out_dir))
+
+        assert missing is None
+        assert path.endswith("_in.png")
+        assert open(path, "rb").read() == b"\x89PNG data"
+
+
+# Ingest and worker routers ------------------------------------------
+
+
+def make_role_router(
+    mock_console, mock_backend, db, role, process_text, egest, **config
+):
+    plugin_mgr = PluginManager(console=mock_console, backend=mock_backend, debug=False)
+    plugin_mgr.plugins = {}
+    return MessageRouter(
+        console=mock_console,
+        process_text_callback=process_text,
+        plugin_manager=plugin_mgr,
+        media_manager=MediaManager(console=mock_console, media_dir="/tmp"),
+        egest_callback=egest,
+        config={
+            "distributed": {"role": role, "path": db, "poll_interval": 0.01},
+            **config,
+        },
+        debug=False,
+    )
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestDistributedRouters:
+    def test_worker_runs_job_and_ingest_delivers_reply(
+        self, mock_console, mock_backend, db
+    ):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            return f"re: {message} from {user_id}", []
+
+        ingest = make_role_router(
+            mock_console,
+            mock_backend,
+            db,
+            "ingest",
+            None,
+            lambda message, media, aux: responses.append((message, aux)),
+        )
+        worker = make_role_router(
+            mock_console, mock_backend, db, "worker", process_text, None
+        )
+        ingest.start()
+        worker.start()
+
+        aux = ("U1", "C1", None, {}, None, None)
+        ingest.ingest("hello", "user1", aux=aux)
+        assert wait_for(lambda: responses)
+
+        worker.stop(timeout=5)
+        ingest.stop(timeout=5)
+
+        assert responses == [("re: hello from user1", aux)]
+        # The turn is remembered on the worker, keyed as on the ingest side
+        assert (
+            worker.conversations.last_assistant_message(("C1", None, "user1"))
+            == "re: hello from user1"
+        )
+
+    def test_cancel_on_ingest_reaches_queued_jobs(
+        self, mock_console, mock_backend, db
+    ):
+        responses = []
+        ingest = make_role_router(
+            mock_console,
+            mock_backend,
+            db,
+            "ingest",
+            None,
+            lambda message, media, aux: responses.append(message),
+        )
+        ingest.start()
+        ingest.ingest("one", "user1", aux="a")
+        ingest.ingest("two", "user1", aux="b")
+        assert ingest.pending() == 2
+
+        ingest.ingest("/cancel", "user1", aux="c")
+        ingest.stop(timeout=5)
+
+        assert ingest.pending() == 0
+        assert responses == [MSG_CANCELLED.format(count=2)]
+
+    def test_worker_ignores_the_durable_queue(
+        self, mock_console, mock_backend, db, tmp_path
+    ):
+        journal = tmp_path / "journal.db"
+        worker = make_role_router(
+            mock_console,
+            mock_backend,
+            db,
+            "worker",
+            None,
+            None,
+            router_durable_queue=str(journal),
+        )
+
+        assert worker.durable is None
+        assert not journal.exists()
@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from app.backends.chat_stream import ChatStreamAssembler, parse_sse_line
+from app.lib.streaming import stream_scope
+
+pytestmark = pytest.mark.unit
+
+
+def sse(delta, finish_reason=None):
+    chunk = {"choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+    return f"data: {json.dumps(chunk)}".encode("utf-8")
+
+
+ANSWER_LINES = [
+    sse({"role": "assistant", "content": ""}),
+    b"",
+    sse({"content": "Hello"}),
+    b": keep-alive",
+    sse({"content": " there"}),
+    sse({}, finish_reason="stop"),
+    b"data: [DONE]",
+]
+
+TOOL_CALL_LINES = [
+    sse(
+        {
+            "tool_calls": [
+                {
+                    "index": 0,
+                    "id": "call_1",
+                    "type": "function",
+                    "function": {"name": "calculator", "arguments": ""},
+                }
+            ]
+        }
+    ),
+    sse({"tool_calls": [{"index": 0, "function": {"arguments": '{"expr'}}]}),
+    sse({"tool_calls": [{"index": 0, "function": {"arguments": '": "2+2"}'}}]}),
+    sse({}, finish_reason="tool_calls"),
+    b"data: [DONE]",
+]
+
+
+def assemble(lines):
+    assembler = ChatStreamAssembler()
+    for line in lines:
+        chunk = parse_sse_line(line)
+        if chunk is not None:
+            assembler.feed(chunk)
+    return assembler.result()
+
+
+class TestChatStreamAssembler:
+    def test_content_deltas_are_joined(self):
+        result = assemble(ANSWER_LINES)
+
+        assert result["choices"][0]["message"] == {
+            "role": "assistant",
+            "content": "Hello there",
+        }
+        assert result["choices"][0]["finish_reason"] == "stop"
+
+    def test_tool_call_deltas_are_joined(self):
+        message = assemble(TOOL_CALL_LINES)["choices"][0]["message"]
+
+        (call,) = message["tool_calls"]
+        assert call["id"] == "call_1"
+        assert call["function"]["name"] == "calculator"
+        assert json.loads(call["function"]["arguments"]) == {"expr": "2+2"}
+
+
+class FakeStream:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, text):
+        self.updates.append(text)
+
+
+@pytest.fixture
+def backend(mock_console):
+    from app.backends.openai import Openai
+
+    cfg = {
+        "openai": {
+            "api_url": "http://localhost",
+            "model": "test-model",
+            "tools_enabled": False,
+            "stream": True,
+        },
+        "llm": {"system_prompt": "Be brief."},
+    }
+    return Openai(console=mock_console, parent=None, config=cfg)
+
+
+def serve_lines(backend, lines, sent):
+    def post(url, headers, payload, attrs=None, on_line=None):
+        sent.append(payload)
+        if on_line is None:
+            return 200, json.dumps(assemble(lines))
+        for line in lines:
+            on_line(line)
+        return 200, ""
+
+    backend.transport.post = post
+
+
+class TestOpenaiStreaming:
+    def test_answer_streams_to_the_reply_stream(self, backend):
+        sent = []
+        serve_lines(backend, ANSWER_LINES, sent)
+        stream = FakeStream()
+
+        with stream_scope(stream):
+            response, _ = backend.runInference(prompt="hi", use_tools=False)
+
+        assert response == "Hello there"
+        assert sent[0]["stream"] is True
+        assert stream.updates == ["Hello", "Hello there"]
+
+    def test_no_streaming_without_a_reply_stream(self, backend):
+        sent = []
+        serve_lines(backend, ANSWER_LINES, sent)
+
+        response, _ = backend.runInference(prompt="hi", use_tools=False)
+
+        assert response == "Hello there"
+        assert "stream" not in sent[0]
+
+    def test_helper_calls_are_not_streamed(self, backend):
+        sent = []
+        serve_lines(backend, ANSWER_LINES, sent)
+
+        with stream_scope(FakeStream()):
+            backend.chat([{"role": "user", "content": "hi"}])
+
+        assert "stream" not in sent[0]
@@ -0,0 +1,110 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.conversation_store import ConversationStore
+
+pytestmark = pytest.mark.unit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def turn(store, key, text, reply=None):
+    store.append_turn(
+        key,
+        {"role": "user", "content": text},
+        {"role": "assistant", "content": reply or text.upper()},
+    )
+
+
+class TestConversationStore:
+    def test_conversations_are_separate(self):
+        store = ConversationStore()
+        turn(store, ("C1", None, "U1"), "hello")
+        turn(store, ("C2", None, "U1"), "other")
+
+        assert [m["content"] for m in store.history(("C1", None, "U1"))] == [
+            "hello",
+            "HELLO",
+        ]
+        assert store.last_assistant_message(("C2", None, "U1")) == "OTHER"
+        assert store.history(("C3", None, "U1")) == []
+        assert store.last_assistant_message(("C3", None, "U1")) is None
+
+    def test_turn_cap(self):
+        store = ConversationStore(max_turns=2)
+        for text in ["one", "two", "three"]:
+            turn(store, "k", text)
+
+        assert [m["content"] for m in store.history("k")] == [
+            "two",
+            "TWO",
+            "three",
+            "THREE",
+        ]
+        assert store.total_bytes == len("twoTWOthreeTHREE")
+
+    def test_idle_expiry(self):
+        clock = FakeClock()
+        store = ConversationStore(idle_ttl=60, clock=clock)
+        turn(store, "old", "a")
+        clock.now = 30
+        turn(store, "new", "b")
+
+        clock.now = 61
+        assert store.history("old") == []
+        assert store.history("new") != []
+        assert len(store) == 1
+
+    def test_lru_eviction_by_size(self):
+        store = ConversationStore(max_bytes=20)
+        turn(store, "a", "aaaa")  # 8 bytes
+        turn(store, "b", "bbbb")
+        store.history("a")  # a is now most recently used
+        turn(store, "c", "cccc")
+
+        assert store.history("b") == []
+        assert store.history("a") != []
+        assert store.history("c") != []
+        assert store.total_bytes == 16
+
+    def test_oversized_history_keeps_latest_turn(self):
+        store = ConversationStore(max_bytes=100)
+        turn(store, "k", "x" * 60)
+        turn(store, "k", "again")
+
+        assert [m["content"] for m in store.history("k")] == ["again", "AGAIN"]
+
+    def test_dropped_messages_release_media(self):
+        media_store = MagicMock()
+        store = ConversationStore(max_turns=1, media_store=media_store)
+        store.append_turn(
+            "k",
+            {"role": "user", "content": "look", "media_hashes": ["abc"]},
+            {"role": "assistant", "content": "nice"},
+        )
+        media_store.release.assert_not_called()
+
+        turn(store, "k", "next")
+        media_store.release.assert_called_once_with("abc")
+
+    def test_clear(self):
+        store = ConversationStore()
+        turn(store, "k", "hi")
+
+        assert store.clear("k") == 2
+        assert store.clear("k") == 0
+        assert store.total_bytes == 0
+
+    def test_from_config(self):
+        store = ConversationStore.from_config(
+            {"conversation_max_turns": 3, "conversation_idle_ttl": 5}
+        )
+        assert store.max_turns == 3
+        assert store.idle_ttl == 5
@@ -1,4 +1,7 @@
 import queue
+import threading
+import time
+
 import pytest
 
 from app.core.message_router import MessageRouter
@@ -124,6 +127,68 @@ def test_plugin_manager_execute(
     assert kwargs["query"] == "hello"
 
 
+def test_plugin_manager_coalesces_identical_calls(
+    clean_plugin_registry, mock_plugin, mock_console, mock_backend
+):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_execute(**kwargs):
+        started.set()
+        release.wait(5)
+        return ("Shared response", "", True, {})
+
+    mock_plugin.coalesce = True
+    mock_plugin.execute.side_effect = slow_execute
+    clean_plugin_registry["test"] = mock_plugin
+    mgr = PluginManager(
+        console=mock_console, backend=mock_backend, imagegen=None, debug=False
+    )
+    mgr.plugins = clean_plugin_registry
+
+    results = []
+
+    def call(message):
+        results.append(mgr.execute_plugin("test", message, "user"))
+
+    leader = threading.Thread(target=call, args=("/test hello   world",))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call, args=("/test hello world",))
+    follower.start()
+    key = mgr._coalesce_key(mock_plugin, "hello world", [])
+    for _ in range(500):
+        if mgr.inflight.waiting(key):
+            break
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == [("Shared response", "", True)] * 2
+    mock_plugin.execute.assert_called_once()
+    assert mgr.coalesced_calls == 1
+
+
+def test_plugin_manager_coalesce_key(mock_plugin, mock_console, mock_backend, tmp_path):
+    mgr = PluginManager(console=mock_console, backend=mock_backend, debug=False)
+    a = tmp_path / "a.png"
+    b = tmp_path / "b.png"
+    a.write_bytes(b"same")
+    b.write_bytes(b"same")
+
+    mock_plugin.coalesce = True
+    assert mgr._coalesce_key(mock_plugin, " x  y ", [str(a)]) == mgr._coalesce_key(
+        mock_plugin, "x y", [str(b)]
+    )
+    assert mgr._coalesce_key(mock_plugin, "x", []) != mgr._coalesce_key(
+        mock_plugin, "x", [str(a)]
+    )
+
+    mock_plugin.coalesce = False
+    assert mgr._coalesce_key(mock_plugin, "x", []) is None
+
+
 def test_plugin_manager_not_found(mock_console, mock_backend):
     mgr = PluginManager(
         console=mock_console, backend=mock_backend, imagegen=None, debug=True
@@ -0,0 +1,45 @@
+import pytest
+
+from app.core.durable_queue import DurableQueue
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+class TestDurableQueue:
+    def test_lifecycle(self, db_path):
+        queue = DurableQueue(db_path)
+        first = queue.enqueue({"message": "one"})
+        second = queue.enqueue({"message": "two"})
+
+        queue.mark_started(first)
+        assert queue.unfinished() == [
+            (first, {"message": "one"}, 1),
+            (second, {"message": "two"}, 0),
+        ]
+
+        queue.mark_finished(first)
+        assert queue.unfinished() == [(second, {"message": "two"}, 0)]
+
+    def test_survives_reopen(self, db_path):
+        queue = DurableQueue(db_path)
+        request_id = queue.enqueue({"message": "pending"})
+        queue.mark_started(request_id)
+        queue.save_checkpoint(request_id, "transcript", {"text": "hello"})
+        queue.close()
+
+        reopened = DurableQueue(db_path)
+        assert reopened.unfinished() == [(request_id, {"message": "pending"}, 1)]
+        assert reopened.load_checkpoint(request_id, "transcript") == {"text": "hello"}
+
+    def test_finish_drops_checkpoints(self, db_path):
+        queue = DurableQueue(db_path)
+        request_id = queue.enqueue({})
+        queue.save_checkpoint(request_id, "step", "value")
+        queue.mark_finished(request_id)
+
+        assert queue.load_checkpoint(request_id, "step") is None
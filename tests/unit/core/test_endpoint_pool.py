@@ -0,0 +1,270 @@
+import asyncio
+import threading
+
+import pytest
+import requests
+
+from app.lib.deadline import RequestCancelled, check_deadline
+
+from app.backends.endpoint_pool import Endpoint, EndpointPool, parse_endpoints
+
+pytestmark = pytest.mark.unit
+
+
+class FakeTransport:
+    """Answers per endpoint URL: a status, an exception, or a callable."""
+
+    def __init__(self, answers=None, healthy=()):
+        self.answers = answers or {}
+        self.healthy = set(healthy)
+        self.calls = []
+
+    def _answer(self, url, retries):
+        self.calls.append((url, retries))
+        answer = self.answers.get(url.split("/v1")[0], 200)
+        if callable(answer):
+            answer = answer()
+        if isinstance(answer, Exception):
+            raise answer
+        return answer, f"from {url}"
+
+    def post(self, url, headers, payload, attrs=None, on_line=None, retries=None):
+        return self._answer(url, retries)
+
+    async def post_async(
+        self, url, headers, payload, attrs=None, on_line=None, retries=None
+    ):
+        answer = self.answers.get(url.split("/v1")[0])
+        if isinstance(answer, float):
+            await asyncio.sleep(answer)
+            self.answers[url.split("/v1")[0]] = 200
+        return self._answer(url, retries)
+
+    def probe(self, url):
+        return url.split("/v1")[0] in self.healthy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_pool(transport, *urls, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    return EndpointPool(
+        parse_endpoints(urls or ["http://a", "http://b"]), transport, **kwargs
+    )
+
+
+class TestRouting:
+    def test_parse_endpoints(self):
+        a, b = parse_endpoints(
+            ["http://a/", {"url": "http://b", "weight": 2, "api_key": "k"}]
+        )
+        assert (a.url, a.weight) == ("http://a", 1.0)
+        assert b.headers({"Authorization": "Bearer x"}) == {
+            "Authorization": "Bearer k"
+        }
+
+    def test_least_outstanding_relative_to_weight(self):
+        pool = EndpointPool(
+            [Endpoint("http://a"), Endpoint("http://b", weight=2)],
+            FakeTransport(),
+            health_interval=0,
+        )
+        a, b = pool.endpoints
+
+        assert pool.pick() is b
+        b.outstanding = 2
+        assert pool.pick() is a
+        a.outstanding = 1
+        assert pool.pick() is b
+
+    def test_down_endpoints_are_skipped_until_cooled_down(self):
+        clock = Clock()
+        pool = make_pool(FakeTransport(), clock=clock, cooldown=30)
+        a, b = pool.endpoints
+
+        pool.mark_down(a)
+        assert pool.pick() is b
+        clock.now += 31
+        assert pool.pick() is a
+
+    def test_probes_take_endpoints_out_and_back(self):
+        transport = FakeTransport(healthy={"http://b"})
+        pool = make_pool(transport)
+        a, b = pool.endpoints
+
+        pool.probe()
+        assert pool.pick() is b
+
+        transport.healthy.add("http://a")
+        pool.probe()
+        assert pool.pick() is a
+
+
+class TestFailover:
+    def test_fails_over_on_refused_connection(self):
+        transport = FakeTransport(
+            {"http://a": requests.exceptions.ConnectionError("refused")}
+        )
+        pool = make_pool(transport)
+        attrs = {}
+
+        status, text = pool.post("/v1/chat/completions", {}, {}, attrs)
+
+        assert (status, text) == (200, "from http://b/v1/chat/completions")
+        assert attrs["endpoint"] == "http://b"
+        # Only the last candidate gets the transport's retries
+        assert [retries for _, retries in transport.calls] == [0, None]
+        assert pool.pick() is pool.endpoints[1]
+
+    def test_fails_over_on_overload(self):
+        transport = FakeTransport({"http://a": 503})
+        pool = make_pool(transport)
+
+        assert pool.post("/v1/chat/completions", {}, {})[0] == 200
+
+    def test_last_error_is_returned_when_all_fail(self):
+        pool = make_pool(FakeTransport({"http://a": 503, "http://b": 502}))
+
+        assert pool.post("/v1/chat/completions", {}, {})[0] == 502
+
+    def test_request_errors_are_not_failed_over(self):
+        transport = FakeTransport({"http://a": 400})
+        pool = make_pool(transport)
+
+        assert pool.post("/v1/chat/completions", {}, {})[0] == 400
+        assert len(transport.calls) == 1
+
+    def test_async_failover(self):
+        import aiohttp
+
+        transport = FakeTransport({"http://a": aiohttp.ClientConnectionError()})
+        pool = make_pool(transport)
+
+        status, _ = asyncio.run(pool.post_async("/v1/chat/completions", {}, {}))
+        assert status == 200
+
+
+class TestHedging:
+    def test_no_hedging_without_enough_samples(self):
+        pool = make_pool(FakeTransport(), hedge=True)
+        assert pool.hedge_after() is None
+
+        for n in range(100):
+            pool.record_latency(n / 100)
+        assert pool.hedge_after() == pytest.approx(0.95)
+
+    def test_slow_request_is_hedged(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return 200
+
+        transport = FakeTransport({"http://a": slow})
+        pool = make_pool(transport, hedge=True, hedge_delay=0.05)
+        attrs = {}
+
+        try:
+            status, text = pool.post("/v1/chat/completions", {}, {}, attrs)
+        finally:
+            release.set()
+
+        assert text == "from http://b/v1/chat/completions"
+        assert attrs["hedged"] == "http://b"
+        # The winner's attempt attributes are the ones reported
+        assert attrs["endpoint"] == "http://b"
+
+    def test_losing_attempt_is_cancelled(self):
+        stopped = threading.Event()
+
+        def slow():
+            # Stands in for the transport's checks between retries/lines
+            for _ in range(500):
+                try:
+                    check_deadline()
+                except RequestCancelled:
+                    stopped.set()
+                    raise
+                threading.Event().wait(0.01)
+            return 200
+
+        pool = make_pool(
+            FakeTransport({"http://a": slow}), hedge=True, hedge_delay=0.05
+        )
+
+        pool.post("/v1/chat/completions", {}, {})
+
+        assert stopped.wait(2)
+
+    def test_not_hedged_without_free_workers(self):
+        callers = []
+
+        def answer():
+            callers.append(threading.current_thread())
+            return 200
+
+        transport = FakeTransport({"http://a": answer})
+        pool = make_pool(transport, hedge=True, hedge_delay=0.05)
+        while pool._hedge_slots.acquire(blocking=False):
+            pass
+        attrs = {}
+
+        pool.post("/v1/chat/completions", {}, {}, attrs)
+
+        assert callers == [threading.current_thread()]
+        assert "hedged" not in attrs
+
+    def test_fast_request_is_not_hedged(self):
+        transport = FakeTransport()
+        pool = make_pool(transport, hedge=True, hedge_delay=1)
+
+        pool.post("/v1/chat/completions", {}, {})
+        assert len(transport.calls) == 1
+
+    def test_async_hedge_cancels_the_slower_request(self):
+        transport = FakeTransport({"http://a": 5.0})
+        pool = make_pool(transport, hedge=True, hedge_delay=0.05)
+
+        status, text = asyncio.run(pool.post_async("/v1/chat/completions", {}, {}))
+
+        assert text == "from http://b/v1/chat/completions"
+        assert all(e.outstanding == 0 for e in pool.endpoints)
+        # Cancelling the loser doesn't count against its endpoint
+        assert pool.healthy_count() == 2
+
+
+class TestOpenaiEndpoints:
+    def test_requests_go_through_the_pool(self, mock_console):
+        from app.backends.openai import Openai
+
+        cfg = {
+            "openai": {
+                "endpoints": ["http://a", "http://b"],
+                "health_interval": 0,
+                "model": "test-model",
+                "tools_enabled": False,
+            },
+            "llm": {"system_prompt": "Be brief."},
+        }
+        backend = Openai(console=mock_console, parent=None, config=cfg)
+        sent = []
+
+        def post(url, headers, payload, attrs=None, on_line=None, retries=None):
+            sent.append(url)
+            if url.startswith("http://a"):
+                raise requests.exceptions.ConnectionError("refused")
+            return 200, '{"choices": [{"message": {"content": "hi"}}]}'
+
+        backend.transport.post = post
+
+        assert backend.runInference(prompt="hello", use_tools=False) == ("hi", [])
+        assert sent == [
+            "http://a/v1/chat/completions",
+            "http://b/v1/chat/completions",
+        ]
@@ -0,0 +1,127 @@
+import pytest
+
+from app.backends.history_compactor import HistoryCompactor, estimate_tokens
+from app.lib.flow import run_flow
+
+pytestmark = pytest.mark.unit
+
+
+def history_of(turns, size=40):
+    messages = []
+    for n in range(turns):
+        messages.append({"role": "user", "content": f"q{n} " + "x" * size})
+        messages.append({"role": "assistant", "content": f"a{n} " + "y" * size})
+    return messages
+
+
+def chat_reply(text):
+    return {"choices": [{"message": {"content": text}}]}
+
+
+class FakeLLM:
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, step):
+        kind, kwargs = step
+        assert kind == "chat"
+        self.requests.append(kwargs["messages"][-1]["content"])
+        return chat_reply(f"summary {len(self.requests)}")
+
+
+class TestHistoryCompactor:
+    def test_under_budget_is_unchanged(self):
+        compactor = HistoryCompactor(token_budget=10_000)
+        history = history_of(3)
+        llm = FakeLLM()
+
+        assert run_flow(compactor.compact_flow(history), llm) == (None, history)
+        assert llm.requests == []
+
+    def test_older_turns_folded_into_summary(self):
+        compactor = HistoryCompactor(token_budget=50, keep_turns=2)
+        history = history_of(5)
+        llm = FakeLLM()
+
+        summary, recent = run_flow(compactor.compact_flow(history), llm)
+
+        assert summary == "summary 1"
+        assert recent == history[-4:]
+        assert "q0 " in llm.requests[0] and "a2 " in llm.requests[0]
+        assert "q3 " not in llm.requests[0]
+
+    def test_summary_reused_and_extended_incrementally(self):
+        compactor = HistoryCompactor(token_budget=80, keep_turns=2)
+        llm = FakeLLM()
+        history = history_of(5)
+        run_flow(compactor.compact_flow(history), llm)
+
+        # Same history again: cached, no new LLM call
+        assert run_flow(compactor.compact_flow(history), llm)[0] == "summary 1"
+        assert len(llm.requests) == 1
+
+        # Two more turns push it over budget: only the new turns are folded
+        summary, recent = run_flow(compactor.compact_flow(history_of(7)), llm)
+        assert summary == "summary 2"
+        assert recent == history_of(7)[-4:]
+        assert llm.requests[1].startswith("Previous summary:\nsummary 1")
+        assert "q2 " not in llm.requests[1]
+        assert "q3 " in llm.requests[1] and "q4 " in llm.requests[1]
+
+    def test_summary_found_after_oldest_turns_dropped(self):
+        compactor = HistoryCompactor(token_budget=80, keep_turns=2)
+        llm = FakeLLM()
+        run_flow(compactor.compact_flow(history_of(5)), llm)
+
+        # The conversation store dropped the first turn
+        summary, _ = run_flow(compactor.compact_flow(history_of(5)[2:]), llm)
+        assert summary == "summary 1"
+        assert len(llm.requests) == 1
+
+    def test_failed_summary_falls_back_to_full_history(self, mock_console):
+        compactor = HistoryCompactor(token_budget=50, console=mock_console)
+        history = history_of(6)
+
+        def broken(step):
+            raise ConnectionError("down")
+
+        assert run_flow(compactor.compact_flow(history), broken) == (None, history)
+
+    def test_estimate_counts_images(self):
+        assert estimate_tokens([{"content": "", "media_paths": ["a.png"]}]) > 100
+
+
+class TestOpenaiHistorySummary:
+    def test_summary_added_to_system_prompt(self, mock_console):
+        from app.backends.openai import SUMMARY_HEADING, Openai
+
+        cfg = {
+            "openai": {
+                "api_url": "http://localhost",
+                "model": "test-model",
+                "tools_enabled": False,
+                "history_token_budget": 50,
+                "history_keep_turns": 1,
+            },
+            "llm": {"system_prompt": "Be brief."},
+        }
+        backend = Openai(console=mock_console, parent=None, config=cfg)
+        sent = []
+
+        def chat(messages, temperature=None, tools=None, format=None, **kwargs):
+            sent.append(messages)
+            if len(sent) == 1:
+                return chat_reply("they discussed q0 to q2")
+            return chat_reply("final answer")
+
+        backend.chat = chat
+        response, _ = backend.runInference(
+            prompt="next", conversation_history=history_of(4), use_tools=False
+        )
+
+        assert response == "final answer"
+        system, *rest = sent[1]
+        assert system["content"].endswith(
+            f"{SUMMARY_HEADING}\nthey discussed q0 to q2"
+        )
+        assert [m["content"].split()[0] for m in rest] == ["q3", "a3", "next"]
@@ -0,0 +1,82 @@
+import base64
+import io
+
+import pytest
+
+from app.backends.image_encoder import ImageEncoder, prepare_image
+
+Image = pytest.importorskip("PIL.Image")
+
+pytestmark = pytest.mark.unit
+
+
+def png(path, size=(400, 300), mode="RGB"):
+    Image.new(mode, size, (200, 30, 30, 255)[: len(mode)]).save(path, format="PNG")
+    return str(path)
+
+
+def decode(uri):
+    header, b64 = uri.split(",", 1)
+    return header, Image.open(io.BytesIO(base64.b64decode(b64)))
+
+
+class TestPrepareImage:
+    def test_small_image_left_alone(self, tmp_path):
+        data = open(png(tmp_path / "a.png"), "rb").read()
+        assert prepare_image(data, "image/png", max_dim=1000) == (data, "image/png")
+
+    def test_downscaled_in_its_own_format(self, tmp_path):
+        data = open(png(tmp_path / "a.png", size=(2000, 1000)), "rb").read()
+        out, mime = prepare_image(data, "image/png", max_dim=500)
+
+        assert mime == "image/png"
+        assert Image.open(io.BytesIO(out)).size == (500, 250)
+
+    def test_reencoded_as_jpeg_without_alpha(self, tmp_path):
+        path = png(tmp_path / "a.png", size=(2000, 1000), mode="RGBA")
+        data = open(path, "rb").read()
+        out, mime = prepare_image(data, "image/png", max_dim=500, format="jpeg")
+
+        assert mime == "image/jpeg"
+        assert Image.open(io.BytesIO(out)).mode == "RGB"
+
+
+class TestImageEncoder:
+    def test_same_content_encoded_once(self, tmp_path):
+        encoder = ImageEncoder(max_dim=100, format="webp")
+        first = png(tmp_path / "a.png")
+        copy = tmp_path / "b.png"
+        copy.write_bytes(open(first, "rb").read())
+
+        uri = encoder.data_uri(first, "image/png")
+        assert encoder.data_uri(str(copy), "image/png") == uri
+        assert (encoder.hits, encoder.misses) == (1, 1)
+
+        header, img = decode(uri)
+        assert header == "data:image/webp;base64"
+        assert max(img.size) == 100
+
+    def test_changed_file_is_reencoded(self, tmp_path):
+        encoder = ImageEncoder()
+        path = png(tmp_path / "a.png", size=(10, 10))
+        encoder.data_uri(path, "image/png")
+
+        png(tmp_path / "a.png", size=(20, 10))
+        _, img = decode(encoder.data_uri(path, "image/png"))
+        assert img.size == (20, 10)
+
+    def test_cache_bounded_by_size(self, tmp_path):
+        encoder = ImageEncoder(cache_bytes=1)
+        path = png(tmp_path / "a.png")
+        encoder.data_uri(path, "image/png")
+        encoder.data_uri(path, "image/png")
+
+        assert encoder.hits == 0
+
+    def test_from_config(self):
+        encoder = ImageEncoder.from_config(
+            {"image_max_dim": 1024, "image_format": "jpeg"}
+        )
+        assert (encoder.max_dim, encoder.format) == (1024, "jpeg")
+        with pytest.raises(ValueError):
+            ImageEncoder.from_config({"image_format": "gif"})
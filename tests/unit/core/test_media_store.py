@@ -0,0 +1,99 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from app.core.media_store import MediaStore, process_store_dir
+
+pytestmark = pytest.mark.unit
+
+
+def make_file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path, mock_console):
+    return MediaStore(console=mock_console, store_dir=str(tmp_path / "store"))
+
+
+class TestMediaStore:
+    def test_identical_files_share_one_copy(self, store, tmp_path):
+        a = store.put(make_file(tmp_path, "a.png", b"pixels"))
+        b = store.put(make_file(tmp_path, "b.png", b"pixels"))
+
+        assert a == b
+        assert store.refs(a) == 2
+        assert Path(store.path(a)).read_bytes() == b"pixels"
+        assert store.total_bytes == len(b"pixels")
+
+    def test_stored_copy_outlives_source(self, store, tmp_path):
+        src = make_file(tmp_path, "a.png", b"pixels")
+        digest = store.put(src)
+        Path(src).unlink()
+
+        assert Path(store.path(digest)).read_bytes() == b"pixels"
+
+    def test_stored_copy_unaffected_by_source_rewrite(self, store, tmp_path):
+        src = make_file(tmp_path, "last.png", b"pixels")
+        digest = store.put(src)
+        # e.g. the imagegen plugins rewrite their "last image" file in place
+        with open(src, "r+b") as f:
+            f.write(b"PIXELS")
+
+        assert Path(store.path(digest)).read_bytes() == b"pixels"
+
+    def test_unreferenced_files_evicted_lru_when_over_budget(
+        self, tmp_path, mock_console
+    ):
+        store = MediaStore(
+            console=mock_console, store_dir=str(tmp_path / "store"), max_bytes=10
+        )
+        old = store.put(make_file(tmp_path, "old.png", b"old--"))
+        held = store.put(make_file(tmp_path, "held.png", b"held-"))
+        store.release(old)
+        assert store.path(old) is not None  # still within budget
+
+        store.put(make_file(tmp_path, "new.png", b"new--"))
+
+        assert store.path(old) is None
+        assert store.path(held) is not None
+
+    def test_referenced_files_are_never_evicted(self, tmp_path, mock_console):
+        store = MediaStore(
+            console=mock_console, store_dir=str(tmp_path / "store"), max_bytes=1
+        )
+        digest = store.put(make_file(tmp_path, "a.png", b"pixels"))
+
+        assert store.path(digest) is not None
+        store.release(digest)
+        assert store.path(digest) is None
+
+    def test_missing_file(self, store):
+        assert store.put("/nonexistent/file.png") is None
+
+    def test_leftovers_cleared_on_start(self, tmp_path, mock_console):
+        store_dir = tmp_path / "store"
+        store_dir.mkdir()
+        (store_dir / "stale.png").write_bytes(b"x")
+
+        MediaStore(console=mock_console, store_dir=str(store_dir))
+        assert list(store_dir.iterdir()) == []
+
+    def test_each_process_gets_its_own_store(self, tmp_path, mock_console):
+        root = tmp_path / "store"
+        live = root / str(os.getppid())
+        live.mkdir(parents=True)
+        (live / "held.png").write_bytes(b"x")
+        # No process has this id (above the kernel's pid limit)
+        gone = root / "99999999"
+        gone.mkdir()
+
+        store_dir = process_store_dir(str(root))
+        MediaStore(console=mock_console, store_dir=store_dir)
+
+        assert store_dir == str(root / str(os.getpid()))
+        assert (live / "held.png").exists()
+        assert not gone.exists()
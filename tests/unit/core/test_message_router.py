@@ -0,0 +1,1174 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.message_router import (
+    DEFAULT_LANE,
+    MSG_BUSY,
+    MSG_CANCELLED,
+    MSG_NOTHING_TO_CANCEL,
+    MSG_RATE_LIMITED,
+    MSG_REPLAY_GAVE_UP,
+    MSG_TIMED_OUT,
+    DeliveryQueue,
+    FairQueue,
+    KeyedScheduler,
+    MessageRouter,
+    TransientDeliveryError,
+)
+from app.core.broker import RemoteAux
+from app.core.plugin_manager import PluginManager
+from app.core.media_manager import MediaManager
+from app.core.media_store import MediaStore
+from app.core.durable_queue import DurableQueue
+from app.lib.checkpoint import load_checkpoint
+from app.lib.conversation import conversation_key
+from app.lib.deadline import DeadlineExceeded, check_deadline
+from app.lib.hashing import sha256_file
+
+pytestmark = pytest.mark.unit
+
+
+# Helpers -------------------------------------------------------------
+
+
+def make_router(
+    mock_console, mock_backend, process_text, egest, media_store=None, **config
+):
+    plugin_mgr = PluginManager(console=mock_console, backend=mock_backend, debug=False)
+    plugin_mgr.plugins = {}
+
+    return MessageRouter(
+        console=mock_console,
+        process_text_callback=process_text,
+        plugin_manager=plugin_mgr,
+        media_manager=MediaManager(console=mock_console, media_dir="/tmp"),
+        egest_callback=egest,
+        config=config,
+        media_store=media_store,
+        debug=False,
+    )
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+# Worker pool ---------------------------------------------------------
+
+
+class TestWorkerPool:
+    def test_default_single_worker_is_fifo(self, mock_console, mock_backend):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            return message.upper(), []
+
+        def egest(message, media, aux):
+            responses.append(message)
+
+        router = make_router(mock_console, mock_backend, process_text, egest)
+        router.start()
+        assert len(router.lanes[DEFAULT_LANE].workers) == 1
+
+        for word in ["one", "two", "three"]:
+            router.ingest(word, "user1")
+
+        router.stop(timeout=5)
+        assert responses == ["ONE", "TWO", "THREE"]
+
+    def test_multiple_workers_run_concurrently(self, mock_console, mock_backend):
+        barrier = threading.Barrier(2, timeout=5)
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            # Both items must be in flight at once for the barrier to release
+            barrier.wait()
+            return message, []
+
+        def egest(message, media, aux):
+            responses.append(message)
+
+        router = make_router(
+            mock_console, mock_backend, process_text, egest, router_workers=2
+        )
+        router.start()
+        router.ingest("a", "user1")
+        router.ingest("b", "user2")
+
+        assert wait_for(lambda: len(responses) == 2)
+        router.stop(timeout=5)
+        assert sorted(responses) == ["a", "b"]
+
+    def test_stop_drains_queue_and_joins_workers(self, mock_console, mock_backend):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            time.sleep(0.01)
+            return message, []
+
+        def egest(message, media, aux):
+            responses.append(message)
+
+        router = make_router(
+            mock_console, mock_backend, process_text, egest, router_workers=3
+        )
+        router.start()
+        for idx in range(6):
+            router.ingest(str(idx), "user1")
+
+        router.stop(timeout=5)
+        assert len(responses) == 6
+        assert router.lanes[DEFAULT_LANE].workers == []
+
+    def test_worker_survives_callback_error(self, mock_console, mock_backend):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            if message == "boom":
+                raise RuntimeError("boom")
+            return message, []
+
+        def egest(message, media, aux):
+            responses.append(message)
+
+        router = make_router(mock_console, mock_backend, process_text, egest)
+        router.start()
+        router.ingest("boom", "user1")
+        router.ingest("ok", "user1")
+        router.stop(timeout=5)
+
+        assert responses == ["An error occurred processing your request.", "ok"]
+
+
+# Keyed scheduling ----------------------------------------------------
+
+
+def slack_aux(channel, thread_ts=None, user="U1"):
+    return (user, channel, None, {}, thread_ts, thread_ts)
+
+
+class TestKeyedScheduler:
+    def test_conversation_key_from_slack_aux(self):
+        assert conversation_key(slack_aux("C1", "123.4")) == ("C1", "123.4")
+        assert conversation_key(slack_aux("C1")) == ("C1", None)
+        assert conversation_key({"aux": 1}) is None
+        assert conversation_key(RemoteAux(7, ("C1", "1.0"))) == ("C1", "1.0")
+        assert conversation_key(None) is None
+
+    def test_same_key_runs_serially_in_order(self, mock_console):
+        seen = []
+        active = []
+        overlap = []
+        lock = threading.Lock()
+
+        def handler(item):
+            with lock:
+                active.append(item)
+                if len(active) > 1:
+                    overlap.append(item)
+            time.sleep(0.01)
+            with lock:
+                active.remove(item)
+                seen.append(item)
+
+        scheduler = KeyedScheduler(handler, mock_console, workers=4)
+        scheduler.start()
+        for idx in range(5):
+            scheduler.submit(idx, key="chan")
+        scheduler.stop(timeout=5)
+
+        assert seen == [0, 1, 2, 3, 4]
+        assert overlap == []
+
+    def test_different_keys_run_concurrently(self, mock_console):
+        barrier = threading.Barrier(2, timeout=5)
+        seen = []
+
+        def handler(item):
+            barrier.wait()
+            seen.append(item)
+
+        scheduler = KeyedScheduler(handler, mock_console, workers=2)
+        scheduler.start()
+        scheduler.submit("a", key="chan-a")
+        scheduler.submit("b", key="chan-b")
+        scheduler.stop(timeout=5)
+
+        assert sorted(seen) == ["a", "b"]
+
+    def test_busy_key_does_not_block_other_keys(self, mock_console):
+        release = threading.Event()
+        seen = []
+
+        def handler(item):
+            if item == "slow":
+                release.wait(5)
+            seen.append(item)
+
+        scheduler = KeyedScheduler(handler, mock_console, workers=2)
+        scheduler.start()
+        scheduler.submit("slow", key="busy")
+        scheduler.submit("queued", key="busy")
+        scheduler.submit("other", key="idle")
+
+        assert wait_for(lambda: "other" in seen)
+        assert "queued" not in seen
+        release.set()
+        scheduler.stop(timeout=5)
+        assert seen == ["other", "slow", "queued"]
+
+    def test_router_conversation_ordering(self, mock_console, mock_backend):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            time.sleep(0.005)
+            return message, []
+
+        def egest(message, media, aux):
+            responses.append((aux[1], message))
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            egest,
+            router_workers=3,
+            router_ordering="conversation",
+        )
+        router.start()
+        for idx in range(4):
+            router.ingest(f"a{idx}", "user1", aux=slack_aux("A"))
+            router.ingest(f"b{idx}", "user2", aux=slack_aux("B"))
+        router.stop(timeout=5)
+
+        assert [m for c, m in responses if c == "A"] == ["a0", "a1", "a2", "a3"]
+        assert [m for c, m in responses if c == "B"] == ["b0", "b1", "b2", "b3"]
+
+
+# Execution lanes -----------------------------------------------------
+
+
+def lane_plugin(lane):
+    plugin = MagicMock()
+    plugin.lane = lane
+    plugin.deadline = None
+    plugin.execute = MagicMock(return_value=(f"{lane} done", "", True, {}))
+    return plugin
+
+
+class TestLanes:
+    def make_lane_router(self, mock_console, mock_backend, process_text, egest, lanes):
+        router = make_router(
+            mock_console, mock_backend, process_text, egest, router_lanes=lanes
+        )
+        router.plugin_manager.plugins = {
+            "8ball": lane_plugin("instant"),
+            "img": lane_plugin("heavy"),
+            "yt": lane_plugin("heavy"),
+            "summarize": lane_plugin("llm"),
+            "odd": lane_plugin("unknown-lane"),
+        }
+        return router
+
+    def test_lanes_disabled_uses_default_lane(self, mock_console, mock_backend):
+        router = make_router(mock_console, mock_backend, None, None)
+        router.start()
+        assert list(router.lanes) == [DEFAULT_LANE]
+        assert router.classify_lane("/img a cat") == DEFAULT_LANE
+        router.stop(timeout=5)
+
+    def test_classification(self, mock_console, mock_backend):
+        router = self.make_lane_router(mock_console, mock_backend, None, None, {})
+        router.start()
+
+        assert set(router.lanes) == {"instant", "llm", "heavy"}
+        assert router.classify_lane("/8ball will it work?") == "instant"
+        assert router.classify_lane("^ /img --batch 4 cats") == "heavy"
+        assert router.classify_lane("hello there") == "llm"
+        assert router.classify_lane("https://youtu.be/abc") == "heavy"
+        assert router.classify_lane("<https://example.com>") == "llm"
+        assert router.classify_lane("/odd") == "llm"
+        assert router.classify_lane("/missing") == "llm"
+        router.stop(timeout=5)
+
+    def test_instant_lane_not_blocked_by_heavy(self, mock_console, mock_backend):
+        release = threading.Event()
+        responses = []
+
+        def egest(message, media, aux):
+            responses.append(message)
+
+        router = self.make_lane_router(mock_console, mock_backend, None, egest, {})
+
+        def slow_img(**kwargs):
+            release.wait(5)
+            return "heavy done", "", True, {}
+
+        router.plugin_manager.plugins["img"].execute.side_effect = slow_img
+        router.start()
+        router.ingest("/img a cat", "user1")
+        router.ingest("/8ball yes?", "user2")
+
+        assert wait_for(lambda: "instant done" in responses)
+        assert "heavy done" not in responses
+        release.set()
+        router.stop(timeout=5)
+        assert responses == ["instant done", "heavy done"]
+
+    def test_full_lane_rejects_with_busy_notice(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        release = threading.Event()
+        responses = []
+
+        def egest(message, media, aux):
+            responses.append((message, aux))
+
+        router = self.make_lane_router(
+            mock_console,
+            mock_backend,
+            None,
+            egest,
+            {"heavy": {"workers": 1, "max_depth": 1}},
+        )
+
+        def slow_img(**kwargs):
+            release.wait(5)
+            return "heavy done", "", True, {}
+
+        router.plugin_manager.plugins["img"].execute.side_effect = slow_img
+        router.start()
+
+        router.ingest("/img one", "user1", aux="first")
+        assert wait_for(lambda: router.lanes["heavy"].pending() == 0)
+        router.ingest("/img two", "user1", aux="second")
+
+        rejected_media = tmp_path / "upload.png"
+        rejected_media.write_bytes(b"png")
+        router.ingest("/img three", "user1", media=[str(rejected_media)], aux="third")
+
+        assert (MSG_BUSY, "third") in responses
+        assert not rejected_media.exists()
+
+        release.set()
+        router.stop(timeout=5)
+        assert [a for m, a in responses if m == "heavy done"] == ["first", "second"]
+
+
+# Fair queuing and backpressure ---------------------------------------
+
+
+class TestFairQueue:
+    def test_round_robin_across_tenants(self):
+        fq = FairQueue()
+        for idx in range(3):
+            fq.push("spammer", f"s{idx}")
+        fq.push("alice", "a0")
+        fq.push("bob", "b0")
+
+        assert [fq.pop() for _ in range(5)] == ["s0", "a0", "b0", "s1", "s2"]
+        assert len(fq) == 0
+
+    def test_weights(self):
+        fq = FairQueue(weights={"vip": 2})
+        for idx in range(4):
+            fq.push("vip", f"v{idx}")
+            fq.push("pleb", f"p{idx}")
+
+        assert [fq.pop() for _ in range(6)] == ["v0", "v1", "p0", "v2", "v3", "p1"]
+
+    def test_pop_empty_raises(self):
+        with pytest.raises(IndexError):
+            FairQueue().pop()
+
+
+class TestFairScheduling:
+    def test_backlog_is_served_round_robin(self, mock_console):
+        release = threading.Event()
+        seen = []
+
+        def handler(item):
+            if item == "blocker":
+                release.wait(5)
+            seen.append(item)
+
+        scheduler = KeyedScheduler(handler, mock_console, workers=1)
+        scheduler.start()
+        scheduler.submit("blocker", tenant="spammer")
+        assert wait_for(lambda: scheduler.pending() == 0)
+
+        for idx in range(3):
+            scheduler.submit(f"s{idx}", tenant="spammer")
+        scheduler.submit("a0", tenant="alice")
+
+        release.set()
+        scheduler.stop(timeout=5)
+        assert seen == ["blocker", "s0", "a0", "s1", "s2"]
+
+
+class TestBackpressure:
+    def test_global_depth_limit(self, mock_console, mock_backend):
+        release = threading.Event()
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            release.wait(5)
+            return message, []
+
+        def egest(message, media, aux):
+            responses.append((message, aux))
+
+        router = make_router(
+            mock_console, mock_backend, process_text, egest, router_max_depth=1
+        )
+        router.start()
+        router.ingest("first", "u1", aux=1)
+        assert wait_for(lambda: router.pending() == 0)
+        router.ingest("second", "u2", aux=2)
+        router.ingest("third", "u3", aux=3)
+
+        assert responses == [(MSG_BUSY, 3)]
+        release.set()
+        router.stop(timeout=5)
+        assert [a for m, a in responses if m != MSG_BUSY] == [1, 2]
+
+    def test_user_rate_limit(self, mock_console, mock_backend):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            return message, []
+
+        def egest(message, media, aux):
+            responses.append((message, aux))
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            egest,
+            router_rate_limits={"user": {"rate": 0.001, "burst": 2}},
+        )
+        router.start()
+        router.ingest("one", "spammer", aux="s1")
+        router.ingest("two", "spammer", aux="s2")
+        router.ingest("three", "spammer", aux="s3")
+        router.ingest("hi", "alice", aux="a1")
+        router.stop(timeout=5)
+
+        assert (MSG_RATE_LIMITED, "s3") in responses
+        assert sorted(a for m, a in responses if m != MSG_RATE_LIMITED) == [
+            "a1",
+            "s1",
+            "s2",
+        ]
+
+    def test_plugin_rate_limit_is_per_user(self, mock_console, mock_backend):
+        responses = []
+
+        def egest(message, media, aux):
+            responses.append((message, aux))
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            None,
+            egest,
+            router_rate_limits={"plugins": {"img": {"rate": 0.001, "burst": 1}}},
+        )
+        router.plugin_manager.plugins = {"img": lane_plugin("heavy")}
+        router.start()
+        router.ingest("/img cat", "u1", aux="u1-1")
+        router.ingest("/img dog", "u1", aux="u1-2")
+        router.ingest("/img cow", "u2", aux="u2-1")
+        router.stop(timeout=5)
+
+        assert (MSG_RATE_LIMITED, "u1-2") in responses
+        assert ("heavy done", "u2-1") in responses
+
+
+# Conversation history ------------------------------------------------
+
+
+class TestConversationHistory:
+    def test_plus_continues_only_own_conversation(self, mock_console, mock_backend):
+        seen_history = {}
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            seen_history[message] = kwargs.get("conversation_history")
+            return f"re: {message}", []
+
+        router = make_router(
+            mock_console, mock_backend, process_text, lambda **kw: None
+        )
+        router.start()
+        router.ingest("hi from one", "U1", aux=slack_aux("C1", user="U1"))
+        router.ingest("hi from two", "U2", aux=slack_aux("C2", user="U2"))
+        router.ingest("+more from one", "U1", aux=slack_aux("C1", user="U1"))
+        router.ingest("fresh from two", "U2", aux=slack_aux("C2", user="U2"))
+        router.ingest("+again from two", "U2", aux=slack_aux("C2", user="U2"))
+        router.stop(timeout=5)
+
+        assert seen_history["hi from one"] is None
+        assert [m["content"] for m in seen_history["more from one"]] == [
+            "hi from one",
+            "re: hi from one",
+        ]
+        assert [m["content"] for m in seen_history["again from two"]] == [
+            "fresh from two",
+            "re: fresh from two",
+        ]
+
+    def test_thread_scope_shares_history(self, mock_console, mock_backend):
+        seen_history = {}
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            seen_history[message] = kwargs.get("conversation_history")
+            return f"re: {message}", []
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            lambda **kw: None,
+            conversation_scope="thread",
+        )
+        router.start()
+        router.ingest("question", "U1", aux=slack_aux("C1", "T1", user="U1"))
+        router.ingest("+follow up", "U2", aux=slack_aux("C1", "T1", user="U2"))
+        router.stop(timeout=5)
+
+        assert [m["content"] for m in seen_history["follow up"]] == [
+            "question",
+            "re: question",
+        ]
+
+    def test_history_media_is_stored_by_hash(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        seen_history = {}
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            seen_history[message] = kwargs.get("conversation_history")
+            return "ok", []
+
+        media_store = MediaStore(console=mock_console, store_dir=str(tmp_path / "store"))
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            lambda **kw: None,
+            media_store=media_store,
+        )
+        image = tmp_path / "photo.png"
+        image.write_bytes(b"pixels")
+
+        router.start()
+        router.ingest("what is this", "U1", media=[str(image)], aux=slack_aux("C1"))
+        router.ingest("+and now", "U1", aux=slack_aux("C1"))
+        router.stop(timeout=5)
+
+        prior_user_msg = seen_history["and now"][0]
+        assert "media_hashes" not in prior_user_msg
+        (stored,) = prior_user_msg["media_paths"]
+        assert open(stored, "rb").read() == b"pixels"
+        assert not image.exists()  # the original upload was still cleaned up
+
+    def test_aborted_request_releases_its_media(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            raise DeadlineExceeded("too slow")
+
+        media_store = MediaStore(console=mock_console, store_dir=str(tmp_path / "store"))
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            lambda **kw: None,
+            media_store=media_store,
+        )
+        image = tmp_path / "photo.png"
+        image.write_bytes(b"pixels")
+        digest = sha256_file(str(image))
+
+        router.start()
+        router.ingest("what is this", "U1", media=[str(image)], aux=slack_aux("C1"))
+        router.stop(timeout=5)
+
+        assert media_store.path(digest) is not None
+        assert media_store.refs(digest) == 0
+
+
+# Durable queue -------------------------------------------------------
+
+
+class TestDurableQueue:
+    def make_durable_router(
+        self, mock_console, mock_backend, db, process_text, egest
+    ):
+        router = make_router(
+            mock_console, mock_backend, process_text, egest, router_durable_queue=db
+        )
+        router.serialize_aux = lambda aux: {"id": aux}
+        router.deserialize_aux = lambda data: data["id"]
+        return router
+
+    def test_requests_are_journaled_and_finished(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        db = str(tmp_path / "queue.db")
+        router = self.make_durable_router(
+            mock_console,
+            mock_backend,
+            db,
+            lambda message, user_id, incoming_media, aux, **kw: ("ok", []),
+            lambda **kw: None,
+        )
+        router.start()
+        router.ingest("hello", "u1", aux="a1")
+        router.stop(timeout=5)
+
+        assert router.durable.unfinished() == []
+
+    def test_unfinished_requests_replay_on_start(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        db = str(tmp_path / "queue.db")
+        previous = DurableQueue(db)
+        crashed = previous.enqueue(
+            {"message": "was running", "username": "u1", "media": [], "aux": {"id": 1}}
+        )
+        previous.mark_started(crashed)
+        previous.save_checkpoint(crashed, "step", "saved work")
+        previous.enqueue(
+            {"message": "was queued", "username": "u2", "media": [], "aux": {"id": 2}}
+        )
+        previous.close()
+
+        seen = []
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            seen.append((message, load_checkpoint("step")))
+            return f"re: {message}", []
+
+        def egest(message, media, aux):
+            responses.append((message, aux))
+
+        router = self.make_durable_router(
+            mock_console, mock_backend, db, process_text, egest
+        )
+        router.start()
+        router.stop(timeout=5)
+
+        assert seen == [("was running", "saved work"), ("was queued", None)]
+        assert responses == [("re: was running", 1), ("re: was queued", 2)]
+        assert router.durable.unfinished() == []
+
+    def test_repeatedly_crashing_request_is_dropped(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        db = str(tmp_path / "queue.db")
+        previous = DurableQueue(db)
+        poison = previous.enqueue(
+            {"message": "boom", "username": "u1", "media": [], "aux": {"id": 1}}
+        )
+        previous.mark_started(poison)
+        previous.mark_started(poison)
+        previous.close()
+
+        process_text = MagicMock(return_value=("ok", []))
+        responses = []
+        router = self.make_durable_router(
+            mock_console,
+            mock_backend,
+            db,
+            process_text,
+            lambda message, media, aux: responses.append(message),
+        )
+        router.start()
+        router.stop(timeout=5)
+
+        process_text.assert_not_called()
+        assert responses == [MSG_REPLAY_GAVE_UP]
+        assert router.durable.unfinished() == []
+
+    def test_request_the_frontend_cannot_rebuild_is_dropped(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        from app.frontends.Ircawp_Frontend import Ircawp_Frontend
+
+        db = str(tmp_path / "queue.db")
+        previous = DurableQueue(db)
+        previous.enqueue(
+            {"message": "lost", "username": "u1", "media": [], "aux": {"id": 1}}
+        )
+        previous.close()
+
+        process_text = MagicMock(return_value=("ok", []))
+        router = self.make_durable_router(
+            mock_console, mock_backend, db, process_text, MagicMock()
+        )
+        # The base frontend's default
+        router.deserialize_aux = lambda data: Ircawp_Frontend.deserializeAux(
+            None, data
+        )
+        router.start()
+        router.stop(timeout=5)
+
+        process_text.assert_not_called()
+        assert router.durable.unfinished() == []
+
+
+# asyncio mode --------------------------------------------------------
+
+
+class TestAsyncMode:
+    def test_sync_callbacks_run_through_thread_bridge(
+        self, mock_console, mock_backend
+    ):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            return message.upper(), []
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            lambda message, media, aux: responses.append(message),
+            router_async=True,
+        )
+        router.start()
+        for word in ["one", "two", "three"]:
+            router.ingest(word, "user1")
+        router.stop(timeout=5)
+
+        assert responses == ["ONE", "TWO", "THREE"]
+        assert router.loop is None
+
+    def test_async_callback_waits_concurrently_on_one_loop(
+        self, mock_console, mock_backend
+    ):
+        responses = []
+        loop_threads = set()
+        router = make_router(
+            mock_console,
+            mock_backend,
+            None,
+            lambda message, media, aux: responses.append(message),
+            router_async=True,
+            router_workers=3,
+        )
+        started = []
+
+        async def process_text(message, user_id, incoming_media, aux, **kwargs):
+            loop_threads.add(threading.current_thread().name)
+            started.append(message)
+            # Every request must be waiting at once for any of them to finish
+            while len(started) < 3:
+                await asyncio.sleep(0.01)
+            return f"re: {message}", []
+
+        router.process_text_async_callback = process_text
+        router.start()
+        for word in ["a", "b", "c"]:
+            router.ingest(word, f"user-{word}")
+
+        assert wait_for(lambda: len(responses) == 3)
+        router.stop(timeout=5)
+
+        assert sorted(responses) == ["re: a", "re: b", "re: c"]
+        assert loop_threads == {"ircawp-router-loop"}
+
+    def test_async_plugin_main_is_awaited(self, mock_console, mock_backend):
+        from app.plugins.__PluginBase import PluginBase
+
+        responses = []
+
+        async def main(prompt, media, backend, media_backend):
+            await asyncio.sleep(0)
+            return f"async {prompt}", "", True, {}
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            None,
+            lambda message, media, aux: responses.append(message),
+            router_async=True,
+        )
+        router.plugin_manager.plugins = {"echo": PluginBase(main=main)}
+        router.start()
+        router.ingest("/echo hi", "user1")
+        router.stop(timeout=5)
+
+        assert responses == ["async hi"]
+
+
+# Tracing -------------------------------------------------------------
+
+
+class TestTracing:
+    def test_trace_exported_and_footer_appended(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        responses = []
+        log_path = tmp_path / "traces.jsonl"
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            lambda message, user_id, incoming_media, aux, **kw: ("ok", []),
+            lambda message, media, aux: responses.append(message),
+            trace_log=str(log_path),
+            trace_footer=True,
+        )
+        router.start()
+        router.ingest("hello", "user1")
+        router.stop(timeout=5)
+
+        assert responses[0].startswith("ok\n\n`[Timing: queue_wait ")
+        assert router.conversations.last_assistant_message(
+            router._history_key("user1", None)
+        ) == "ok"
+
+        (line,) = log_path.read_text().splitlines()
+        trace = json.loads(line)
+        assert trace["user"] == "user1"
+        assert [s["name"] for s in trace["spans"]] == ["queue_wait", "text", "egest"]
+
+    def test_tracing_off_by_default(self, mock_console, mock_backend):
+        responses = []
+        router = make_router(
+            mock_console,
+            mock_backend,
+            lambda message, user_id, incoming_media, aux, **kw: ("ok", []),
+            lambda message, media, aux: responses.append(message),
+        )
+        router.start()
+        router.ingest("hello", "user1")
+        router.stop(timeout=5)
+
+        assert responses == ["ok"]
+
+
+# Deadlines and cancellation ------------------------------------------
+
+
+class TestDeadlines:
+    def test_scheduler_remove_drops_waiting_items(self, mock_console):
+        release = threading.Event()
+        handled = []
+
+        def handler(item):
+            release.wait(5)
+            handled.append(item)
+
+        scheduler = KeyedScheduler(handler, mock_console, workers=1)
+        scheduler.start()
+        scheduler.submit("a1", key="k", tenant="a")
+        assert wait_for(lambda: scheduler.pending() == 0)
+        scheduler.submit("a2", key="k", tenant="a")
+        scheduler.submit("b1", key="other", tenant="b")
+        scheduler.submit("a3", key="k2", tenant="a")
+
+        assert sorted(scheduler.remove(lambda item: item.startswith("a"))) == [
+            "a2",
+            "a3",
+        ]
+        release.set()
+        scheduler.stop(timeout=5)
+        assert handled == ["a1", "b1"]
+
+    def test_cancel_drops_queued_and_stops_running(self, mock_console, mock_backend):
+        started = threading.Event()
+        responses = []
+        seen = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            seen.append(message)
+            started.set()
+            # Cooperative stop, as between tool rounds
+            while True:
+                check_deadline()
+                time.sleep(0.01)
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            lambda message, media, aux: responses.append((message, aux)),
+        )
+        router.start()
+        router.ingest("first", "user1", aux="first")
+        assert started.wait(5)
+        router.ingest("second", "user1", aux="second")
+        router.ingest("/cancel", "user1", aux="cancel")
+        router.stop(timeout=5)
+
+        assert seen == ["first"]
+        assert responses == [(MSG_CANCELLED.format(count=2), "cancel")]
+
+    def test_cancel_with_nothing_to_cancel(self, mock_console, mock_backend):
+        responses = []
+        router = make_router(
+            mock_console,
+            mock_backend,
+            None,
+            lambda message, media, aux: responses.append(message),
+        )
+        router.start()
+        router.ingest("/cancel", "user1")
+        router.stop(timeout=5)
+
+        assert responses == [MSG_NOTHING_TO_CANCEL]
+
+    def test_deadline_exceeded_sends_timeout_notice(self, mock_console, mock_backend):
+        responses = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            time.sleep(0.1)
+            check_deadline()
+            return "too late", []
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            lambda message, media, aux: responses.append(message),
+            router_deadline=0.05,
+        )
+        router.start()
+        router.ingest("hello", "user1")
+        router.stop(timeout=5)
+
+        assert responses == [MSG_TIMED_OUT]
+        assert router.conversations.last_assistant_message(
+            router._history_key("user1", None)
+        ) is None
+
+    def test_plugin_deadline_overrides_lane(self, mock_console, mock_backend):
+        router = make_router(
+            mock_console, mock_backend, None, None, router_lanes={}
+        )
+        router.plugin_manager.plugins = {"img": lane_plugin("heavy")}
+        router.plugin_manager.plugins["img"].deadline = 42
+        router.start()
+
+        assert router._deadline_budget("/img a cat", "heavy") == 42
+        assert router._deadline_budget("hello", "llm") == 300
+        router.stop(timeout=5)
+
+    def test_async_mode_abandons_hung_request(self, mock_console, mock_backend):
+        responses = []
+
+        async def process_text(message, user_id, incoming_media, aux, **kwargs):
+            await asyncio.sleep(30)
+            return "never", []
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            None,
+            lambda message, media, aux: responses.append(message),
+            router_async=True,
+            router_deadline=0.05,
+        )
+        router.process_text_async_callback = process_text
+        router.start()
+        router.ingest("hello", "user1")
+        assert wait_for(lambda: responses == [MSG_TIMED_OUT])
+        router.stop(timeout=5)
+
+    def test_async_mode_cancel_interrupts_running_request(
+        self, mock_console, mock_backend
+    ):
+        started = threading.Event()
+        responses = []
+
+        async def process_text(message, user_id, incoming_media, aux, **kwargs):
+            started.set()
+            await asyncio.sleep(30)
+            return "never", []
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            None,
+            lambda message, media, aux: responses.append(message),
+            router_async=True,
+        )
+        router.process_text_async_callback = process_text
+        router.start()
+        router.ingest("hello", "user1")
+        assert started.wait(5)
+        router.ingest("/cancel", "user1")
+        router.stop(timeout=5)
+
+        assert responses == [MSG_CANCELLED.format(count=1)]
+
+
+# Delivery stage ------------------------------------------------------
+
+
+class TestDelivery:
+    def test_lane_worker_does_not_wait_for_delivery(
+        self, mock_console, mock_backend
+    ):
+        release = threading.Event()
+        processed = []
+        delivered = []
+
+        def process_text(message, user_id, incoming_media, aux, **kwargs):
+            processed.append(message)
+            return f"re: {message}", []
+
+        def egest(message, media, aux):
+            release.wait(5)
+            delivered.append(message)
+
+        router = make_router(
+            mock_console,
+            mock_backend,
+            process_text,
+            egest,
+            router_delivery={"workers": 1},
+        )
+        router.start()
+        router.ingest("one", "user1", aux=slack_aux("C1"))
+        router.ingest("two", "user1", aux=slack_aux("C1"))
+
+        # Both inferences finish while the first reply is still being sent
+        assert wait_for(lambda: processed == ["one", "two"])
+        assert delivered == []
+        release.set()
+        router.stop(timeout=5)
+
+        assert delivered == ["re: one", "re: two"]
+
+    def test_transient_errors_are_retried_in_order(self, mock_console):
+        attempts = []
+        delivered = []
+
+        def deliver(message, media, aux):
+            attempts.append(message)
+            if message == "first" and attempts.count("first") < 3:
+                raise TransientDeliveryError("ratelimited")
+            delivered.append(message)
+
+        queue = DeliveryQueue(deliver, mock_console, workers=2, backoff=0.01)
+        queue.start()
+        queue.submit("first", [None], slack_aux("C1"))
+        queue.submit("second", [None], slack_aux("C1"))
+        queue.stop(timeout=5)
+
+        assert attempts == ["first", "first", "first", "second"]
+        assert delivered == ["first", "second"]
+
+    def test_gives_up_after_max_attempts(self, mock_console):
+        done = []
+
+        def deliver(message, media, aux):
+            raise TransientDeliveryError("down")
+
+        queue = DeliveryQueue(
+            deliver, mock_console, max_attempts=2, backoff=0.01
+        )
+        queue.start()
+        queue.submit("lost", [None], None, on_done=lambda: done.append(True))
+        queue.stop(timeout=5)
+
+        assert done == [True]
+
+    def test_retry_delay_backs_off_and_honours_retry_after(self, mock_console):
+        queue = DeliveryQueue(
+            lambda **kw: None, mock_console, backoff=1.0, max_backoff=5.0
+        )
+        assert [queue.retry_delay(n) for n in (1, 2, 3, 4)] == [1.0, 2.0, 4.0, 5.0]
+        assert queue.retry_delay(1, retry_after=12) == 12
+
+    def make_ircawp(self, delivery):
+        from app.ircawp import Ircawp
+
+        ircawp = Ircawp.__new__(Ircawp)
+        ircawp.console = MagicMock()
+        ircawp.max_egest_length = 3500
+        ircawp.message_router = MagicMock(delivery=delivery)
+        ircawp.frontend = MagicMock()
+        ircawp.frontend.egestEvent.side_effect = [RuntimeError("ratelimited"), None]
+        ircawp.frontend.retryDelay.return_value = 0.0
+        return ircawp
+
+    def test_transient_egest_error_is_retried_by_the_queue(self):
+        ircawp = self.make_ircawp(delivery=MagicMock())
+
+        with pytest.raises(TransientDeliveryError):
+            ircawp._egest_message("hi", [None], slack_aux("C1"))
+
+    def test_transient_egest_error_falls_back_without_a_queue(self):
+        ircawp = self.make_ircawp(delivery=None)
+
+        ircawp._egest_message("hi", [None], slack_aux("C1"))
+
+        fallback = ircawp.frontend.egestEvent.call_args.args[0]
+        assert fallback.startswith("An error occurred delivering")
+        assert fallback.endswith("hi")
+
+    def test_retried_media_reply_only_redoes_the_upload(self, tmp_path):
+        from app.frontends.slack import Slack
+
+        image = tmp_path / "out.png"
+        image.write_bytes(b"png")
+        slack = Slack.__new__(Slack)
+        slack.live_replies = {}
+        slack.live_replies_lock = threading.Lock()
+        slack.pending_requests = {}
+        slack.text_delivered = OrderedDict()
+        slack.bolt = MagicMock()
+        slack.bolt.client.files_upload_v2.side_effect = [RuntimeError("503"), None]
+        say = MagicMock()
+        aux = ("U1", "C1", say, {}, None, None)
+
+        with pytest.raises(RuntimeError):
+            slack.egestEvent("look", [str(image)], aux)
+        slack.egestEvent("look", [str(image)], aux)
+
+        assert say.call_count == 1
+        assert slack.bolt.client.files_upload_v2.call_count == 2
+        assert slack.text_delivered == {}
+
+    def test_request_finishes_after_its_reply_is_delivered(
+        self, mock_console, mock_backend, tmp_path
+    ):
+        log_path = tmp_path / "traces.jsonl"
+        db = str(tmp_path / "queue.db")
+        router = make_router(
+            mock_console,
+            mock_backend,
+            lambda message, user_id, incoming_media, aux, **kw: ("ok", []),
+            lambda message, media, aux: None,
+            router_delivery={},
+            router_durable_queue=db,
+            trace_log=str(log_path),
+        )
+        router.serialize_aux = lambda aux: {"id": aux}
+        router.start()
+        router.ingest("hello", "user1", aux="a1")
+        router.stop(timeout=5)
+
+        assert router.durable.unfinished() == []
+        (line,) = log_path.read_text().splitlines()
+        names = [s["name"] for s in json.loads(line)["spans"]]
+        assert names == ["queue_wait", "text", "egest", "deliver"]
+
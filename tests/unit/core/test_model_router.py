@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from app.backends.model_router import ModelRouter
+
+pytestmark = pytest.mark.unit
+
+MODELS = {
+    "tiny": "qwen-0.5b",
+    "small": {"model": "qwen-3b", "api_url": "http://small:8081/", "api_key": "k"},
+}
+
+
+class TestModelRouter:
+    def test_routes_purposes_to_profiles(self):
+        routes = {"refine_prompt": "tiny", "wordle_extract": "small"}
+        router = ModelRouter.from_config({"models": MODELS, "routes": routes})
+
+        assert router.profile_for("refine_prompt").model == "qwen-0.5b"
+        assert router.profile_for("refine_prompt").api_url is None
+        assert router.profile_for("wordle_extract").api_url == "http://small:8081"
+        assert router.profile_for("history_summary") is None
+        assert router.profile_for(None) is None
+
+    def test_unknown_profile_is_rejected(self):
+        with pytest.raises(ValueError, match="huge"):
+            ModelRouter.from_config({"models": MODELS, "routes": {"x": "huge"}})
+
+    def test_from_config(self):
+        assert ModelRouter.from_config({"models": MODELS}) is None
+
+
+class TestOpenaiRouting:
+    def make_backend(self, mock_console):
+        from app.backends.openai import Openai
+
+        cfg = {
+            "openai": {
+                "api_url": "http://main",
+                "api_key": "main-key",
+                "model": "big",
+                "tools_enabled": False,
+                "models": MODELS,
+                "routes": {"refine_prompt": "tiny", "wikipedia_select": "small"},
+            },
+            "llm": {"system_prompt": "Be brief."},
+        }
+        backend = Openai(console=mock_console, parent=None, config=cfg)
+        backend.sent = []
+
+        def post(url, headers, payload, attrs=None, on_line=None):
+            backend.sent.append((url, headers.get("Authorization"), payload["model"]))
+            return 200, json.dumps({"choices": [{"message": {"content": "ok"}}]})
+
+        backend.transport.post = post
+        return backend
+
+    def test_calls_go_to_their_routed_model(self, mock_console):
+        backend = self.make_backend(mock_console)
+
+        backend.runInference(prompt="hi", use_tools=False)
+        backend.runInference(prompt="cat", use_tools=False, purpose="refine_prompt")
+        backend.runInference(
+            prompt="a or b", use_tools=False, purpose="wikipedia_select"
+        )
+        backend.runInference(prompt="x", use_tools=False, purpose="history_summary")
+
+        assert backend.sent == [
+            ("http://main/v1/chat/completions", "Bearer main-key", "big"),
+            ("http://main/v1/chat/completions", "Bearer main-key", "qwen-0.5b"),
+            ("http://small:8081/v1/chat/completions", "Bearer k", "qwen-3b"),
+            ("http://main/v1/chat/completions", "Bearer main-key", "big"),
+        ]
@@ -73,7 +73,7 @@ class TestWikipediaSufficiencyCheck:
 
         backend = Openai(console=mock_console, parent=None, config=cfg)
 
-        def fake_chat(messages, temperature=None, tools=None, format=None):
+        def fake_chat(messages, temperature=None, tools=None, format=None, **kwargs):
             return {
                 "choices": [
                     {
@@ -108,7 +108,7 @@ class TestWikipediaSufficiencyCheck:
 
         backend = Openai(console=mock_console, parent=None, config=cfg)
 
-        def fake_chat(messages, temperature=None, tools=None, format=None):
+        def fake_chat(messages, temperature=None, tools=None, format=None, **kwargs):
             return {
                 "choices": [
                     {
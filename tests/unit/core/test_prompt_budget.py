@@ -0,0 +1,138 @@
+import pytest
+
+from app.backends.prompt_budget import (
+    TRIM_MARKER,
+    PromptBudget,
+    TokenCounter,
+)
+from app.core.url_extractor import URL_CONTENT_BLOCK
+
+pytestmark = pytest.mark.unit
+
+
+def history_of(turns, size=400):
+    messages = []
+    for n in range(turns):
+        messages.append({"role": "user", "content": f"q{n} " + "x" * size})
+        messages.append({"role": "assistant", "content": f"a{n} " + "y" * size})
+    return messages
+
+
+SYSTEM = {"role": "system", "content": "Be brief."}
+TOOLS = [{"type": "function", "function": {"name": "calc", "parameters": {}}}]
+
+
+def budget(window, reserve=0):
+    return PromptBudget(window, reserve_tokens=reserve, counter=TokenCounter())
+
+
+class TestPromptBudget:
+    def test_small_request_is_unchanged(self):
+        messages = [SYSTEM, {"role": "user", "content": "hi"}]
+
+        assert budget(1000).fit(messages, TOOLS) == (messages, TOOLS, [])
+
+    def test_oldest_history_dropped_first(self):
+        b = budget(470)
+        messages = [SYSTEM, *history_of(4), {"role": "user", "content": "next"}]
+
+        fitted, tools, trimmed = b.fit(messages, TOOLS)
+
+        assert fitted[0] == SYSTEM
+        assert [m["content"].split()[0] for m in fitted[1:-1]] == ["q2", "a2", "q3", "a3"]
+        assert fitted[-1]["content"] == "next"
+        assert tools == TOOLS
+        assert trimmed == ["4 history messages"]
+        assert b.total(fitted, tools) <= b.limit
+
+    def test_fetched_page_trimmed_before_tools_and_question(self):
+        b = budget(400)
+        page = "page text. " * 400
+        question = "what does this page say?"
+        message = URL_CONTENT_BLOCK.format(url="http://x", content=page) + question
+
+        fitted, tools, trimmed = b.fit(
+            [SYSTEM, {"role": "user", "content": message}], TOOLS
+        )
+
+        text = fitted[-1]["content"]
+        assert text.startswith("####http://x content: ```\npage text.")
+        assert TRIM_MARKER in text
+        assert text.endswith(question)
+        assert tools == TOOLS
+        assert trimmed == ["fetched page text"]
+        assert b.total(fitted, tools) <= b.limit
+
+    def test_tools_dropped_then_message_cut_in_the_middle(self):
+        b = budget(300)
+        transcript = "START " + "words " * 2000 + " END"
+
+        fitted, tools, trimmed = b.fit(
+            [SYSTEM, {"role": "user", "content": transcript}], TOOLS
+        )
+
+        text = fitted[-1]["content"]
+        assert tools is None
+        assert trimmed == ["tool schemas", "the message"]
+        assert text.startswith("START") and text.endswith("END")
+        assert b.total(fitted) <= b.limit
+
+    def test_images_are_kept(self):
+        b = budget(600)
+        content = [
+            {"type": "text", "text": "z" * 4000},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+        ]
+
+        fitted, _, _ = b.fit([{"role": "user", "content": content}])
+
+        assert fitted[-1]["content"][1]["type"] == "image_url"
+        assert b.total(fitted) <= b.limit
+
+    def test_estimate_calibrates_from_usage(self):
+        b = budget(1000)
+        messages = [{"role": "user", "content": "x" * 3000}]
+
+        for _ in range(30):
+            b.observe(messages, None, {"prompt_tokens": 1004})
+
+        assert b.counter.chars_per_token == pytest.approx(3.0, abs=0.05)
+
+    def test_from_config_needs_a_window(self):
+        assert PromptBudget.from_config({}) is None
+        assert PromptBudget.from_config({"context_window": 8192}).limit == 8192 - 1024
+
+
+class TestOpenaiPromptBudget:
+    def test_request_trimmed_before_sending(self, mock_console):
+        from app.backends.openai import Openai
+
+        cfg = {
+            "openai": {
+                "api_url": "http://localhost",
+                "model": "test-model",
+                "tools_enabled": False,
+                "context_window": 300,
+                "reserve_tokens": 100,
+            },
+            "llm": {"system_prompt": "Be brief."},
+        }
+        backend = Openai(console=mock_console, parent=None, config=cfg)
+        sent = []
+
+        def chat(messages, temperature=None, tools=None, format=None, **kwargs):
+            sent.append(messages)
+            return {"choices": [{"message": {"content": "ok"}}]}
+
+        backend.chat = chat
+        response, _ = backend.runInference(
+            prompt="summarize: " + "blah " * 1000,
+            conversation_history=history_of(3),
+            use_tools=False,
+        )
+
+        assert response == "ok"
+        (messages,) = sent
+        assert [m["role"] for m in messages] == ["system", "user"]
+        assert messages[-1]["content"].startswith("summarize: blah")
+        assert backend.prompt_budget.total(messages) <= 200
@@ -0,0 +1,108 @@
+import pytest
+
+from app.backends.prompt_layout import STANDIN, PromptLayout
+
+pytestmark = pytest.mark.unit
+
+
+class TestPromptLayout:
+    def test_static_prefix_rendered_once(self):
+        layout = PromptLayout()
+        renders = []
+
+        def render():
+            renders.append(1)
+            return "static"
+
+        assert layout.static_prefix("k", render) == "static"
+        assert layout.static_prefix("k", render) == "static"
+        assert len(renders) == 1
+
+    def test_context_note_only_for_used_placeholders(self):
+        layout = PromptLayout()
+        render = lambda text: text.replace("{username}", "bob")  # noqa: E731
+
+        assert layout.context_note("Be nice.", render) == ""
+        assert (
+            layout.context_note("Talk to {username}.", render)
+            == "(Context: You are talking with bob.)"
+        )
+
+    def test_slots_stick_and_least_recent_is_reassigned(self):
+        layout = PromptLayout(slots=2)
+
+        a = layout.slot_for("a")
+        b = layout.slot_for("b")
+        assert {a, b} == {0, 1}
+        assert layout.slot_for("a") == a
+
+        # "b" is least recently used, so "c" takes its slot
+        assert layout.slot_for("c") == b
+        assert layout.slot_for("a") == a
+
+    def test_no_slots_by_default(self):
+        assert PromptLayout().slot_for("a") is None
+
+    def test_from_config(self):
+        assert PromptLayout.from_config({}) is None
+        assert PromptLayout.from_config({"prompt_layout": "cached", "slots": 3}).slots == 3
+
+
+class TestOpenaiCachedLayout:
+    def make_backend(self, mock_console):
+        from app.backends.openai import Openai
+
+        cfg = {
+            "openai": {
+                "api_url": "http://localhost",
+                "model": "test-model",
+                "tools_enabled": False,
+                "prompt_layout": "cached",
+                "slots": 4,
+            },
+            "llm": {"system_prompt": "It is {current_datetime}. Help {username}."},
+        }
+        backend = Openai(console=mock_console, parent=None, config=cfg)
+        backend.sent = []
+
+        def post(url, headers, payload, attrs=None, on_line=None):
+            backend.sent.append(payload)
+            return 200, '{"choices": [{"message": {"content": "ok"}}]}'
+
+        backend.transport.post = post
+        return backend
+
+    def test_system_prompt_is_stable_and_volatile_values_move_late(
+        self, mock_console
+    ):
+        backend = self.make_backend(mock_console)
+        aux = ("U1", "C1", None, {}, "1.0", None)
+
+        backend.runInference(prompt="hi", username="alice", aux=aux, use_tools=False)
+        backend.runInference(prompt="yo", username="bob", aux=aux, use_tools=False)
+
+        first, second = backend.sent
+        assert first["messages"][0] == second["messages"][0]
+        assert first["messages"][0]["content"] == f"It is {STANDIN}. Help {STANDIN}."
+        assert "alice" in first["messages"][-1]["content"]
+        assert second["messages"][-1]["content"].endswith("\n\nyo")
+        assert first["cache_prompt"] is True
+        assert first["id_slot"] == second["id_slot"]
+
+    def test_conversations_get_their_own_slots(self, mock_console):
+        backend = self.make_backend(mock_console)
+
+        backend.runInference(prompt="hi", aux=("U1", "C1", None, {}, None, None))
+        backend.runInference(prompt="hi", aux=("U1", "C2", None, {}, None, None))
+
+        assert backend.sent[0]["id_slot"] != backend.sent[1]["id_slot"]
+
+    def test_helper_calls_are_not_pinned(self, mock_console):
+        backend = self.make_backend(mock_console)
+
+        backend.runInference(
+            prompt="cat", use_tools=False, purpose="refine_prompt", username="alice"
+        )
+
+        assert "id_slot" not in backend.sent[0]
+        assert backend.prompt_layout._assigned == {}
@@ -0,0 +1,121 @@
+import pytest
+
+from app.backends.response_cache import ResponseCache, cache_key
+
+pytestmark = pytest.mark.unit
+
+
+def request(content="which one?", temperature=0.0, **extra):
+    return {
+        "model": "m",
+        "messages": [{"role": "user", "content": content}],
+        "temperature": temperature,
+        **extra,
+    }
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache:
+    def test_key_covers_answer_fields_only(self):
+        assert cache_key(request()) == cache_key(request(stream=True, id_slot=2))
+        assert cache_key(request()) != cache_key(request(temperature=0.5))
+        assert cache_key(request()) != cache_key(request(content="other"))
+
+    def test_hit_returns_a_copy(self):
+        cache = ResponseCache()
+        cache.put("k", {"choices": [{"message": {"content": "2"}}]})
+
+        first = cache.get("k")
+        first["choices"].clear()
+
+        assert cache.get("k") == {"choices": [{"message": {"content": "2"}}]}
+        assert (cache.hits, cache.misses) == (2, 0)
+
+    def test_entries_expire(self):
+        clock = Clock()
+        cache = ResponseCache(ttl=60, clock=clock)
+        cache.put("k", {"a": 1})
+
+        clock.now += 61
+        assert cache.get("k") is None
+
+    def test_least_recently_used_evicted(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+        cache.put("c", {"n": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"n": 1}
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        path = str(tmp_path / "responses.db")
+        ResponseCache(path=path).put("k", {"a": 1})
+
+        assert ResponseCache(path=path).get("k") == {"a": 1}
+
+    def test_from_config(self):
+        assert ResponseCache.from_config(None) is None
+        assert ResponseCache.from_config(True).ttl > 0
+        assert ResponseCache.from_config({"ttl": 5}).ttl == 5
+
+
+class TestOpenaiResponseCache:
+    def make_backend(self, mock_console, enabled=True):
+        from app.backends.openai import Openai
+
+        cfg = {
+            "openai": {
+                "api_url": "http://localhost",
+                "model": "test-model",
+                "tools_enabled": False,
+                **({"response_cache": {}} if enabled else {}),
+            },
+            "llm": {"system_prompt": "Be brief."},
+        }
+        backend = Openai(console=mock_console, parent=None, config=cfg)
+        backend.posts = 0
+
+        def post(url, headers, payload, attrs=None, on_line=None):
+            backend.posts += 1
+            return 200, '{"choices": [{"message": {"content": "2"}}]}'
+
+        backend.transport.post = post
+        return backend
+
+    def ask(self, backend, cacheable=True):
+        return backend.runInference(
+            prompt="pick one",
+            system_prompt="Select the best candidate.",
+            temperature=0.0,
+            use_tools=False,
+            cacheable=cacheable,
+        )
+
+    def test_cacheable_calls_are_reused(self, mock_console):
+        backend = self.make_backend(mock_console)
+
+        assert self.ask(backend) == self.ask(backend) == ("2", [])
+        assert backend.posts == 1
+
+    def test_other_calls_are_not_cached(self, mock_console):
+        backend = self.make_backend(mock_console)
+        self.ask(backend, cacheable=False)
+        self.ask(backend, cacheable=False)
+
+        assert backend.posts == 2
+
+    def test_cache_is_opt_in(self, mock_console):
+        backend = self.make_backend(mock_console, enabled=False)
+        self.ask(backend)
+        self.ask(backend)
+
+        assert backend.posts == 2
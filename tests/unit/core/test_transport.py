@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app.backends.transport import ChatTransport, encode_json
+from app.lib.deadline import Deadline, RequestAborted, deadline_scope
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def server():
+    """Local HTTP server answering POSTs from a script of (status, headers, body)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            srv.bodies.append(json.loads(self.rfile.read(length)))
+            srv.ports.add(self.client_address[1])
+            status, headers, body = (
+                srv.script.pop(0) if srv.script else (200, {}, "{}")
+            )
+            data = body.encode("utf-8")
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.script, srv.bodies, srv.ports = [], [], set()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"
+    thread = threading.Thread(target=srv.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def make_transport(**kwargs):
+    delays = []
+    transport = ChatTransport(sleep=delays.append, **kwargs)
+    transport.delays = delays
+    return transport
+
+
+class TestChatTransport:
+    def test_connections_are_reused(self, server):
+        transport = make_transport()
+        for n in range(3):
+            assert transport.post(server.url, {}, {"n": n}) == (200, "{}")
+
+        assert server.bodies == [{"n": 0}, {"n": 1}, {"n": 2}]
+        assert len(server.ports) == 1
+
+    def test_overloaded_server_is_retried(self, server):
+        server.script = [(503, {}, "busy"), (429, {"Retry-After": "2"}, "slow")]
+        transport = make_transport(retries=2, backoff=0.5)
+        attrs = {}
+
+        assert transport.post(server.url, {}, {"n": 1}, attrs) == (200, "{}")
+        assert attrs["attempts"] == 3
+        assert 0.25 <= transport.delays[0] <= 0.5
+        assert transport.delays[1] == 2.0
+
+    def test_gives_up_after_retries(self, server):
+        server.script = [(502, {}, "bad gateway")] * 3
+        transport = make_transport(retries=1)
+
+        assert transport.post(server.url, {}, {}) == (502, "bad gateway")
+        assert len(transport.delays) == 1
+
+    def test_other_errors_are_not_retried(self, server):
+        server.script = [(500, {}, "boom")]
+        transport = make_transport()
+
+        assert transport.post(server.url, {}, {}) == (500, "boom")
+        assert transport.delays == []
+
+    def test_no_retry_past_the_deadline(self, server):
+        server.script = [(429, {"Retry-After": "5"}, "slow")]
+        transport = make_transport(max_backoff=30)
+        deadline = Deadline(budget=1.0)
+        deadline.start()
+
+        with deadline_scope(deadline):
+            assert transport.post(server.url, {}, {})[0] == 429
+        assert transport.delays == []
+
+    def test_refused_connection_is_retried_then_raised(self, server):
+        url = server.url
+        server.shutdown()
+        server.server_close()
+        transport = make_transport(retries=2)
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            transport.post(url, {}, {})
+        assert len(transport.delays) == 2
+
+    def test_cancelled_request_is_not_sent(self, server):
+        deadline = Deadline()
+        deadline.cancel()
+
+        with deadline_scope(deadline), pytest.raises(RequestAborted):
+            make_transport().post(server.url, {}, {})
+        assert server.bodies == []
+
+    def test_async_post_retries_and_reuses_session(self, server):
+        server.script = [(503, {}, "busy")]
+        transport = ChatTransport(backoff=0.01)
+
+        async def run():
+            first = await transport.post_async(server.url, {}, {"n": 1})
+            second = await transport.post_async(server.url, {}, {"n": 2})
+            await transport._async_session().close()
+            return first, second
+
+        assert asyncio.run(run()) == ((200, "{}"), (200, "{}"))
+        assert server.bodies == [{"n": 1}, {"n": 1}, {"n": 2}]
+        assert len(server.ports) == 1
+
+    def test_streamed_body_is_passed_line_by_line(self, server):
+        server.script = [
+            (503, {}, "busy"),
+            (200, {"Content-Type": "text/event-stream"}, "data: 1\n\ndata: 2\n\n"),
+        ]
+        lines = []
+
+        status, text = make_transport().post(server.url, {}, {}, on_line=lines.append)
+
+        assert (status, text) == (200, "")
+        assert [line for line in lines if line] == [b"data: 1", b"data: 2"]
+
+    def test_encode_json_keeps_unicode(self):
+        assert json.loads(encode_json({"text": "héllo"})) == {"text": "héllo"}
@@ -0,0 +1,42 @@
+import pytest
+
+from app.core.durable_queue import DurableQueue
+from app.lib.checkpoint import (
+    checkpoint_name,
+    checkpoint_scope,
+    checkpointed,
+    load_checkpoint,
+)
+
+pytestmark = pytest.mark.unit
+
+
+class TestCheckpoint:
+    def test_noop_outside_scope(self):
+        calls = []
+        assert checkpointed("x", lambda: calls.append(1) or "v") == "v"
+        assert checkpointed("x", lambda: calls.append(1) or "v") == "v"
+        assert len(calls) == 2
+        assert load_checkpoint("x") is None
+
+    def test_reused_within_request(self, tmp_path):
+        queue = DurableQueue(str(tmp_path / "q.db"))
+        request_id = queue.enqueue({})
+        calls = []
+
+        with checkpoint_scope(queue, request_id):
+            checkpointed("step", lambda: calls.append(1) or ["refined"])
+
+        # A replay of the same request gets the saved result
+        with checkpoint_scope(queue, request_id):
+            assert checkpointed("step", lambda: calls.append(1)) == ["refined"]
+        assert len(calls) == 1
+
+        # Another request doesn't
+        with checkpoint_scope(queue, queue.enqueue({})):
+            assert load_checkpoint("step") is None
+
+    def test_checkpoint_name_depends_on_inputs(self):
+        assert checkpoint_name("p", "a", 1) == checkpoint_name("p", "a", 1)
+        assert checkpoint_name("p", "a", 1) != checkpoint_name("p", "a", 2)
+        assert checkpoint_name("p", "a").startswith("p:")
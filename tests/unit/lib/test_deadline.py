@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from app.lib.deadline import (
+    MIN_TIMEOUT,
+    ChildDeadline,
+    Deadline,
+    DeadlineExceeded,
+    RequestCancelled,
+    check_deadline,
+    deadline_scope,
+    timeout_for,
+)
+
+pytestmark = pytest.mark.unit
+
+
+class TestDeadline:
+    def test_helpers_do_nothing_outside_a_request(self):
+        check_deadline()
+        assert timeout_for(12) == 12
+        assert timeout_for() is None
+
+    def test_timeout_is_capped_by_remaining_budget(self):
+        deadline = Deadline(5)
+        deadline.start()
+        with deadline_scope(deadline):
+            assert timeout_for(12) <= 5
+            assert timeout_for(2) == 2
+            assert 4 < timeout_for() <= 5
+
+    def test_budget_only_runs_once_started(self):
+        deadline = Deadline(0.01)
+        time.sleep(0.02)
+        deadline.check()
+
+        deadline.start()
+        time.sleep(0.02)
+        with deadline_scope(deadline):
+            with pytest.raises(DeadlineExceeded):
+                check_deadline()
+            with pytest.raises(DeadlineExceeded):
+                timeout_for(12)
+
+    def test_cancel(self):
+        deadline = Deadline(None)
+        deadline.start()
+        with deadline_scope(deadline):
+            assert timeout_for(12) == 12
+            deadline.cancel()
+            with pytest.raises(RequestCancelled):
+                check_deadline()
+
+    def test_nearly_spent_budget_never_yields_zero_timeout(self):
+        deadline = Deadline(0.001)
+        deadline.start()
+        deadline.expires_at = time.monotonic() + 0.0001
+        with deadline_scope(deadline):
+            assert timeout_for(12) == MIN_TIMEOUT
+
+    def test_child_deadline_narrows_its_parent(self):
+        parent = Deadline(60)
+        parent.start()
+        child = ChildDeadline(parent, 5)
+
+        assert 4 < child.remaining() <= 5
+        child.cancel()
+        assert child.cancelled and not parent.cancelled
+
+        other = ChildDeadline(parent)
+        assert other.remaining() > 5
+        parent.cancel()
+        with pytest.raises(RequestCancelled):
+            other.check()
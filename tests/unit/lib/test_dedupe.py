@@ -0,0 +1,55 @@
+import pytest
+
+from app.lib.dedupe import IdempotencyStore
+
+pytestmark = pytest.mark.unit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyStore:
+    def test_repeat_is_duplicate(self):
+        store = IdempotencyStore()
+        assert store.first_seen(["ev1"]) is True
+        assert store.first_seen(["ev1"]) is False
+        assert store.first_seen(["ev2"]) is True
+        assert store.stats() == {"checked": 3, "duplicates": 1, "tracked": 2}
+
+    def test_any_matching_key_is_duplicate(self):
+        store = IdempotencyStore()
+        assert store.first_seen(["ev1", "msg1"]) is True
+        # Same message, new delivery id
+        assert store.first_seen(["ev2", "msg1"]) is False
+        # ...and the new delivery id is remembered too
+        assert store.first_seen(["ev2"]) is False
+
+    def test_events_without_keys_are_always_new(self):
+        store = IdempotencyStore()
+        assert store.first_seen([None]) is True
+        assert store.first_seen([None]) is True
+
+    def test_keys_expire_after_ttl(self):
+        clock = FakeClock()
+        store = IdempotencyStore(ttl=10, clock=clock)
+        store.first_seen(["ev1"])
+
+        clock.now = 9.0
+        assert store.first_seen(["ev1"]) is False
+        clock.now = 10.0
+        assert store.first_seen(["ev1"]) is True
+
+    def test_oldest_keys_evicted_beyond_max_entries(self):
+        store = IdempotencyStore(max_entries=2)
+        store.first_seen(["a"])
+        store.first_seen(["b"])
+        store.first_seen(["c"])
+
+        assert store.stats()["tracked"] == 2
+        assert store.first_seen(["a"]) is True
+        assert store.first_seen(["c"]) is False
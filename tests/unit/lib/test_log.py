@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from rich.console import Console
+
+from app.lib import log
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def reset_settings():
+    yield
+    log.configure(None)
+
+
+def make_logger(subsystem="openai"):
+    out = io.StringIO()
+    console = Console(file=out, width=200, log_path=False, log_time=False)
+    return log.get_logger(subsystem, console), out
+
+
+class TestRedact:
+    def test_data_uri_reduced_to_size(self):
+        uri = "data:image/png;base64," + "A" * 5000
+        result = log.redact(f"see {uri} here", limit=1000)
+        assert result == f"see data:image/png;base64,<{len(uri)} chars> here"
+
+    def test_long_strings_truncated(self):
+        result = log.redact("x" * 50, limit=10)
+        assert result == "xxxxxxxxxx...<50 chars>"
+
+    def test_containers_redacted_recursively(self):
+        payload = {
+            "messages": [{"content": "y" * 20}],
+            "pair": ("z" * 20, 3),
+        }
+        result = log.redact(payload, limit=5)
+        assert result["messages"][0]["content"].startswith("yyyyy...")
+        assert result["pair"][0].startswith("zzzzz...")
+        assert result["pair"][1] == 3
+
+
+class TestLevels:
+    def test_default_level_is_info(self):
+        logger, out = make_logger()
+        logger.debug("hidden")
+        logger.info("shown")
+        assert "hidden" not in out.getvalue()
+        assert "shown" in out.getvalue()
+
+    def test_subsystem_override(self):
+        log.configure(
+            {"logging": {"level": "warning", "subsystems": {"openai": "debug"}}}
+        )
+        assert log.is_enabled("openai")
+        assert not log.is_enabled("wikipedia", log.INFO)
+        assert log.is_enabled("wikipedia", log.WARNING)
+
+    def test_off_silences_errors(self):
+        log.configure({"logging": {"level": "off"}})
+        logger, out = make_logger()
+        logger.error("boom")
+        assert out.getvalue() == ""
+
+    def test_lazy_message_not_built_when_disabled(self):
+        logger, _ = make_logger()
+        called = []
+        logger.debug(lambda: called.append(1) or "msg")
+        assert called == []
+
+    def test_args_redacted_and_escaped(self):
+        log.configure({"logging": {"level": "debug", "max_field_chars": 8}})
+        logger, out = make_logger()
+        logger.debug("payload: %s", "[bold]" + "q" * 40)
+        text = out.getvalue()
+        assert "[bold]" in text
+        assert "q" * 9 not in text
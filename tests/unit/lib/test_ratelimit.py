@@ -0,0 +1,52 @@
+import pytest
+
+from app.lib.ratelimit import RateLimiter, TokenBucket
+
+pytestmark = pytest.mark.unit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, burst=2, clock=clock)
+
+        assert bucket.try_acquire() is True
+        assert bucket.try_acquire() is True
+        assert bucket.try_acquire() is False
+
+        clock.now = 1.0
+        assert bucket.try_acquire() is True
+        assert bucket.try_acquire() is False
+
+    def test_refill_capped_at_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10.0, burst=3, clock=clock)
+        clock.now = 100.0
+
+        assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+class TestRateLimiter:
+    def test_from_config(self):
+        assert RateLimiter.from_config(None) is None
+        assert RateLimiter.from_config({}) is None
+
+        limiter = RateLimiter.from_config({"rate": 0.5, "burst": 3})
+        assert limiter.rate == 0.5
+        assert limiter.burst == 3.0
+
+    def test_keys_are_independent(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1.0, burst=1, clock=clock)
+
+        assert limiter.allow("alice") is True
+        assert limiter.allow("alice") is False
+        assert limiter.allow("bob") is True
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.lib.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    RequestCancelled,
+    deadline_scope,
+)
+from app.lib.singleflight import SingleFlight
+
+pytestmark = pytest.mark.unit
+
+
+def run_concurrently(flight, key, fn, count):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do(key, fn)))
+        for _ in range(count)
+    ]
+    for t in threads:
+        t.start()
+    return threads, results
+
+
+def wait_for_waiters(flight, key, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if flight.waiting(key) >= count:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "result"
+
+        leader = threading.Thread(target=lambda: flight.do("k", fn))
+        leader.start()
+        assert started.wait(5)
+
+        threads, results = run_concurrently(flight, "k", fn, 3)
+        assert wait_for_waiters(flight, "k", 3)
+        release.set()
+        for t in threads + [leader]:
+            t.join(5)
+
+        assert len(calls) == 1
+        assert results == [("result", True)] * 3
+        assert flight.in_flight() == 0
+
+    def test_sequential_calls_are_not_shared(self):
+        flight = SingleFlight()
+        counter = iter(range(10))
+
+        assert flight.do("k", lambda: next(counter)) == (0, False)
+        assert flight.do("k", lambda: next(counter)) == (1, False)
+
+    def test_error_reaches_every_waiter(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def fn():
+            started.set()
+            release.wait(5)
+            raise ValueError("boom")
+
+        def call():
+            try:
+                flight.do("k", fn)
+            except ValueError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        assert started.wait(5)
+        follower = threading.Thread(target=call)
+        follower.start()
+        assert wait_for_waiters(flight, "k", 1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        assert errors == ["boom", "boom"]
+
+    def test_async_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*(flight.do_async("k", fn) for _ in range(3)))
+
+        results = asyncio.run(run())
+
+        assert len(calls) == 1
+        assert sorted(results, key=lambda r: r[1]) == [
+            ("result", False),
+            ("result", True),
+            ("result", True),
+        ]
+        assert flight.in_flight() == 0
+
+    def test_follower_waits_within_its_own_deadline(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fn():
+            started.set()
+            release.wait(5)
+            return "result"
+
+        leader = threading.Thread(target=lambda: flight.do("k", fn))
+        leader.start()
+        assert started.wait(5)
+
+        deadline = Deadline(budget=0.2)
+        deadline.start()
+        try:
+            with deadline_scope(deadline), pytest.raises(DeadlineExceeded):
+                flight.do("k", fn)
+            # Gave up, so no longer counted
+            assert flight.waiting("k") == 0
+        finally:
+            release.set()
+            leader.join(5)
+
+    def test_follower_runs_the_call_when_the_leader_is_cancelled(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        errors = []
+
+        def aborted():
+            started.set()
+            release.wait(5)
+            raise RequestCancelled("Request cancelled")
+
+        def lead():
+            try:
+                flight.do("k", aborted)
+            except RequestCancelled as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        assert started.wait(5)
+        threads, results = run_concurrently(flight, "k", lambda: "result", 1)
+        assert wait_for_waiters(flight, "k", 1)
+        release.set()
+        for t in threads + [leader]:
+            t.join(5)
+
+        assert len(errors) == 1
+        assert results == [("result", False)]
+
+    def test_async_follower_runs_the_call_when_the_leader_is_cancelled(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do_async("k", fn))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(flight.do_async("k", fn))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == ("result", False)
+        assert len(calls) == 2
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from app.lib.streaming import ReplyStream, current_stream, stream_scope
+
+pytestmark = pytest.mark.unit
+
+
+class TestReplyStream:
+    def test_updates_are_throttled_to_the_latest_text(self):
+        sent = []
+        first = threading.Event()
+
+        def send(text):
+            sent.append(text)
+            first.set()
+
+        stream = ReplyStream(send, interval=0.2)
+        stream.update("a")
+        assert first.wait(2)
+        for text in ("ab", "abc", "abcd"):
+            stream.update(text)
+        time.sleep(0.4)
+        stream.close()
+
+        assert sent == ["a", "abcd"]
+
+    def test_close_stops_further_sends(self):
+        sent = []
+        stream = ReplyStream(sent.append, interval=5)
+        stream.update("a")
+        stream.close()
+        stream.update("ab")
+
+        assert sent in ([], ["a"])
+        assert stream._thread is None or not stream._thread.is_alive()
+
+    def test_close_waits_for_a_send_in_progress(self):
+        release = threading.Event()
+        started = threading.Event()
+        done = []
+
+        def send(text):
+            started.set()
+            release.wait(2)
+            done.append(text)
+
+        stream = ReplyStream(send, interval=0)
+        stream.update("a")
+        assert started.wait(2)
+        threading.Timer(0.1, release.set).start()
+        stream.close()
+
+        assert done == ["a"]
+
+    def test_failed_send_is_skipped(self, mock_console):
+        calls = []
+
+        def send(text):
+            calls.append(text)
+            if len(calls) == 1:
+                raise ConnectionError("down")
+
+        stream = ReplyStream(send, interval=0.01, console=mock_console)
+        stream.update("a")
+        time.sleep(0.1)
+        stream.update("ab")
+        time.sleep(0.1)
+        stream.close()
+
+        assert calls == ["a", "ab"]
+        assert "Partial reply update failed" in mock_console.get_output()
+
+    def test_scope(self):
+        stream = ReplyStream(lambda text: None)
+        assert current_stream() is None
+        with stream_scope(stream):
+            assert current_stream() is stream
+        assert current_stream() is None
+
+
+class TestIrcawpStreamingReply:
+    def make_ircawp(self, stream_replies=True):
+        from unittest.mock import MagicMock
+
+        from app.ircawp import Ircawp
+
+        ircawp = Ircawp.__new__(Ircawp)
+        ircawp.backend = MagicMock(stream_replies=stream_replies)
+        ircawp.frontend = MagicMock()
+        ircawp.frontend.streamReply.return_value = ReplyStream(lambda text: None)
+        return ircawp
+
+    def test_failed_request_abandons_its_partial_reply(self):
+        ircawp = self.make_ircawp()
+
+        with pytest.raises(RuntimeError):
+            with ircawp._streaming_reply("aux"):
+                assert current_stream() is not None
+                raise RuntimeError("cancelled")
+
+        ircawp.frontend.abandonReply.assert_called_once_with("aux")
+
+    def test_completed_request_keeps_its_partial_reply(self):
+        ircawp = self.make_ircawp()
+
+        with ircawp._streaming_reply("aux"):
+            pass
+
+        ircawp.frontend.abandonReply.assert_not_called()
+
+    def test_no_stream_when_backend_does_not_stream(self):
+        ircawp = self.make_ircawp(stream_replies=False)
+
+        with ircawp._streaming_reply("aux"):
+            assert current_stream() is None
+
+        ircawp.frontend.streamReply.assert_not_called()
@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+import pytest
+
+from app.lib.tracing import (
+    Trace,
+    TraceLog,
+    current_trace,
+    format_timing_footer,
+    span,
+    trace_scope,
+    traced,
+)
+
+pytestmark = pytest.mark.unit
+
+
+class TestTracing:
+    def test_spans_do_nothing_outside_a_trace(self):
+        with span("work") as attrs:
+            attrs["x"] = 1
+        assert current_trace() is None
+
+    def test_nested_spans_record_parent(self):
+        trace = Trace(user="u1")
+        with trace_scope(trace):
+            with span("outer"):
+                with span("inner", step=1):
+                    pass
+            with span("outer"):
+                pass
+
+        data = trace.to_dict()
+        assert data["user"] == "u1"
+        assert [(s["name"], s["parent"]) for s in data["spans"]] == [
+            ("outer", None),
+            ("inner", 0),
+            ("outer", None),
+        ]
+        assert data["spans"][1]["attrs"] == {"step": 1}
+        assert trace.summary()["outer"][0] == 2
+
+    def test_traced_follows_async_tasks_and_threads(self):
+        @traced("async_step")
+        async def async_step():
+            await asyncio.to_thread(blocking_step)
+
+        @traced("blocking_step")
+        def blocking_step():
+            pass
+
+        trace = Trace()
+
+        async def run():
+            with trace_scope(trace):
+                await asyncio.gather(async_step(), async_step())
+
+        asyncio.run(run())
+
+        names = sorted(s["name"] for s in trace.spans)
+        assert names == ["async_step"] * 2 + ["blocking_step"] * 2
+        assert all(
+            trace.spans[s["parent"]]["name"] == "async_step"
+            for s in trace.spans
+            if s["name"] == "blocking_step"
+        )
+
+    def test_footer_and_json_lines_export(self, tmp_path):
+        trace = Trace(trace_id="abc")
+        with trace_scope(trace):
+            with span("llm.chat"):
+                pass
+            with span("llm.chat"):
+                pass
+
+        footer = format_timing_footer(trace)
+        assert footer.startswith("`[Timing: llm.chat 2x ")
+        assert "total " in footer
+
+        log = TraceLog(str(tmp_path / "traces.jsonl"))
+        log.write(trace)
+        log.write(Trace(trace_id="def"))
+        lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+        assert [json.loads(line)["trace_id"] for line in lines] == ["abc", "def"]
@@ -0,0 +1,51 @@
+"""Tests for PluginCharacter in app/plugins/__PluginCharacter.py."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.lib.deadline import RequestCancelled
+from app.plugins.__PluginCharacter import PluginCharacter
+
+pytestmark = pytest.mark.plugin
+
+
+def make_backends():
+    backend = MagicMock()
+    backend.runInference.return_value = ("Arr.", [])
+    backend.runInferenceAsync = AsyncMock(return_value=("Arr.", []))
+    media_backend = MagicMock()
+    media_backend.execute.return_value = ("pirate.png", None)
+    media_backend.executeAsync = AsyncMock(return_value=("pirate.png", None))
+    return backend, media_backend
+
+
+class TestPluginCharacter:
+    """execute() and executeAsync() share one flow."""
+
+    def test_sync_and_async_replies_match(self):
+        character = PluginCharacter(emoji_prefix=":pirate:", imagegen_template="a {}")
+        backend, media_backend = make_backends()
+
+        sync = character.execute("hello", [], backend, media_backend)
+        async_ = asyncio.run(
+            character.executeAsync("hello", [], backend, media_backend)
+        )
+
+        assert sync == async_ == (":pirate: Arr.", "pirate.png", True, {})
+        assert (
+            media_backend.execute.call_args == media_backend.executeAsync.call_args
+        )
+        assert media_backend.execute.call_args.kwargs["prompt"] == "a Arr."
+
+    def test_errors_become_replies_but_aborts_propagate(self):
+        character = PluginCharacter(msg_exception_prefix="OOPS")
+        backend, _ = make_backends()
+
+        backend.runInference.side_effect = ValueError("down")
+        assert character.execute("hello", [], backend) == ("OOPS: down", "", True, {})
+
+        backend.runInference.side_effect = RequestCancelled("Request cancelled")
+        with pytest.raises(RequestCancelled):
+            character.execute("hello", [], backend)
@@ -4,6 +4,10 @@ Tests for the tool framework in app/backends/tools/.
 Tests tool discovery, registration, schema generation, and ToolManager functionality.
 """
 
+import asyncio
+import threading
+import time
+
 import pytest
 from unittest.mock import MagicMock, patch
 
@@ -128,6 +132,22 @@ class TestToolBase:
         assert len(mock_console.messages) > 0
         assert any("Test message" in msg for msg in mock_console.messages)
 
+    def test_tool_base_log_formats_lazily(self, mock_tool, mock_console):
+        from app.lib import log
+
+        tool = mock_tool(console=mock_console)
+        arg = MagicMock()
+
+        log.configure({"logging": {"subsystems": {"tools": "warning"}}})
+        try:
+            tool.log("Fetching %s", arg)
+        finally:
+            log.configure(None)
+        tool.log("100% done")
+
+        arg.__str__.assert_not_called()
+        assert any("100% done" in msg for msg in mock_console.messages)
+
 
 class TestToolResult:
     """Tests for ToolResult class."""
@@ -394,3 +414,126 @@ class TestToolManagerInitialization:
         assert len(schemas) == 1
         assert schemas[0]["type"] == "function"
         assert schemas[0]["function"]["name"] == "test_tool"
+
+
+class TestConcurrentToolCalls:
+    """Tests for running several tool calls of one round at once."""
+
+    def make_manager(self, mock_backend, mock_console, **oai_config):
+        from app.backends.tools.ToolBase import ToolBase, ToolResult
+        from app.backends.tools_manager import ToolManager
+
+        class SleepTool(ToolBase):
+            name = "sleep"
+            running = 0
+            peak = 0
+
+            def execute(self, seconds=0.0, label=""):
+                with lock:
+                    SleepTool.running += 1
+                    SleepTool.peak = max(SleepTool.peak, SleepTool.running)
+                time.sleep(seconds)
+                with lock:
+                    SleepTool.running -= 1
+                return ToolResult(text=label)
+
+        lock = threading.Lock()
+        manager = ToolManager(mock_backend, mock_console, {"openai": oai_config})
+        manager.available_tools["sleep"] = SleepTool(console=mock_console)
+        return manager, SleepTool
+
+    def test_calls_run_at_once_in_call_order(self, mock_backend, mock_console):
+        manager, _ = self.make_manager(mock_backend, mock_console)
+        calls = [("sleep", {"seconds": 0.2 - n * 0.05, "label": str(n)}) for n in range(3)]
+
+        started = time.monotonic()
+        results = manager.execute_tools(calls)
+
+        assert time.monotonic() - started < 0.35
+        assert [r.text for r in results] == ["0", "1", "2"]
+
+    def test_per_tool_concurrency_limit(self, mock_backend, mock_console):
+        manager, tool = self.make_manager(
+            mock_backend, mock_console, tool_concurrency={"sleep": 1}
+        )
+        manager.execute_tools([("sleep", {"seconds": 0.05})] * 3)
+
+        assert tool.peak == 1
+
+    def test_slow_call_times_out(self, mock_backend, mock_console):
+        manager, _ = self.make_manager(mock_backend, mock_console, tool_timeout=0.1)
+
+        fast, slow = manager.execute_tools(
+            [("sleep", {"label": "fast"}), ("sleep", {"seconds": 1, "label": "slow"})]
+        )
+
+        assert fast.text == "fast"
+        assert "timed out" in slow.text
+
+    def test_lone_call_is_limited_too(self, mock_backend, mock_console):
+        manager, _ = self.make_manager(mock_backend, mock_console, tool_timeout=0.1)
+
+        started = time.monotonic()
+        (result,) = manager.execute_tools([("sleep", {"seconds": 1})])
+
+        assert "timed out" in result.text
+        assert time.monotonic() - started < 0.5
+
+    def test_async_calls_keep_order(self, mock_backend, mock_console):
+        manager, tool = self.make_manager(mock_backend, mock_console)
+        calls = [("sleep", {"seconds": 0.1 - n * 0.03, "label": str(n)}) for n in range(3)]
+
+        results = asyncio.run(manager.execute_tools_async(calls))
+
+        assert [r.text for r in results] == ["0", "1", "2"]
+        assert tool.peak == 3
+
+    def test_overrunning_call_is_stopped_and_frees_its_slot(
+        self, mock_backend, mock_console
+    ):
+        from app.backends.tools.ToolBase import ToolBase, ToolResult
+        from app.lib.deadline import RequestAborted, check_deadline
+
+        stopped = threading.Event()
+
+        class PollTool(ToolBase):
+            name = "poll"
+
+            def execute(self, label=""):
+                # Stands in for a tool whose outbound calls use the deadline
+                try:
+                    for _ in range(500):
+                        check_deadline()
+                        time.sleep(0.01)
+                except RequestAborted:
+                    stopped.set()
+                    raise
+                return ToolResult(text=label)
+
+        manager, _ = self.make_manager(
+            mock_backend, mock_console, tool_timeout=0.1, tool_concurrency={"poll": 1}
+        )
+        manager.available_tools["poll"] = PollTool(console=mock_console)
+
+        (first,) = manager.execute_tools([("poll", {})])
+        assert "timed out" in first.text
+        assert stopped.wait(2)
+        # The tool's only slot is free again
+        assert manager._limit_for("poll").acquire(timeout=1)
+
+    def test_cancelled_request_stops_the_tool_loop(self, mock_backend, mock_console):
+        from app.lib.deadline import Deadline, RequestCancelled, deadline_scope
+
+        manager, _ = self.make_manager(mock_backend, mock_console)
+        deadline = Deadline()
+
+        def cancel_request(**kwargs):
+            deadline.cancel()
+            raise RequestCancelled("Request cancelled")
+
+        manager.available_tools["sleep"].execute = cancel_request
+
+        with deadline_scope(deadline), pytest.raises(RequestCancelled):
+            manager.execute_tools([("sleep", {})])
+        with pytest.raises(RequestCancelled):
+            manager.execute_tool("sleep", {})